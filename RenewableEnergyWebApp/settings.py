@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
     'WebApp',
 ]
 
@@ -48,6 +49,7 @@ LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 
 MIDDLEWARE = [
+    'WebApp.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -130,6 +132,128 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caches, point 'sessions' at a shared backend (Redis, Memcached) when running several processes
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+    },
+}
+
+# Sessions only keep ids of the wizard inputs (turbine, PV system, wind and consumption datasets)
+# 'cached_db' reads from the SESSION_CACHE_ALIAS cache and writes through to the database,
+# 'django.contrib.sessions.backends.cache' skips the database, 'django.contrib.sessions.backends.db' skips the cache
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Cache for Meteostat time series
+# BACKEND is 'memory' (in-process LRU), 'django' (the CACHE_ALIAS entry of CACHES) or 'disk' (NPZ files in LOCATION)
+WEATHER_CACHE = {
+    'BACKEND': 'memory',
+    'TIMEOUT': 24 * 60 * 60,
+    'MAX_ENTRIES': 512,
+    'CACHE_ALIAS': 'default',
+    'LOCATION': BASE_DIR / 'weather_cache',
+    'ARCHIVE_TIMEOUT': 30 * 24 * 60 * 60,  # Time series of completed years do not change any more
+}
+
+# Source of the station inventory and the weather observations
+# BACKEND is 'meteostat' (live service), 'recorded' (compressed responses in LOCATION, MODE 'replay', 'record'
+# or 'auto' to record what is missing) or 'synthetic' (generated weather, deterministic per SEED, no network)
+WEATHER_PROVIDER = {
+    'BACKEND': 'meteostat',
+    'LOCATION': BASE_DIR / 'weather_recordings',
+    'MODE': 'replay',
+    'SEED': 0,
+}
+
+# Concurrent Meteostat requests when a long date range is fetched in yearly chunks
+WEATHER_FETCH_THREADS = 4
+
+# Grid index over the Meteostat station inventory, rebuild with: python manage.py build_station_index
+# The NEIGHBOURS nearest stations within MAX_DISTANCE_KM are blended by inverse distance weighting, sites without
+# a station that close use the nearest one
+STATION_INDEX = {
+    'LOCATION': BASE_DIR / 'weather_cache' / 'stations.npz',
+    'MAX_AGE': 30 * 24 * 60 * 60,
+    'CELL_DEGREES': 1.0,
+    'NEIGHBOURS': 4,
+    'MAX_DISTANCE_KM': 100.0,
+    'POWER': 2.0,
+}
+
+# Extrapolation of the measured (10 m) wind speeds to the hub height of a turbine
+# METHOD is 'power' (wind shear EXPONENT) or 'log' (logarithmic profile with ROUGHNESS_LENGTH in m)
+WIND_SHEAR = {
+    'METHOD': 'power',
+    'EXPONENT': 1 / 7,
+    'ROUGHNESS_LENGTH': 0.03,
+}
+
+# P50/P75/P90 annual energy from resampled years of the wind series (block bootstrap)
+# BLOCK is 'day' (days within SEASONAL_WINDOW days of the calendar day) or 'month' (whole months of the measured years),
+# every scenario also draws a power coefficient (relative CP_SIGMA) and an availability; PROCESSES 0 uses every CPU
+UNCERTAINTY = {
+    'SCENARIOS': 10000,
+    'BLOCK': 'day',
+    'SEASONAL_WINDOW': 15,
+    'CP_SIGMA': 0.03,
+    'AVAILABILITY': 0.97,
+    'AVAILABILITY_SIGMA': 0.02,
+    'PROCESSES': 1,
+    'SEED': 0,
+}
+
+# In-memory snapshot of the turbine catalogue behind the step 1 autocomplete, a version counter in the
+# CACHE_ALIAS cache invalidates the snapshots of all processes sharing that cache when a turbine changes
+TURBINE_CATALOGUE = {
+    'CACHE_ALIAS': 'default',
+}
+
+# Request metrics (served on /metrics/ in the Prometheus text format) and stage timings
+# SAMPLE_RATE is the share of requests and jobs whose stages and database queries are timed (Server-Timing header),
+# ENABLED False removes the middleware; the metrics are per process, scrape every process
+INSTRUMENTATION = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+    'SERVER_TIMING': True,
+    'METRICS_ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+# Per-timestep arrays of every calculation (one .npy file per column in LOCATION/<fingerprint>), streamed by
+# /api/results/<fingerprint>/export/ as CSV, NPZ or Parquet (needs pyarrow) in chunks of CHUNK_ROWS rows
+# Results older than MAX_AGE seconds are removed, then the oldest ones until LOCATION holds at most MAX_SIZE bytes
+# (None disables a limit). The process_jobs worker evicts every EVICTION_INTERVAL seconds, without a worker run
+# python manage.py evict_result_series from cron. Evicted inputs are calculated again when they are requested.
+RESULT_SERIES = {
+    'ENABLED': True,
+    'LOCATION': BASE_DIR / 'result_series',
+    'CHUNK_ROWS': 16384,
+    'MAX_AGE': 30 * 24 * 60 * 60,
+    'MAX_SIZE': 5 * 1024 ** 3,
+    'EVICTION_INTERVAL': 60 * 60,
+}
+
+# REST API under /api/
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Background calculation jobs, run the worker with: python manage.py process_jobs
+CALCULATION_JOB_WORKERS = 2
+CALCULATION_JOB_POLL_INTERVAL = 1.0  # seconds
+# A running job without a worker heartbeat for this long is queued again (failed after MAX_ATTEMPTS claims)
+CALCULATION_JOB_STALE_TIMEOUT = 60.0  # seconds
+CALCULATION_JOB_MAX_ATTEMPTS = 2
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -1,12 +1,42 @@
 from django.contrib import admin
 
-from .models import Turbine
+from .models import Turbine, PowerCurve, PVSystem, FarmLayout, FarmTurbine
 
 
 # Register your models here.
+class PowerCurveInline(admin.StackedInline):
+    model = PowerCurve
+    extra = 0
+
+
 class TurbineAdmin(admin.ModelAdmin):
-    list_display = ("name", "company_name", "rotor_diameter", "efficiency", "nominal_power", "startup_speed")
-    search_fields = ("name", "company")
+    inlines = [PowerCurveInline]
+    list_display = ("name", "company_name", "rotor_diameter", "efficiency", "nominal_power", "startup_speed",
+                    "hub_height")
+    search_fields = ("name", "company_name")
+
+
+admin.site.register(Turbine, TurbineAdmin)
+
+
+class PVSystemAdmin(admin.ModelAdmin):
+    list_display = ("name", "company_name", "peak_power", "tilt", "azimuth", "inverter_power")
+    search_fields = ("name", "company_name")
+
+
+admin.site.register(PVSystem, PVSystemAdmin)
+
+
+class FarmTurbineInline(admin.TabularInline):
+    model = FarmTurbine
+    extra = 0
+    raw_id_fields = ("turbine",)
+
+
+class FarmLayoutAdmin(admin.ModelAdmin):
+    inlines = [FarmTurbineInline]
+    list_display = ("name", "wake_model", "wake_decay", "created_at")
+    search_fields = ("name",)
 
 
-admin.site.register(Turbine, TurbineAdmin)
\ No newline at end of file
+admin.site.register(FarmLayout, FarmLayoutAdmin)
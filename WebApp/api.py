@@ -0,0 +1,287 @@
+import io
+import uuid
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from rest_framework import status
+from rest_framework.decorators import api_view, parser_classes, permission_classes, renderer_classes
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.parsers import BaseParser, JSONParser, MultiPartParser
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+
+from WebApp.calculations import load_wind_series
+from WebApp.catalogue import get_catalogue, invalidate_catalogue
+from WebApp.ingest import IngestReport, parse_consumption_rows, parse_wind_rows
+from WebApp.models import Turbine, WindData, ConsumptionData
+from WebApp.preprocessing import MEASUREMENT_HEIGHT
+from WebApp.serializers import TurbineSerializer, TurbineImportSerializer, DatasetUploadSerializer, \
+    CalculationBatchSerializer, TurbineSearchSerializer
+
+# Turbines accepted by one bulk import request and rows per INSERT
+MAX_IMPORT_TURBINES = 10000
+IMPORT_BATCH_SIZE = 1000
+
+# Turbine × dataset combinations accepted by one batch calculation request
+MAX_BATCH_PAIRS = 100000
+
+
+class TurbineCursorPagination(CursorPagination):
+    """
+    Stable pages over the catalogue, the cursor does not shift when turbines are added meanwhile.
+    """
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class TurbineSearchPagination(LimitOffsetPagination):
+    """
+    Pages of the autocomplete results, the matches are an array of snapshot positions.
+    """
+    default_limit = 20
+    max_limit = 100
+
+
+class CSVStreamParser(BaseParser):
+    """
+    Hands a raw text/csv request body to the view as a file-like object without reading it.
+
+    The rows are parsed while the body is read (see ingest.iter_lines), so the upload is never held
+    in memory as a whole.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            raise ParseError("The request body is empty.")
+        return {'file': stream}
+
+
+class NPZRenderer(BaseRenderer):
+    """
+    Renders a dict of equally long columns as an uncompressed NumPy .npz archive.
+
+    Error responses are rendered as JSON.
+    """
+    media_type = 'application/x-npz'
+    format = 'npz'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None and response.status_code >= 400:
+            response['Content-Type'] = 'application/json'
+            return JSONRenderer().render(data)
+
+        buffer = io.BytesIO()
+        np.savez(buffer, **{name: np.asarray(values) for name, values in data.items()})
+        return buffer.getvalue()
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def turbine_list_api(request):
+    """
+    Lists the turbine catalogue in pages, follow the 'next' link to continue.
+    """
+    paginator = TurbineCursorPagination()
+    page = paginator.paginate_queryset(Turbine.objects.all(), request)
+    return paginator.get_paginated_response(TurbineSerializer(page, many=True).data)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def turbine_search_api(request):
+    """
+    Faceted prefix search over the in-memory catalogue snapshot, used by the turbine autocomplete.
+
+    Query parameters: q (prefix of the name or "company name"), manufacturer (repeatable),
+    min_/max_power (W), min_/max_diameter (m), min_/max_startup (m/s), limit and offset.
+
+    Returns:
+    - 200: {'count', 'next', 'previous', 'results': [turbine specs], 'facets': {...}}
+    """
+    serializer = TurbineSearchSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    filters = dict(serializer.validated_data)
+
+    catalogue = get_catalogue()
+    positions = catalogue.search(filters.pop('q', None), filters.pop('manufacturer'), **filters)
+    paginator = TurbineSearchPagination()
+    page = paginator.paginate_queryset(positions, request)
+    response = paginator.get_paginated_response(catalogue.rows(page))
+    response.data['facets'] = catalogue.facets(positions)
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def turbine_import_api(request):
+    """
+    Adds a list of turbines to the catalogue in one transaction, nothing is stored if one is invalid.
+
+    Returns:
+    - 201: {'created': count, 'ids': [...]}
+    - 400: {'errors': [{'index': position, ...field errors}]}
+    """
+    if not isinstance(request.data, list):
+        raise ValidationError("Expected a list of turbines.")
+    if len(request.data) > MAX_IMPORT_TURBINES:
+        raise ValidationError(f"At most {MAX_IMPORT_TURBINES} turbines per request.")
+
+    serializer = TurbineImportSerializer(data=request.data, many=True)
+    serializer.is_valid()
+    errors = serializer.errors or []
+    # Errors are a list with one entry per turbine, or keyed by position for non-field errors
+    errors = errors.items() if isinstance(errors, dict) else enumerate(errors)
+    errors = [{'index': index, **error} for index, error in errors if error]
+
+    # One query for the unique names of the whole batch instead of one per turbine
+    names = [turbine.get('name') if isinstance(turbine, dict) else None for turbine in request.data]
+    taken = set(Turbine.objects.filter(name__in=[name for name in names if name]).values_list('name', flat=True))
+    seen = set()
+    for index, name in enumerate(names):
+        if name and (name in taken or name in seen):
+            errors.append({'index': index, 'name': ["A turbine with this name already exists."]})
+        seen.add(name)
+
+    if errors:
+        errors.sort(key=lambda error: error['index'])
+        return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    with transaction.atomic():
+        created = Turbine.objects.bulk_create(
+            [Turbine(**turbine) for turbine in serializer.validated_data], batch_size=IMPORT_BATCH_SIZE)
+        # bulk_create sends no post_save signals
+        transaction.on_commit(invalidate_catalogue)
+    return Response({'created': len(created), 'ids': [turbine.pk for turbine in created]},
+                    status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@parser_classes([CSVStreamParser, MultiPartParser])
+def dataset_upload_api(request):
+    """
+    Stores an uploaded wind or consumption CSV as a dataset.
+
+    The CSV is either the raw request body (Content-Type: text/csv, options as query parameters) or
+    the 'file' field of a multipart form. The options are kind ('wind' or 'consumption'), latitude,
+    longitude, measurement_height and elevation.
+
+    Returns:
+    - 201: {'id', 'kind', 'rows', 'invalid_rows', 'errors': [[line, message], ...]}
+    """
+    upload = request.data.get('file')
+    if upload is None:
+        raise ValidationError({'file': ["No CSV file was uploaded."]})
+
+    options = {**request.query_params.dict(), **{key: value for key, value in request.data.items() if key != 'file'}}
+    serializer = DatasetUploadSerializer(data=options)
+    serializer.is_valid(raise_exception=True)
+    options = serializer.validated_data
+
+    report = IngestReport()
+    with transaction.atomic():
+        # Rows are streamed from the upload and written in fixed-size batches
+        if options['kind'] == 'wind':
+            dataset = WindData.objects.create(
+                id=uuid.uuid4(),
+                source='csv',
+                latitude=options.get('latitude'),
+                longitude=options.get('longitude'),
+                measurement_height=options.get('measurement_height') or MEASUREMENT_HEIGHT,
+                elevation=options.get('elevation'),
+            )
+            stored = dataset.store_observations(parse_wind_rows(upload, report))
+        else:
+            dataset = ConsumptionData.objects.create(id=uuid.uuid4(), source='csv')
+            stored = dataset.store_observations(parse_consumption_rows(upload, report))
+
+    if not stored:
+        dataset.delete()
+        return Response({'file': ["The CSV file does not contain any valid rows."],
+                         'errors': report.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    if options['kind'] == 'wind':
+        dataset.fit_distribution()
+
+    return Response({
+        'id': str(dataset.id),
+        'kind': options['kind'],
+        'rows': stored,
+        'invalid_rows': report.error_count,
+        'errors': report.errors,
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@parser_classes([JSONParser])
+@renderer_classes([JSONRenderer, NPZRenderer])
+def calculate_batch_api(request):
+    """
+    Evaluates many turbine × wind dataset combinations in one request.
+
+    Every dataset is loaded once and all of its turbines are evaluated together (see
+    TurbineQuerySet.evaluate_all). The result is columnar, one entry per combination in request
+    order, as JSON or as an .npz archive (Accept: application/x-npz or ?format=npz).
+
+    Request:
+    - {'pairs': [{'turbine': id, 'dataset': uuid}, ...]} and/or
+      {'turbines': [id, ...], 'datasets': [uuid, ...]} for every combination of both lists
+
+    Returns:
+    - 200: {'turbine', 'dataset', 'annual_energy_kwh', 'capacity_factor'}, one list (array) each
+    """
+    serializer = CalculationBatchSerializer(data=request.data, max_pairs=MAX_BATCH_PAIRS)
+    serializer.is_valid(raise_exception=True)
+    combinations = serializer.validated_data['combinations']
+
+    turbines_by_dataset = defaultdict(set)
+    for turbine_id, dataset_id in combinations:
+        turbines_by_dataset[dataset_id].add(turbine_id)
+
+    datasets = WindData.objects.in_bulk(list(turbines_by_dataset))
+    turbine_ids = set().union(*turbines_by_dataset.values())
+    known_turbines = set(Turbine.objects.filter(id__in=turbine_ids).values_list('id', flat=True))
+    missing = {
+        'datasets': sorted(str(dataset_id) for dataset_id in turbines_by_dataset if dataset_id not in datasets),
+        'turbines': sorted(turbine_ids - known_turbines),
+    }
+    if missing['datasets'] or missing['turbines']:
+        raise ValidationError({'missing': missing})
+
+    results = {}
+    for dataset_id, dataset_turbines in turbines_by_dataset.items():
+        wind_data = datasets[dataset_id]
+        series = load_wind_series(wind_data)
+        if len(series['wind_speed']) == 0:
+            raise ValidationError({'datasets': [f"Dataset {dataset_id} does not contain any observations."]})
+
+        evaluated = Turbine.objects.filter(id__in=dataset_turbines).evaluate_all(
+            series['wind_speed'], series['temperature'], series['pressure'], series['humidity'],
+            measurement_height=wind_data.measurement_height, elevation=wind_data.elevation,
+            cache_key=str(wind_data.pk))
+        for position, turbine_id in enumerate(evaluated['ids'].tolist()):
+            results[turbine_id, dataset_id] = position, evaluated
+
+    annual_energy = np.empty(len(combinations))
+    capacity_factor = np.empty(len(combinations))
+    for index, combination in enumerate(combinations):
+        position, evaluated = results[combination]
+        annual_energy[index] = evaluated['annual_energy'][position] / 1000
+        capacity_factor[index] = evaluated['capacity_factor'][position]
+
+    return Response({
+        'turbine': np.array([turbine_id for turbine_id, _ in combinations], dtype=np.int64),
+        'dataset': np.array([str(dataset_id) for _, dataset_id in combinations]),
+        'annual_energy_kwh': annual_energy,
+        'capacity_factor': capacity_factor,
+    })
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class WebappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'WebApp'
+
+    def ready(self):
+        # Registers the signal handlers invalidating the turbine catalogue snapshot and removing the
+        # stored per-timestep arrays of deleted results
+        from WebApp import catalogue, exports  # noqa: F401
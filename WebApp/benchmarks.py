@@ -0,0 +1,406 @@
+import gc
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from django.db import transaction
+from django.test import override_settings
+
+from WebApp import weather
+from WebApp.ingest import IngestReport, iter_csv_rows, parse_wind_rows
+from WebApp.models import Turbine, FarmLayout, FarmTurbine
+from WebApp.stations import get_station_index_settings
+from WebApp.uncertainty import bootstrap_annual_energy
+from WebApp.utils import calculate_air_density, calculate_power_output
+
+# Synthetic wind series: length in days and timesteps per day
+SERIES_LENGTHS = {'1d': 1, '1y': 365, '20y': 7305}
+RESOLUTIONS = {'hourly': 24, '10min': 144}
+
+CATALOGUE_SIZES = (1, 100, 1000, 10000)
+
+# Turbines of the benchmark wind farm, on a 10-column grid
+FARM_SIZE = 50
+
+# CSV upload sizes in bytes, the ones above FULL_CSV_LIMIT only run with full=True
+CSV_SIZES = {'1KB': 10 ** 3, '1MB': 10 ** 6, '10MB': 10 ** 7, '100MB': 10 ** 8, '1GB': 10 ** 9}
+FULL_CSV_LIMIT = 10 ** 7
+
+# Scalar calls timed per run of calculate_daily_power_output
+SCALAR_CALLS = 10000
+
+# Short runs are looped until one timed run takes at least this long (like timeit.autorange)
+MIN_RUN_SECONDS = 0.05
+
+# Throughput drop (fraction of the baseline) reported as a regression
+DEFAULT_THRESHOLD = 0.2
+
+# Site of the weather pipeline case
+BENCHMARK_SITE = (52.23, 21.01)
+
+
+class BenchmarkCase:
+    """
+    A named measurement: setup() is a context manager yielding (run, items), run() does the work
+    and items is the amount processed by one run (timesteps, bytes, ...) in the given unit.
+    """
+
+    def __init__(self, name: str, setup, unit: str, repeat: int = None):
+        self.name = name
+        self.setup = setup
+        self.unit = unit
+        self.repeat = repeat
+
+
+def synthetic_series(days: int, steps_per_day: int, seed: int = 0) -> dict:
+    """
+    Weibull distributed wind speeds with a daily temperature cycle, starting on 2001-01-01.
+
+    Returns:
+    - dict: 'timestamps' (datetime64[s]) and float32 'wind_speed', 'temperature', 'pressure',
+      'humidity' and 'wind_direction' arrays
+    """
+    rng = np.random.default_rng(seed)
+    length = days * steps_per_day
+    step = np.timedelta64(86400 // steps_per_day, 's')
+    timestamps = np.datetime64('2001-01-01T00:00:00') + np.arange(length) * step
+    day_fraction = np.arange(length) % steps_per_day / steps_per_day
+    return {
+        'timestamps': timestamps,
+        'wind_speed': (rng.weibull(2.0, length) * 6.5).astype(np.float32),
+        'temperature': (10 + 8 * np.sin(2 * np.pi * (day_fraction - 0.375)) + rng.normal(0, 2, length)).astype(np.float32),
+        'pressure': rng.normal(1013, 8, length).astype(np.float32),
+        'humidity': rng.uniform(40, 100, length).astype(np.float32),
+        'wind_direction': rng.uniform(0, 360, length).astype(np.float32),
+    }
+
+
+def synthetic_turbines(count: int, seed: int = 0) -> list:
+    """
+    Unsaved turbines with spread specs, a third of them without hub height.
+    """
+    rng = np.random.default_rng(seed)
+    return [
+        Turbine(
+            name=f"Benchmark {index}",
+            company_name="Benchmark",
+            rotor_diameter=float(rng.uniform(2, 150)),
+            efficiency=float(rng.uniform(0.3, 0.5)),
+            nominal_power=float(rng.uniform(1e3, 5e6)),
+            startup_speed=float(rng.uniform(2, 4)),
+            hub_height=[None, 80.0, 120.0][index % 3],
+        )
+        for index in range(count)
+    ]
+
+
+def write_wind_csv(path, size: int, seed: int = 0) -> int:
+    """
+    Writes a wind CSV of about `size` bytes in the upload format (header + date, wind speed,
+    temperature, pressure rows).
+
+    Returns:
+    - int: Number of data rows
+    """
+    series = synthetic_series(7, 144, seed)
+    block = "".join(
+        f"{str(timestamp).replace('T', ' ')},{wind:.2f},{temperature:.1f},{pressure:.1f}\n"
+        for timestamp, wind, temperature, pressure
+        in zip(series['timestamps'], series['wind_speed'], series['temperature'], series['pressure'])
+    ).encode()
+    lines_per_block = len(series['timestamps'])
+
+    header = b"date,wind_speed,temperature,pressure\n"
+    rows = 0
+    with open(path, 'wb') as file:
+        file.write(header)
+        written = len(header)
+        while written + len(block) <= size:
+            file.write(block)
+            written += len(block)
+            rows += lines_per_block
+        # The remainder is filled with whole lines of the block
+        remainder = block[:max(block.rfind(b"\n", 0, size - written) + 1, 0)]
+        file.write(remainder)
+        rows += remainder.count(b"\n")
+    return rows
+
+
+def process_csv(file):
+    """
+    The former CSV reader of the upload views (plain dicts of strings, no validation), kept as the
+    reference the parse_wind_rows cases are compared with.
+    """
+    for _, row in iter_csv_rows(file):
+        entry = {
+            'date': row[0],
+            'wind_speed': row[1] if len(row) > 1 else None
+        }
+        # Optional temperature (°C) and pressure (hPa) columns
+        if len(row) > 2:
+            entry['temperature'] = row[2]
+        if len(row) > 3:
+            entry['pressure'] = row[3]
+        yield entry
+
+
+@contextmanager
+def offline_weather():
+    """
+    Replaces Meteostat with the synthetic weather provider for the duration of the block, with
+    its station index in a temporary directory and an empty in-memory weather cache.
+    """
+    with tempfile.TemporaryDirectory() as directory, override_settings(
+            WEATHER_PROVIDER={'BACKEND': 'synthetic', 'SEED': 0},
+            STATION_INDEX={**get_station_index_settings(), 'LOCATION': Path(directory) / 'stations.npz'}):
+        saved = weather._weather_cache
+        weather._weather_cache = weather.WeatherCache(weather.MemoryCacheBackend(), timeout=24 * 60 * 60)
+        try:
+            yield
+        finally:
+            weather._weather_cache = saved
+
+
+def _series_cases():
+    for resolution, steps_per_day in RESOLUTIONS.items():
+        for label, days in SERIES_LENGTHS.items():
+            yield f"{resolution}-{label}", days, steps_per_day
+
+
+def benchmark_cases(full: bool = False) -> list:
+    """
+    All benchmark cases, the CSV files above FULL_CSV_LIMIT are only included with full=True.
+    """
+    cases = []
+
+    @contextmanager
+    def daily_power_output():
+        turbine = synthetic_turbines(1)[0]
+        wind_speeds = synthetic_series(1, SCALAR_CALLS)['wind_speed'].tolist()
+
+        def run():
+            for wind_speed in wind_speeds:
+                turbine.calculate_daily_power_output(wind_speed, 10.0, 1000.0)
+        yield run, SCALAR_CALLS
+
+    cases.append(BenchmarkCase('calculate_daily_power_output', daily_power_output, 'calls/s'))
+
+    # The series are generated in setup(), so filtered out cases do not allocate them
+    for label, days, steps_per_day in _series_cases():
+        @contextmanager
+        def annual_output(days=days, steps_per_day=steps_per_day):
+            series = synthetic_series(days, steps_per_day)
+            turbine = synthetic_turbines(1)[0]
+            yield (lambda: turbine.calculate_annual_wind_power_output(
+                series['wind_speed'], series['temperature'], series['pressure'])), len(series['wind_speed'])
+
+        @contextmanager
+        def air_density(days=days, steps_per_day=steps_per_day):
+            series = synthetic_series(days, steps_per_day)
+            yield (lambda: calculate_air_density(series['temperature'], series['pressure'],
+                                                 series['humidity'])), len(series['wind_speed'])
+
+        cases.append(BenchmarkCase(f'calculate_annual_wind_power_output[{label}]', annual_output, 'timesteps/s'))
+        cases.append(BenchmarkCase(f'calculate_air_density[{label}]', air_density, 'timesteps/s'))
+
+    for size in CATALOGUE_SIZES:
+        @contextmanager
+        def evaluate_all(size=size):
+            series = synthetic_series(365, 24)
+            # The catalogue only exists inside the transaction, it is rolled back afterwards
+            with transaction.atomic():
+                Turbine.objects.bulk_create(synthetic_turbines(size), batch_size=1000)
+                turbines = Turbine.objects.filter(company_name="Benchmark")
+                yield (lambda: turbines.evaluate_all(series['wind_speed'], series['temperature'],
+                                                     series['pressure'], series['humidity'],
+                                                     measurement_height=10.0)), size * len(series['wind_speed'])
+                transaction.set_rollback(True)
+
+        cases.append(BenchmarkCase(f'evaluate_all[{size}-turbines]', evaluate_all, 'turbine-timesteps/s'))
+
+    for label, size in CSV_SIZES.items():
+        if size > FULL_CSV_LIMIT and not full:
+            continue
+        # Large files are read a single time, the runs are long enough on their own
+        repeat = 1 if size > FULL_CSV_LIMIT else None
+
+        @contextmanager
+        def csv_file(size=size):
+            handle, path = tempfile.mkstemp(suffix='.csv')
+            os.close(handle)
+            try:
+                write_wind_csv(path, size)
+                yield path, os.path.getsize(path)
+            finally:
+                os.remove(path)
+
+        @contextmanager
+        def process_csv_case(csv_file=csv_file):
+            with csv_file() as (path, size):
+                def run():
+                    with open(path, 'rb') as file:
+                        for _ in process_csv(file):
+                            pass
+                yield run, size
+
+        @contextmanager
+        def parse_wind_rows_case(csv_file=csv_file):
+            with csv_file() as (path, size):
+                def run():
+                    with open(path, 'rb') as file:
+                        for _ in parse_wind_rows(file, IngestReport()):
+                            pass
+                yield run, size
+
+        cases.append(BenchmarkCase(f'process_csv[{label}]', process_csv_case, 'bytes/s', repeat))
+        cases.append(BenchmarkCase(f'parse_wind_rows[{label}]', parse_wind_rows_case, 'bytes/s', repeat))
+
+    @contextmanager
+    def hourly_site_series():
+        def run():
+            # A cold cache for every run, so generating the station series and the blending are measured
+            weather._weather_cache = weather.WeatherCache(weather.MemoryCacheBackend(), timeout=24 * 60 * 60)
+            return weather.get_hourly_wind_series(*BENCHMARK_SITE, date(2022, 1, 1), date(2023, 12, 31))
+        yield run, 2 * 8760
+
+    cases.append(BenchmarkCase('get_hourly_wind_series[2y]', hourly_site_series, 'timesteps/s'))
+
+    @contextmanager
+    def farm_wakes():
+        series = synthetic_series(365, 24)
+        # The farm only exists inside the transaction, it is rolled back afterwards
+        with transaction.atomic():
+            turbine = synthetic_turbines(1)[0]
+            turbine.save()
+            layout = FarmLayout.objects.create(name="Benchmark farm")
+            FarmTurbine.objects.bulk_create(FarmTurbine(layout=layout, turbine=turbine, x=index % 10 * 500.0,
+                                                        y=index // 10 * 700.0) for index in range(FARM_SIZE))
+            yield (lambda: layout.evaluate(series)), FARM_SIZE * len(series['wind_speed'])
+            transaction.set_rollback(True)
+
+    cases.append(BenchmarkCase(f'farm_evaluate[{FARM_SIZE}-turbines]', farm_wakes, 'turbine-timesteps/s'))
+
+    @contextmanager
+    def bootstrap():
+        series = synthetic_series(3 * 365, 24)
+        power = calculate_power_output(series['wind_speed'], 1.225, 20.0, 0.4, np.inf, 3.0)
+        yield (lambda: bootstrap_annual_energy(power, series['timestamps'], 100000.0, scenarios=10000,
+                                               processes=1)), 10000 * 8760
+
+    cases.append(BenchmarkCase('bootstrap_annual_energy[10000-scenarios]', bootstrap, 'scenario-timesteps/s'))
+    return cases
+
+
+def measure(case: BenchmarkCase, repeat: int = 3) -> dict:
+    """
+    Runs a case: one warm-up, the best of `repeat` timed runs and one run under tracemalloc for
+    the peak memory. Short runs are looped so a timed run takes at least MIN_RUN_SECONDS.
+
+    Returns:
+    - dict: seconds (best run), throughput (items per second), unit, items, repeat, loops (runs
+      per timed run) and peak_memory_bytes (Python and NumPy allocations)
+    """
+    loops = 1
+    with case.setup() as (run, items):
+        if case.repeat is None:
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            loops = max(1, int(np.ceil(MIN_RUN_SECONDS / max(elapsed, 1e-9))))
+
+        timings = []
+        for _ in range(case.repeat or repeat):
+            gc.collect()
+            started = time.perf_counter()
+            for _ in range(loops):
+                run()
+            timings.append((time.perf_counter() - started) / loops)
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    seconds = min(timings)
+    return {
+        'seconds': seconds,
+        'throughput': items / seconds if seconds > 0 else float('inf'),
+        'unit': case.unit,
+        'items': items,
+        'repeat': case.repeat or repeat,
+        'loops': loops,
+        'peak_memory_bytes': peak,
+    }
+
+
+def run_benchmarks(pattern: str = None, full: bool = False, repeat: int = 3, progress=None) -> dict:
+    """
+    Runs the benchmark cases offline (Meteostat is replaced by the synthetic weather provider).
+
+    Parameters:
+    - pattern (str, optional): Only cases whose name contains it
+    - full (bool): Include the large CSV files (100 MB, 1 GB)
+    - repeat (int): Timed runs per case, the fastest one counts
+    - progress (callable, optional): Called with (name, result) after every case
+
+    Returns:
+    - dict: 'created', 'environment' and 'results' (case name -> measure() result)
+    """
+    results = {}
+    with offline_weather():
+        for case in benchmark_cases(full):
+            if pattern and pattern not in case.name:
+                continue
+            results[case.name] = measure(case, repeat)
+            if progress is not None:
+                progress(case.name, results[case.name])
+
+    return {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    Compares two benchmark runs case by case.
+
+    Returns:
+    - list: (name, baseline throughput, current throughput, relative change, regression) tuples for
+      the cases in both runs, regression is True when the throughput dropped by more than threshold
+    """
+    comparison = []
+    for name, result in current['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            continue
+        change = result['throughput'] / reference['throughput'] - 1
+        comparison.append((name, reference['throughput'], result['throughput'], change, change < -threshold))
+    return comparison
+
+
+def save_results(results: dict, path):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
+
+
+def load_results(path) -> dict:
+    with open(path) as file:
+        return json.load(file)
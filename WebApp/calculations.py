@@ -0,0 +1,300 @@
+import hashlib
+import json
+
+import numpy as np
+from django.db import IntegrityError
+
+from WebApp.exports import get_result_series_settings, store_result_series
+from WebApp.instrumentation import timed
+from WebApp.matching import match_generation_steps, resample_consumption, synthesize_load_profile
+from WebApp.models import Turbine, PowerCurve, PVSystem, WindData, ConsumptionData, CalculationResult
+from WebApp.utils import step_hours, turbine_to_dict
+from WebApp.preprocessing import prepare_series
+from WebApp.stations import site_elevation
+from WebApp.uncertainty import turbine_exceedance
+from WebApp.weather import meteostat_observations
+
+# Annual household consumption in kWh for the choices of EnergyAverageForm
+AVERAGE_CONSUMPTION_KWH = {
+    'low': 2000.0,
+    'medium': 4000.0,
+    'high': 6000.0,
+}
+
+
+def turbine_from_dict(turbine_data: dict) -> Turbine:
+    """
+    Builds an unsaved Turbine from the dict of the calculation inputs (see utils.turbine_to_dict).
+
+    Catalogue turbines keep their id, so their tabulated power curve is used.
+    """
+    return Turbine(
+        id=turbine_data.get('id'),
+        rotor_diameter=turbine_data['rotor_diameter'],
+        efficiency=turbine_data['efficiency'],
+        nominal_power=turbine_data['nominal_power'],
+        startup_speed=turbine_data['startUp'],
+        hub_height=turbine_data.get('hub_height'),
+    )
+
+
+def pv_system_from_dict(pv_system_data: dict) -> PVSystem:
+    """
+    Builds an unsaved PVSystem from the dict of the calculation inputs (see utils.pv_system_to_dict).
+    """
+    return PVSystem(**pv_system_data)
+
+
+def turbine_from_session(session) -> dict:
+    """
+    Collects the turbine of step 1 from the session.
+
+    Returns:
+    - dict: The turbine dict of the calculation inputs (see utils.turbine_to_dict), a catalogue
+      turbine by its id or the parameters of a custom turbine, None if step 1 was not completed
+    """
+    if session.get('custom_turbine'):
+        return session['custom_turbine']
+    turbine = Turbine.objects.filter(pk=session.get('turbine_id')).first()
+    return turbine_to_dict(turbine) if turbine is not None else None
+
+
+def consumption_from_session(session) -> dict:
+    """
+    Collects the consumption input of step 3 from the session.
+
+    Returns:
+    - dict: {'type': 'average', 'level': ...} or {'type': 'csv', 'dataset_id': ...} (a
+      ConsumptionData id), None if step 3 was not completed
+    """
+    consumption_type = session.get('consumption_type')
+    if consumption_type == 'average':
+        return {'type': 'average', 'level': session.get('average_consumption')}
+    if consumption_type == 'csv' and session.get('consumption_data_id'):
+        return {'type': 'csv', 'dataset_id': session['consumption_data_id']}
+    return None
+
+
+def calculation_fingerprint(turbine_data: dict, wind_data_id: str, consumption: dict, pv_system_data: dict = None,
+                            battery_data: dict = None) -> str:
+    """
+    Content hash of everything the result depends on, identical inputs give the same fingerprint.
+    """
+    turbine = {key: float(turbine_data[key]) for key in ('rotor_diameter', 'efficiency', 'nominal_power', 'startUp')}
+    turbine['hub_height'] = turbine_data.get('hub_height')
+    if turbine_data.get('id') is not None:
+        # An edited power curve must not return results of the old one
+        updated_at = PowerCurve.objects.filter(turbine_id=turbine_data['id']).values_list('updated_at', flat=True).first()
+        turbine['power_curve'] = updated_at.isoformat() if updated_at else None
+    pv_system = {key: float(value) for key, value in pv_system_data.items()} if pv_system_data else None
+    canonical = json.dumps([turbine, str(wind_data_id), consumption, pv_system, battery_data or None],
+                           sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def annual_consumption_kwh(consumption: dict) -> float:
+    """
+    Returns the yearly consumption, CSV data is scaled from the period it covers to 8760 hours.
+    """
+    if consumption['type'] == 'average':
+        return AVERAGE_CONSUMPTION_KWH[consumption['level']]
+
+    timestamps, energy = consumption_arrays(consumption)
+    # The last row covers one more step after its timestamp
+    covered_hours = (timestamps[-1] - timestamps[0]).astype(np.float64) / 3600 + step_hours(timestamps)
+    return float(energy.sum()) * 8760 / covered_hours
+
+
+def consumption_arrays(consumption: dict):
+    """
+    Loads the uploaded consumption dataset referenced by a CSV consumption input.
+
+    Returns:
+    - tuple: sorted (datetime64 timestamps, kWh) arrays
+    """
+    series = ConsumptionData.objects.get(id=consumption['dataset_id']).get_series()
+    if len(series['consumption']) == 0:
+        raise ValueError("The consumption data is empty.")
+    return series['timestamps'], series['consumption']
+
+
+def consumption_profile(consumption: dict, timestamps, hours: float) -> np.ndarray:
+    """
+    Consumption in kWh for every timestep of a weather series: the H0 standard load profile for an
+    average consumption, or the measured consumption aligned by hour of the year.
+    """
+    if consumption['type'] == 'average':
+        return synthesize_load_profile(timestamps, annual_consumption_kwh(consumption), hours)
+    return resample_consumption(*consumption_arrays(consumption), timestamps, hours)
+
+
+@timed('load_wind_series')
+def load_wind_series(wind_data: WindData) -> dict:
+    """
+    Loads the observations of a dataset, fetching and storing them first for Meteostat datasets.
+    """
+    if wind_data.source == 'meteostat' and wind_data.elevation is None:
+        wind_data.elevation = site_elevation(wind_data.latitude, wind_data.longitude)
+        if wind_data.elevation is not None:
+            wind_data.save(update_fields=['elevation'])
+
+    if wind_data.source == 'meteostat' and not wind_data.observations.exists():
+        stored = wind_data.store_observations(meteostat_observations(
+            wind_data.latitude, wind_data.longitude, wind_data.start_date, wind_data.end_date,
+            resolution=wind_data.resolution))
+        if stored:
+            wind_data.fit_distribution()
+
+    return wind_data.get_series()
+
+
+@timed('calculate_summary')
+def calculate_summary(turbine: Turbine, series: dict, consumption: dict, pv_system: PVSystem = None,
+                      latitude: float = None, longitude: float = None, prepared: dict = None,
+                      battery: dict = None, timeseries: dict = None) -> dict:
+    """
+    Compares the turbine (and optional PV system) generation for a weather series with the
+    household consumption.
+
+    The consumption is aligned with the timesteps of the series (see consumption_profile()), so
+    self-consumption, battery use and grid exchange are evaluated step by step and scaled to one year.
+
+    Parameters:
+    - prepared (dict, optional): Wind speeds at hub height and air density of the series (see
+      WindData.prepare_series()), default: prepared from the series for 10 m measurements
+    - battery (dict, optional): Battery storage, see matching.match_generation()
+    - timeseries (dict, optional): Filled with the per-timestep arrays (exports.RESULT_COLUMNS)
+
+    Returns:
+    - dict: Generation, consumption, self-consumption, grid import/export (kWh per year) and the
+      share of demand covered
+    """
+    if prepared is None:
+        prepared = prepare_series(series, turbine.hub_height)
+    wind_power = turbine.calculate_power_output_array(prepared['wind_speed'], air_density=prepared['air_density'])
+
+    if pv_system is not None:
+        if latitude is None or longitude is None:
+            raise ValueError("Solar panels need the location of the wind dataset.")
+        solar_power = pv_system.calculate_power_output_array(series, latitude, longitude)
+    else:
+        solar_power = np.zeros_like(wind_power)
+
+    power = wind_power + solar_power
+    hours = step_hours(series['timestamps'])
+    # Factor from the length of the series to one year
+    to_annual = 8760 / (len(power) * hours)
+
+    generation = power * hours / 1000  # kWh per step
+    consumption_per_step = consumption_profile(consumption, series['timestamps'], hours)
+    consumption_kwh = float(consumption_per_step.sum()) * to_annual
+
+    steps = match_generation_steps(generation, consumption_per_step, hours, battery)
+    matched = {name: float(values.sum()) for name, values in steps.items()}
+    surplus = matched['grid_export'] * to_annual
+    deficit = matched['grid_import'] * to_annual
+    self_consumption = matched['self_consumption'] * to_annual
+    mean_wind_power = float(wind_power.mean())
+    annual_generation = float(power.mean()) * 8760 / 1000
+
+    if timeseries is not None:
+        timeseries.update({
+            'timestamp': series['timestamps'],
+            'hub_wind_speed': prepared['wind_speed'],
+            'wind_power_w': wind_power,
+            'solar_power_w': solar_power,
+            'generation_kwh': generation,
+            'consumption_kwh': consumption_per_step,
+            **{f'{name}_kwh': values for name, values in steps.items()},
+        })
+
+    return {
+        'start': str(series['timestamps'][0]),
+        'end': str(series['timestamps'][-1]),
+        'timesteps': len(power),
+        'step_hours': hours,
+        'mean_wind_speed': float(series['wind_speed'].mean()),
+        'hub_height': turbine.hub_height,
+        'mean_hub_wind_speed': float(prepared['wind_speed'].mean(dtype=np.float64)),
+        'mean_power_w': mean_wind_power,
+        'generated_kwh': float(generation.sum()),
+        'annual_generation_kwh': annual_generation,
+        'annual_wind_generation_kwh': mean_wind_power * 8760 / 1000,
+        'annual_solar_generation_kwh': float(solar_power.mean()) * 8760 / 1000,
+        'has_solar': pv_system is not None,
+        'capacity_factor': mean_wind_power / turbine.nominal_power,
+        'annual_consumption_kwh': consumption_kwh,
+        'annual_surplus_kwh': surplus,
+        'annual_deficit_kwh': deficit,
+        'annual_self_consumption_kwh': self_consumption,
+        'self_consumption_rate': self_consumption / annual_generation if annual_generation else 0.0,
+        'has_battery': bool(battery and battery.get('capacity')),
+        'annual_battery_discharge_kwh': matched['battery_discharge'] * to_annual,
+        'annual_balance_kwh': annual_generation - consumption_kwh,
+        'demand_covered': self_consumption / consumption_kwh if consumption_kwh else 1.0,
+    }
+
+
+def get_memoized_result(fingerprint: str):
+    return CalculationResult.objects.filter(fingerprint=fingerprint).first()
+
+
+def run_calculation(payload: dict) -> dict:
+    """
+    Runs the result pipeline for the inputs of the calculation wizard, reusing a stored result
+    when the same inputs were calculated before.
+
+    Parameters:
+    - payload (dict): 'turbine' (turbine dict), 'wind_data_id', 'consumption' and optionally
+      'pv_system' (PV system dict), 'battery' (battery dict) and 'fingerprint'
+
+    Returns:
+    - dict: The result summary, energies in kWh
+    """
+    pv_system_data = payload.get('pv_system')
+    battery_data = payload.get('battery')
+    fingerprint = payload.get('fingerprint') or calculation_fingerprint(
+        payload['turbine'], payload['wind_data_id'], payload['consumption'], pv_system_data, battery_data)
+
+    memoized = get_memoized_result(fingerprint)
+    if memoized is not None:
+        return memoized.summary
+
+    turbine = turbine_from_dict(payload['turbine'])
+    wind_data = WindData.objects.get(id=payload['wind_data_id'])
+
+    series = load_wind_series(wind_data)
+    if len(series['wind_speed']) == 0:
+        raise ValueError("The selected wind dataset does not contain any observations.")
+
+    pv_system = pv_system_from_dict(pv_system_data) if pv_system_data else None
+    prepared = wind_data.prepare_series(series, turbine.hub_height)
+    timeseries = {} if get_result_series_settings()['ENABLED'] else None
+    summary = calculate_summary(turbine, series, payload['consumption'], pv_system,
+                                wind_data.latitude, wind_data.longitude, prepared=prepared, battery=battery_data,
+                                timeseries=timeseries)
+    try:
+        # P50/P75/P90 of the annual wind generation from resampled years
+        summary['exceedance'] = turbine_exceedance(turbine, series, prepared)
+    except ValueError as e:
+        # Series without complete days in every season cannot be resampled into years
+        summary['exceedance'] = None
+        summary['exceedance_note'] = str(e)
+
+    if timeseries is not None:
+        # Per-timestep arrays for the export endpoint, stored before the result becomes visible
+        store_result_series(fingerprint, timeseries)
+
+    try:
+        CalculationResult.objects.create(
+            fingerprint=fingerprint,
+            wind_data=wind_data,
+            inputs={'turbine': payload['turbine'], 'consumption': payload['consumption'], 'pv_system': pv_system_data,
+                    'battery': battery_data},
+            summary=summary,
+        )
+    except IntegrityError:
+        # Another worker stored the same inputs in the meantime, the results are identical
+        pass
+
+    return summary
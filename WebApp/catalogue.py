@@ -0,0 +1,193 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from WebApp.instrumentation import registry
+from WebApp.models import Turbine
+
+DEFAULT_TURBINE_CATALOGUE = {
+    'CACHE_ALIAS': 'default',
+}
+
+# Cache entry with the catalogue version, every change of a turbine increments it
+CATALOGUE_VERSION_KEY = 'turbine-catalogue-version'
+
+# Numeric facets: query parameter prefix -> snapshot column
+RANGE_FACETS = {
+    'power': 'nominal_power',
+    'diameter': 'rotor_diameter',
+    'startup': 'startup_speed',
+}
+
+
+def get_catalogue_settings() -> dict:
+    return {**DEFAULT_TURBINE_CATALOGUE, **getattr(settings, 'TURBINE_CATALOGUE', {})}
+
+
+def _version_cache():
+    return caches[get_catalogue_settings()['CACHE_ALIAS']]
+
+
+def get_catalogue_version():
+    """
+    Returns the current catalogue version from the cache, shared by all processes using the cache.
+    """
+    cache = _version_cache()
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        # A lost entry must not repeat a version a process has already seen
+        cache.add(CATALOGUE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOGUE_VERSION_KEY)
+    return version
+
+
+def invalidate_catalogue():
+    """
+    Marks every process-local snapshot as stale, they are rebuilt on their next use.
+    """
+    cache = _version_cache()
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOGUE_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+@receiver(post_save, sender=Turbine)
+@receiver(post_delete, sender=Turbine)
+def _turbine_changed(sender, **kwargs):
+    # Other processes must not rebuild from the database before the change is visible
+    transaction.on_commit(invalidate_catalogue)
+
+
+class CatalogueSnapshot:
+    """
+    Columnar copy of the turbine specs for fast filtering without database queries.
+
+    Rows are sorted by lower-case name, so a name prefix is a binary search; the manufacturers
+    are stored as codes into the sorted list of distinct company names.
+    """
+
+    def __init__(self, rows, version=None):
+        rows = sorted(rows, key=lambda row: (row[1].lower(), row[0]))
+        ids, names, company_names, rotor_diameter, efficiency, nominal_power, startup_speed, hub_height = (
+            zip(*rows) if rows else ([],) * 8)
+        self.version = version
+        self.ids = np.array(ids, dtype=np.int64)
+        self.names = list(names)
+        self.name_keys = np.array([name.lower() for name in names], dtype=str)
+        self.manufacturers, self.manufacturer_codes = np.unique(np.array(company_names, dtype=str),
+                                                                return_inverse=True)
+        # "Company Name" labels, sorted separately, so "vestas v9" finds the V90 as well
+        labels = np.array([f"{company} {name}".lower() for company, name in zip(company_names, names)], dtype=str)
+        self.label_order = np.argsort(labels, kind='stable')
+        self.label_keys = labels[self.label_order]
+        self.rotor_diameter = np.array(rotor_diameter, dtype=np.float64)
+        self.efficiency = np.array(efficiency, dtype=np.float64)
+        self.nominal_power = np.array(nominal_power, dtype=np.float64)
+        self.startup_speed = np.array(startup_speed, dtype=np.float64)
+        self.hub_height = np.array([np.nan if value is None else value for value in hub_height], dtype=np.float64)
+        self._positions = {turbine_id: position for position, turbine_id in enumerate(self.ids.tolist())}
+
+    @classmethod
+    def from_database(cls, version=None) -> 'CatalogueSnapshot':
+        return cls(Turbine.objects.values_list('id', 'name', 'company_name', 'rotor_diameter', 'efficiency',
+                                               'nominal_power', 'startup_speed', 'hub_height'), version)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _prefix_range(self, keys: np.ndarray, prefix: str) -> tuple:
+        return (int(np.searchsorted(keys, prefix, side='left')),
+                int(np.searchsorted(keys, prefix + '\U0010ffff', side='left')))
+
+    def search(self, query: str = None, manufacturers=None, **ranges) -> np.ndarray:
+        """
+        Filters the catalogue.
+
+        Parameters:
+        - query (str, optional): Prefix of the turbine name or of "company name", case-insensitive
+        - manufacturers (list, optional): Company names to include
+        - ranges: min_/max_ bounds of the RANGE_FACETS, e.g. min_power=1e6 (W), max_diameter=90 (m)
+
+        Returns:
+        - ndarray: Positions of the matching turbines in name order
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if query:
+            prefix = query.strip().lower()
+            mask[:] = False
+            start, end = self._prefix_range(self.name_keys, prefix)
+            mask[start:end] = True
+            start, end = self._prefix_range(self.label_keys, prefix)
+            mask[self.label_order[start:end]] = True
+        if manufacturers:
+            codes = np.flatnonzero(np.isin(self.manufacturers, manufacturers))
+            mask &= np.isin(self.manufacturer_codes, codes)
+        for facet, column in RANGE_FACETS.items():
+            values = getattr(self, column)
+            if ranges.get(f'min_{facet}') is not None:
+                mask &= values >= ranges[f'min_{facet}']
+            if ranges.get(f'max_{facet}') is not None:
+                mask &= values <= ranges[f'max_{facet}']
+        return np.flatnonzero(mask)
+
+    def facets(self, positions: np.ndarray) -> dict:
+        """
+        Returns:
+        - dict: Turbines per manufacturer and the min/max of every range facet among the positions
+        """
+        counts = np.bincount(self.manufacturer_codes[positions], minlength=len(self.manufacturers))
+        facets = {'manufacturers': [{'name': str(self.manufacturers[code]), 'count': int(counts[code])}
+                                    for code in np.flatnonzero(counts)]}
+        for facet, column in RANGE_FACETS.items():
+            values = getattr(self, column)[positions]
+            facets[facet] = ({'min': float(values.min()), 'max': float(values.max())} if len(values)
+                             else {'min': None, 'max': None})
+        return facets
+
+    def rows(self, positions) -> list:
+        """
+        Returns:
+        - list: One dict of specs per position, the fields of the autocomplete results
+        """
+        return [{
+            'id': int(self.ids[position]),
+            'name': self.names[position],
+            'company_name': str(self.manufacturers[self.manufacturer_codes[position]]),
+            'rotor_diameter': float(self.rotor_diameter[position]),
+            'efficiency': float(self.efficiency[position]),
+            'nominal_power': float(self.nominal_power[position]),
+            'startup_speed': float(self.startup_speed[position]),
+            'hub_height': None if np.isnan(self.hub_height[position]) else float(self.hub_height[position]),
+        } for position in positions]
+
+    def get(self, turbine_id) -> dict:
+        """
+        Returns the specs of one turbine or None if it is not in the snapshot.
+        """
+        position = self._positions.get(turbine_id)
+        return None if position is None else self.rows([position])[0]
+
+
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+
+def get_catalogue() -> CatalogueSnapshot:
+    """
+    Returns the process-local catalogue snapshot, rebuilt when the version in the cache has changed.
+    """
+    global _catalogue
+    version = get_catalogue_version()
+    registry.cache_lookup('turbine_catalogue', _catalogue is not None and _catalogue.version == version)
+    if _catalogue is None or _catalogue.version != version:
+        with _catalogue_lock:
+            if _catalogue is None or _catalogue.version != version:
+                _catalogue = CatalogueSnapshot.from_database(version)
+    return _catalogue
@@ -0,0 +1,288 @@
+import io
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+import zlib
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from WebApp.models import CalculationResult
+
+DEFAULT_RESULT_SERIES = {
+    'ENABLED': True,
+    'LOCATION': None,  # Default: result_series in BASE_DIR
+    'CHUNK_ROWS': 16384,
+    'MAX_AGE': 30 * 24 * 60 * 60,  # Seconds a result is kept, None keeps them forever
+    'MAX_SIZE': 5 * 1024 ** 3,  # Bytes in LOCATION, the oldest results are removed first, None for no limit
+    'EVICTION_INTERVAL': 60 * 60,  # Seconds between the evictions of a job worker, None disables them
+}
+
+# Fresh directories are never evicted: their CalculationResult may not be stored yet, and a
+# temporary directory may still be written
+EVICTION_GRACE_PERIOD = 60 * 60
+
+# Per-timestep columns of a calculation (see calculations.calculate_summary), in export order
+RESULT_COLUMNS = ('timestamp', 'hub_wind_speed', 'wind_power_w', 'solar_power_w', 'generation_kwh', 'consumption_kwh',
+                  'self_consumption_kwh', 'grid_import_kwh', 'grid_export_kwh', 'battery_charge_kwh',
+                  'battery_discharge_kwh')
+
+# Export format -> (content type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'npz': ('application/x-npz', 'npz'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+FINGERPRINT_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+class ExportError(Exception):
+    """
+    Raised when an export format cannot be produced, e.g. Parquet without pyarrow installed.
+    """
+
+
+def get_result_series_settings() -> dict:
+    return {**DEFAULT_RESULT_SERIES, **getattr(settings, 'RESULT_SERIES', {})}
+
+
+def result_series_location() -> Path:
+    return Path(get_result_series_settings()['LOCATION'] or Path(settings.BASE_DIR) / 'result_series')
+
+
+def result_series_path(fingerprint: str) -> Path:
+    if not FINGERPRINT_PATTERN.fullmatch(fingerprint):
+        raise ValueError(f"Invalid result fingerprint: {fingerprint}")
+    return result_series_location() / fingerprint
+
+
+def store_result_series(fingerprint: str, timeseries: dict):
+    """
+    Stores the per-timestep arrays of a calculation as one .npy file per column.
+
+    The directory is written under a temporary name and renamed, so readers never see a partial
+    result. An existing directory (the same inputs calculated concurrently) is kept.
+    """
+    path = result_series_path(fingerprint)
+    if path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = Path(tempfile.mkdtemp(dir=path.parent, prefix=f'.{fingerprint[:12]}-'))
+    try:
+        for name in RESULT_COLUMNS:
+            values = np.asarray(timeseries[name])
+            np.save(temporary / f'{name}.npy', values.astype('datetime64[s]' if name == 'timestamp' else np.float64))
+        os.rename(temporary, path)
+    except OSError:
+        if not path.exists():
+            raise
+    finally:
+        shutil.rmtree(temporary, ignore_errors=True)
+
+
+def open_result_series(fingerprint: str) -> dict:
+    """
+    Memory-maps the stored columns of a calculation, nothing is read before it is used.
+
+    Returns:
+    - dict: Column name -> read-only memory-mapped array, in the order of RESULT_COLUMNS
+
+    Raises:
+    - FileNotFoundError: No per-timestep data was stored for the fingerprint
+    """
+    path = result_series_path(fingerprint)
+    return {name: np.load(path / f'{name}.npy', mmap_mode='r', allow_pickle=False) for name in RESULT_COLUMNS}
+
+
+@receiver(post_delete, sender=CalculationResult)
+def _delete_result_series(sender, instance, **kwargs):
+    try:
+        shutil.rmtree(result_series_path(instance.fingerprint), ignore_errors=True)
+    except ValueError:
+        pass
+
+
+def _directory_size(path) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def evict_result_series(now: float = None) -> dict:
+    """
+    Enforces RESULT_SERIES['MAX_AGE'] and RESULT_SERIES['MAX_SIZE'] on the stored per-timestep arrays.
+
+    Results older than MAX_AGE are removed, then the oldest ones until LOCATION is within MAX_SIZE.
+    The CalculationResult is deleted with its arrays, so the same inputs are calculated (and
+    stored) again instead of returning a result that cannot be exported. Directories without a
+    result and leftovers of interrupted writes are removed as well.
+
+    Parameters:
+    - now (float, optional): Current time as a Unix timestamp
+
+    Returns:
+    - dict: Number of 'removed' results and 'freed_bytes'
+    """
+    options = get_result_series_settings()
+    location = result_series_location()
+    now = time.time() if now is None else now
+    removed = freed = 0
+    if not location.is_dir():
+        return {'removed': removed, 'freed_bytes': freed}
+
+    stored = []
+    for entry in os.scandir(location):
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        age = now - entry.stat().st_mtime
+        if FINGERPRINT_PATTERN.fullmatch(entry.name):
+            stored.append((age, entry.name, _directory_size(entry.path)))
+        elif entry.name.startswith('.') and age > EVICTION_GRACE_PERIOD:
+            freed += _directory_size(entry.path)
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    max_age, max_size = options['MAX_AGE'], options['MAX_SIZE']
+    total = sum(size for _, _, size in stored)
+    # Oldest first
+    for age, fingerprint, size in sorted(stored, reverse=True):
+        too_old = max_age is not None and age > max_age
+        too_large = max_size is not None and total > max_size
+        if age <= EVICTION_GRACE_PERIOD or not (too_old or too_large):
+            continue
+        # The post_delete receiver removes the directory, orphaned ones are removed here
+        CalculationResult.objects.filter(fingerprint=fingerprint).delete()
+        shutil.rmtree(location / fingerprint, ignore_errors=True)
+        removed += 1
+        freed += size
+        total -= size
+
+    return {'removed': removed, 'freed_bytes': freed}
+
+
+def _chunks(columns: dict, chunk_rows: int):
+    length = len(next(iter(columns.values())))
+    for start in range(0, length, chunk_rows):
+        yield {name: values[start:start + chunk_rows] for name, values in columns.items()}
+
+
+class _StreamBuffer(io.RawIOBase):
+    """
+    Write-only, unseekable file that collects the written bytes until the generator drains them.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _gzip(stream):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    for data in stream:
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def csv_stream(columns: dict, chunk_rows: int):
+    """
+    Yields a CSV file (header and one row per timestep), formatted chunk by chunk.
+
+    Values are written as the shortest repr() that reads back to the same float, so the CSV holds
+    exactly the numbers of the .npz export.
+    """
+    yield (','.join(columns) + '\n').encode()
+    line = ','.join('%s' if name == 'timestamp' else '%r' for name in columns)
+    for chunk in _chunks(columns, chunk_rows):
+        values = [np.datetime_as_string(values, unit='s').tolist() if name == 'timestamp' else values.tolist()
+                  for name, values in chunk.items()]
+        yield ''.join(line % row + '\n' for row in zip(*values)).encode()
+
+
+def npz_stream(columns: dict, chunk_rows: int, compress: bool = False):
+    """
+    Yields a NumPy .npz archive (one .npy member per column, like np.savez), written in chunks.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED,
+                         allowZip64=True) as archive:
+        for name, values in columns.items():
+            force_zip64 = values.nbytes + 1024 >= zipfile.ZIP64_LIMIT
+            with archive.open(f'{name}.npy', 'w', force_zip64=force_zip64) as member:
+                np.lib.format.write_array_header_1_0(member, np.lib.format.header_data_from_array_1_0(values))
+                for start in range(0, len(values), chunk_rows):
+                    member.write(np.ascontiguousarray(values[start:start + chunk_rows]).tobytes())
+                    yield buffer.drain()
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def parquet_stream(columns: dict, chunk_rows: int, compress: bool = False):
+    """
+    Yields a Parquet file with one row group per chunk. Needs the optional pyarrow package.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Parquet export needs the pyarrow package.")
+
+    def generate():
+        buffer = _StreamBuffer()
+        schema = pa.schema([(name, pa.timestamp('s') if name == 'timestamp' else pa.float64()) for name in columns])
+        with pq.ParquetWriter(pa.PythonFile(buffer, mode='w'), schema,
+                              compression='gzip' if compress else 'snappy') as writer:
+            for chunk in _chunks(columns, chunk_rows):
+                writer.write_table(pa.table({name: np.asarray(values) for name, values in chunk.items()},
+                                            schema=schema))
+                yield buffer.drain()
+        yield buffer.drain()
+
+    return generate()
+
+
+def export_stream(columns: dict, file_format: str, compress: bool = False, chunk_rows: int = None) -> tuple:
+    """
+    Streams the per-timestep result in one of the EXPORT_FORMATS, memory use depends on the
+    chunk size only, not on the length of the series.
+
+    Parameters:
+    - columns (dict): Column arrays, e.g. from open_result_series()
+    - file_format (str): 'csv', 'npz' or 'parquet'
+    - compress (bool): gzip the CSV file, deflate the .npz members or gzip the Parquet pages
+    - chunk_rows (int, optional): Rows formatted per chunk (Parquet row group size)
+
+    Returns:
+    - tuple: (iterator of bytes, content type, file name extension)
+    """
+    chunk_rows = chunk_rows or get_result_series_settings()['CHUNK_ROWS']
+    content_type, extension = EXPORT_FORMATS[file_format]
+    if file_format == 'csv':
+        if compress:
+            return _gzip(csv_stream(columns, chunk_rows)), 'application/gzip', 'csv.gz'
+        return csv_stream(columns, chunk_rows), content_type, extension
+    if file_format == 'npz':
+        return npz_stream(columns, chunk_rows, compress), content_type, extension
+    return parquet_stream(columns, chunk_rows, compress), content_type, extension
@@ -3,22 +3,56 @@ from datetime import timedelta, datetime
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.urls import reverse
 from rest_framework.exceptions import ValidationError
 
-from WebApp.models import Turbine
+from WebApp.catalogue import get_catalogue
+from WebApp.models import Turbine, PVSystem
+from WebApp.preprocessing import MEASUREMENT_HEIGHT
+
+
+class TurbineAutocompleteWidget(forms.Widget):
+    """
+    Search box over the catalogue (see api.turbine_search_api) in place of a <select> with every
+    turbine, only the id of the chosen turbine is submitted.
+    """
+    template_name = 'widgets/turbine_autocomplete.html'
+
+    class Media:
+        js = ('turbine_autocomplete.js',)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['search_url'] = reverse('turbine_search_api')
+        turbine = get_catalogue().get(int(value)) if str(value or '').isdigit() else None
+        context['widget']['label'] = f"{turbine['company_name']} {turbine['name']}" if turbine else ''
+        return context
 
 
 class SelectTurbineForm(forms.Form):
+    # Only the submitted id is looked up, the catalogue is never listed as a whole
     turbine = forms.ModelChoiceField(
         queryset=Turbine.objects.all(),
         required=True,
-        label="Select a Turbine"
+        label="Select a Turbine",
+        widget=TurbineAutocompleteWidget,
+    )
+
+class SelectPVSystemForm(forms.Form):
+    pv_system = forms.ModelChoiceField(
+        queryset=PVSystem.objects.all(),
+        required=False,
+        label="Add Solar Panels (optional)"
     )
 
 class TurbineForm(forms.ModelForm):
     class Meta:
         model = Turbine
-        fields = ['name', 'company_name', 'rotor_diameter', 'efficiency', 'nominal_power', 'startup_speed']
+        fields = ['name', 'company_name', 'rotor_diameter', 'efficiency', 'nominal_power', 'startup_speed', 'hub_height']
+
+    def validate_unique(self):
+        # Custom turbines are not saved to the catalogue, so their name may repeat a catalogue turbine
+        pass
 
 
 class WindDataForm(forms.Form):
@@ -35,6 +69,18 @@ class EnergyConsumptionForm(forms.Form):
 
 class WindCSVForm(forms.Form):
     csv_file = forms.FileField(label="Upload CSV File")
+    latitude = forms.FloatField(required=False, min_value=-90, max_value=90,
+                                label="Latitude (required for solar panels)")
+    longitude = forms.FloatField(required=False, min_value=-180, max_value=180,
+                                 label="Longitude (required for solar panels)")
+    measurement_height = forms.FloatField(required=False, initial=MEASUREMENT_HEIGHT, min_value=0.5, max_value=300,
+                                          label="Height of the wind measurements (m)")
+    elevation = forms.FloatField(required=False, min_value=-500, max_value=9000,
+                                 label="Site elevation above sea level (m, optional)")
+
+    def clean_measurement_height(self):
+        # Weather stations measure the wind at 10 m
+        return self.cleaned_data['measurement_height'] or MEASUREMENT_HEIGHT
 
 
 class WindAPIForm(forms.Form):
@@ -43,6 +89,11 @@ class WindAPIForm(forms.Form):
     longitude = forms.FloatField(widget=forms.HiddenInput())
     start_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
     end_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    resolution = forms.ChoiceField(
+        choices=[('hourly', 'Hourly (more accurate)'), ('daily', 'Daily')],
+        initial='hourly',
+        label="Data resolution"
+    )
 
     def clean(self):
         cleaned_data = super().clean()
@@ -52,7 +103,7 @@ class WindAPIForm(forms.Form):
         # Get the current date
         today = datetime.today().date()
 
-        # Ensure that start_date and end_date are within 1 year from today
+        # Any range in the past is allowed, long ranges are fetched in yearly chunks
         if start_date and end_date:
             # Check that both dates are in the past (before today)
             if start_date >= today:
@@ -64,10 +115,6 @@ class WindAPIForm(forms.Form):
             if start_date > end_date:
                 raise ValidationError("Start date must be before end date.")
 
-            # Check that the range is less than 1 year
-            if (end_date - start_date).days > 365:
-                raise ValidationError("The date range must be less than one year.")
-
         return cleaned_data
 
 class LoginForm(AuthenticationForm):
@@ -114,4 +161,11 @@ class EnergyAverageForm(forms.Form):
     )
 
 class EnergyCSVForm(forms.Form):
-    csv_file = forms.FileField(label="Upload CSV File")
\ No newline at end of file
+    csv_file = forms.FileField(label="Upload CSV File")
+
+class BatteryForm(forms.Form):
+    battery_capacity = forms.FloatField(required=False, min_value=0, label="Battery capacity (kWh, optional)")
+    battery_power = forms.FloatField(required=False, min_value=0,
+                                     label="Battery charge/discharge power (kW, empty for unlimited)")
+    battery_efficiency = forms.FloatField(required=False, initial=0.9, min_value=0.5, max_value=1.0,
+                                          label="Battery round-trip efficiency")
\ No newline at end of file
@@ -0,0 +1,226 @@
+import codecs
+import csv
+
+from WebApp.utils import parse_timestamp
+
+# Bytes read from a file object that has no chunks() method
+READ_CHUNK_SIZE = 64 * 1024
+
+# Only the first bad rows are kept with their line numbers, the rest are just counted
+MAX_REPORTED_ERRORS = 50
+
+# Accepted header names for every column, lower case
+WIND_COLUMNS = {
+    'date': ('date', 'time', 'timestamp', 'datetime'),
+    'wind_speed': ('wind_speed', 'wspd', 'speed', 'wind'),
+    'temperature': ('temperature', 'temp', 'tavg'),
+    'pressure': ('pressure', 'pres'),
+    'irradiance': ('irradiance', 'ghi'),
+    'sunshine': ('sunshine', 'tsun'),
+    'humidity': ('humidity', 'rhum', 'relative_humidity'),
+    'wind_direction': ('wind_direction', 'wdir', 'direction'),
+}
+CONSUMPTION_COLUMNS = {
+    'date': ('date', 'time', 'timestamp', 'datetime'),
+    'consumption': ('consumption', 'energy', 'kwh', 'consumption_kwh', 'value'),
+}
+
+
+class IngestReport:
+    """
+    Collects the outcome of a streamed CSV upload: accepted rows and bad rows with their line numbers.
+    """
+
+    def __init__(self, max_errors: int = MAX_REPORTED_ERRORS):
+        self.rows = 0
+        self.error_count = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, line_number: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line_number, message))
+
+    def summary(self) -> str:
+        """
+        Returns a short human-readable description of the bad rows.
+        """
+        lines = ", ".join(f"line {line}: {message}" for line, message in self.errors[:5])
+        more = self.error_count - min(len(self.errors), 5)
+        if more > 0:
+            lines += f" (and {more} more)"
+        return f"Skipped {self.error_count} invalid row(s) - {lines}"
+
+
+def iter_lines(file, encoding: str = 'utf-8-sig'):
+    """
+    Lazily decodes an uploaded file into text lines without reading it into memory at once.
+
+    Parameters:
+    - file: A Django UploadedFile (read with chunks()) or any binary file-like object
+    - encoding (str): Text encoding, the default also strips a UTF-8 byte order mark
+
+    Yields:
+    - str: One line including its line ending
+    """
+    if hasattr(file, 'chunks'):
+        chunks = file.chunks()
+    else:
+        chunks = iter(lambda: file.read(READ_CHUNK_SIZE), b'')
+
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    pending = ''
+
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.splitlines(keepends=True)
+        # The last piece may be an incomplete line, keep it for the next chunk
+        pending = lines.pop() if lines and not lines[-1].endswith('\n') else ''
+        yield from lines
+
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def iter_csv_rows(file):
+    """
+    Parses an uploaded CSV file row by row.
+
+    Yields:
+    - tuple: (line_number, row) where row is a list of stripped cell values, empty rows are skipped
+    """
+    reader = csv.reader(iter_lines(file))
+    for row in reader:
+        row = [cell.strip() for cell in row]
+        if any(row):
+            yield reader.line_num, row
+
+
+def _column_positions(header: list, columns: dict, required: tuple):
+    """
+    Maps column names to positions if the row is a header, returns None for a data row.
+
+    Raises:
+    - ValueError: The header lacks one of the required columns
+    """
+    names = [cell.lower() for cell in header]
+    positions = {}
+    for column, aliases in columns.items():
+        for alias in aliases:
+            if alias in names:
+                positions[column] = names.index(alias)
+                break
+
+    if 'date' not in positions:
+        return None
+    for column in required:
+        if column not in positions:
+            raise ValueError(f"header has no {column} column (accepted names: {', '.join(columns[column])})")
+    return positions
+
+
+def _parse_float(value: str, name: str, minimum: float, maximum: float):
+    number = float(value)
+    if not (minimum <= number <= maximum):
+        raise ValueError(f"{name} {number} is outside of the range {minimum} - {maximum}")
+    return number
+
+
+def _iter_records(file, columns: dict, required: tuple, report: IngestReport):
+    """
+    Yields (line_number, dict of raw cell values) for every data row, honouring an optional header.
+
+    A header without the required columns is recorded in the report and no rows are yielded.
+    """
+    # Without a header the columns are expected in the order they are declared
+    positions = {column: index for index, column in enumerate(columns)}
+    first = True
+
+    for line_number, row in iter_csv_rows(file):
+        if first:
+            first = False
+            try:
+                header_positions = _column_positions(row, columns, required)
+            except ValueError as e:
+                report.add_error(line_number, str(e))
+                return
+            if header_positions is not None:
+                positions = header_positions
+                continue
+
+        yield line_number, {
+            column: row[index] if index < len(row) and row[index] != '' else None
+            for column, index in positions.items()
+        }
+
+
+def parse_wind_rows(file, report: IngestReport):
+    """
+    Streams, validates and converts the rows of an uploaded wind CSV file.
+
+    Columns are date, wind_speed and the optional temperature (°C), pressure (hPa), irradiance
+    (W/m²), sunshine (minutes), humidity (%) and wind_direction (degrees the wind comes from),
+    either in that order or named in a header row.
+    Bad rows are recorded in the report and skipped.
+
+    Parameters:
+    - file: The uploaded CSV file
+    - report (IngestReport): Collects the row count and the bad rows
+
+    Yields:
+    - tuple: (timestamp, wind_speed, temperature, pressure, irradiance, sunshine, humidity,
+      wind_direction), the optional values may be None
+    """
+    for line_number, record in _iter_records(file, WIND_COLUMNS, ('date', 'wind_speed'), report):
+        try:
+            if record['date'] is None or record['wind_speed'] is None:
+                raise ValueError("date and wind speed are required")
+            observation = (
+                parse_timestamp(record['date']),
+                _parse_float(record['wind_speed'], 'Wind speed', 0.0, 100.0),
+                _parse_float(record['temperature'], 'Temperature', -90.0, 60.0)
+                if record.get('temperature') is not None else None,
+                _parse_float(record['pressure'], 'Pressure', 500.0, 1100.0)
+                if record.get('pressure') is not None else None,
+                _parse_float(record['irradiance'], 'Irradiance', 0.0, 1500.0)
+                if record.get('irradiance') is not None else None,
+                _parse_float(record['sunshine'], 'Sunshine', 0.0, 1440.0)
+                if record.get('sunshine') is not None else None,
+                _parse_float(record['humidity'], 'Humidity', 0.0, 100.0)
+                if record.get('humidity') is not None else None,
+                _parse_float(record['wind_direction'], 'Wind direction', 0.0, 360.0) % 360
+                if record.get('wind_direction') is not None else None,
+            )
+        except ValueError as e:
+            report.add_error(line_number, str(e))
+            continue
+
+        report.rows += 1
+        yield observation
+
+
+def parse_consumption_rows(file, report: IngestReport):
+    """
+    Streams, validates and converts the rows of an uploaded energy consumption CSV file.
+
+    Columns are date and consumption (kWh per row), either in that order or named in a header row.
+
+    Yields:
+    - tuple: (timestamp, consumption_kwh)
+    """
+    for line_number, record in _iter_records(file, CONSUMPTION_COLUMNS, ('date', 'consumption'), report):
+        try:
+            if record['date'] is None or record['consumption'] is None:
+                raise ValueError("date and consumption are required")
+            row = (
+                parse_timestamp(record['date']),
+                _parse_float(record['consumption'], 'Consumption', 0.0, 1e9),
+            )
+        except ValueError as e:
+            report.add_error(line_number, str(e))
+            continue
+
+        report.rows += 1
+        yield row
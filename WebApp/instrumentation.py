@@ -0,0 +1,337 @@
+import bisect
+import contextvars
+import inspect
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+DEFAULT_INSTRUMENTATION = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+    'SERVER_TIMING': True,
+    'METRICS_ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+# Upper bounds of the latency histogram buckets in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Upper bounds of the queries per request buckets
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Metric name -> (type, help text)
+METRICS = {
+    'webapp_http_requests_total': ('counter', "Requests by view, method and status code"),
+    'webapp_http_request_duration_seconds': ('histogram', "Request latency by view"),
+    'webapp_stage_duration_seconds': ('histogram', "Duration of the instrumented stages (sampled)"),
+    'webapp_db_queries_per_request': ('histogram', "Database queries per request by view (sampled)"),
+    'webapp_db_query_duration_seconds_total': ('counter', "Time spent in database queries by view (sampled)"),
+    'webapp_cache_lookups_total': ('counter', "Cache lookups by cache and result (hit or miss)"),
+    'webapp_cache_hit_ratio': ('gauge', "Share of cache lookups that were hits"),
+}
+
+
+def get_instrumentation_settings() -> dict:
+    return {**DEFAULT_INSTRUMENTATION, **getattr(settings, 'INSTRUMENTATION', {})}
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """
+    Process-local counters and histograms, rendered in the Prometheus text format.
+
+    Collectors registered with add_collector() are called on every render and return
+    (name, labels, value) samples of values kept elsewhere, e.g. the weather cache statistics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        # (name, labels) -> [counts per bucket, sum, count]
+        self._histograms = {}
+        self._buckets = {}
+        self._collectors = []
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name: str, value: float, buckets=DURATION_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        position = bisect.bisect_left(buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+                self._buckets[name] = buckets
+            histogram[0][position] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def cache_lookup(self, cache: str, hit: bool):
+        self.inc('webapp_cache_lookups_total', cache=cache, result='hit' if hit else 'miss')
+
+    def collect(self) -> dict:
+        """
+        Returns:
+        - dict: Metric name -> list of (labels, value) samples, histograms as their _bucket, _sum
+          and _count series
+        """
+        samples = defaultdict(list)
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [(key, (list(counts), total, count)) for key, (counts, total, count)
+                          in self._histograms.items()]
+
+        lookups = defaultdict(dict)
+        for (name, labels), value in counters:
+            samples[name].append((labels, value))
+            if name == 'webapp_cache_lookups_total':
+                labels = dict(labels)
+                lookups[labels['cache']][labels['result']] = value
+
+        for (name, labels), (counts, total, count) in histograms:
+            cumulative = 0
+            for bound, bucket_count in zip(self._buckets[name] + (math.inf,), counts):
+                cumulative += bucket_count
+                samples[name].append((labels + (('le', _format_value(bound)),), cumulative, '_bucket'))
+            samples[name].append((labels, total, '_sum'))
+            samples[name].append((labels, count, '_count'))
+
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                samples[name].append((tuple(sorted(labels.items())), value))
+                if name == 'webapp_cache_lookups_total':
+                    lookups[labels['cache']][labels['result']] = value
+
+        for cache, results in lookups.items():
+            total = sum(results.values())
+            samples['webapp_cache_hit_ratio'].append(((('cache', cache),), results.get('hit', 0) / total
+                                                      if total else 0.0))
+        return samples
+
+    def render(self) -> str:
+        lines = []
+        for name, series in sorted(self.collect().items()):
+            kind, help_text = METRICS.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample in series:
+                labels, value, suffix = sample if len(sample) == 3 else (*sample, '')
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class Trace:
+    """
+    The stages timed while handling one sampled request (or job).
+    """
+
+    def __init__(self):
+        # name -> [total seconds, calls], in the order the stages were first entered
+        self.stages = {}
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+    def add(self, name: str, seconds: float):
+        stage = self.stages.setdefault(name, [0.0, 0])
+        stage[0] += seconds
+        stage[1] += 1
+        registry.observe('webapp_stage_duration_seconds', seconds, stage=name)
+
+    def server_timing(self, total: float) -> str:
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, (seconds, _) in self.stages.items()]
+        if self.db_queries:
+            entries.append(f'db;desc="{self.db_queries} queries";dur={self.db_seconds * 1000:.1f}')
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ', '.join(entries)
+
+    def summary(self) -> str:
+        return ', '.join(f"{name} {seconds * 1000:.1f} ms" for name, (seconds, _) in self.stages.items())
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper: counts the queries of the trace
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.db_queries += 1
+
+
+_current_trace = contextvars.ContextVar('instrumentation_trace', default=None)
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'start')
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.trace.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str):
+    """
+    Times a block as a stage of the current trace, a shared no-op outside sampled requests.
+
+        with span('meteostat'):
+            ...
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return _Span(trace, name)
+
+
+def timed(name: str):
+    """
+    Decorator timing every call of a function as a stage (see span()).
+
+    For generator functions only the time spent inside the generator counts, not the time the
+    consumer spends between the items.
+    """
+    def decorator(function):
+        if inspect.isgeneratorfunction(function):
+            @wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                trace = _current_trace.get()
+                if trace is None:
+                    return (yield from function(*args, **kwargs))
+
+                generator = function(*args, **kwargs)
+                elapsed = 0.0
+                try:
+                    while True:
+                        start = time.perf_counter()
+                        try:
+                            item = next(generator)
+                        except StopIteration as stop:
+                            elapsed += time.perf_counter() - start
+                            return stop.value
+                        elapsed += time.perf_counter() - start
+                        yield item
+                finally:
+                    generator.close()
+                    trace.add(name, elapsed)
+            return generator_wrapper
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is None:
+                return function(*args, **kwargs)
+            with _Span(trace, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def is_sampled(sample_rate: float = None) -> bool:
+    if sample_rate is None:
+        sample_rate = get_instrumentation_settings()['SAMPLE_RATE']
+    return sample_rate >= 1.0 or (sample_rate > 0.0 and random.random() < sample_rate)
+
+
+@contextmanager
+def trace(sampled: bool = True, count_queries: bool = True):
+    """
+    Makes a new trace current for the block, yields None when it is not sampled.
+
+    Parameters:
+    - sampled (bool): False skips the trace, spans inside are no-ops
+    - count_queries (bool): Count the database queries of the block
+    """
+    if not sampled:
+        yield None
+        return
+
+    current = Trace()
+    token = _current_trace.set(current)
+    try:
+        with ExitStack() as stack:
+            if count_queries:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(current))
+            yield current
+    finally:
+        _current_trace.reset(token)
+
+
+class InstrumentationMiddleware:
+    """
+    Counts and times every request per view; sampled requests also get stage timings, database
+    query counts and a Server-Timing header. Not loaded when INSTRUMENTATION['ENABLED'] is False.
+    """
+
+    def __init__(self, get_response):
+        options = get_instrumentation_settings()
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = options['SAMPLE_RATE']
+        self.server_timing = options['SERVER_TIMING']
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with trace(is_sampled(self.sample_rate)) as current:
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unmatched'
+        registry.inc('webapp_http_requests_total', view=view, method=request.method,
+                     status=str(response.status_code))
+        registry.observe('webapp_http_request_duration_seconds', duration, view=view)
+
+        if current is not None:
+            registry.observe('webapp_db_queries_per_request', current.db_queries, buckets=QUERY_BUCKETS, view=view)
+            registry.inc('webapp_db_query_duration_seconds_total', current.db_seconds, view=view)
+            if self.server_timing:
+                response['Server-Timing'] = current.server_timing(duration)
+        return response
@@ -0,0 +1,199 @@
+import logging
+import threading
+import time
+import traceback
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from WebApp.exports import evict_result_series, get_result_series_settings
+from WebApp.instrumentation import is_sampled, trace
+from WebApp.models import CalculationJob
+
+logger = logging.getLogger(__name__)
+
+# Job kind -> dotted path of a function taking the payload dict and returning a JSON-serializable result
+JOB_HANDLERS = {
+    'calculate_result': 'WebApp.calculations.run_calculation',
+}
+
+
+def enqueue_job(kind: str, payload: dict, fingerprint: str = '') -> CalculationJob:
+    """
+    Queues a job for the worker, returns immediately.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return CalculationJob.objects.create(kind=kind, payload=payload, fingerprint=fingerprint)
+
+
+def get_stale_timeout() -> float:
+    """
+    Seconds without a heartbeat after which a running job counts as abandoned by its worker.
+    """
+    return getattr(settings, 'CALCULATION_JOB_STALE_TIMEOUT', 60.0)
+
+
+def stale_jobs():
+    """
+    Running jobs whose worker stopped sending heartbeats, e.g. because the process was killed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=get_stale_timeout())
+    return CalculationJob.objects.filter(status=CalculationJob.STATUS_RUNNING).filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff))
+
+
+def find_active_job(fingerprint: str):
+    """
+    Returns a queued or running job with the same inputs, ignoring running jobs of a dead worker.
+    """
+    return (CalculationJob.objects.filter(fingerprint=fingerprint, status__in=[CalculationJob.STATUS_QUEUED,
+                                                                             CalculationJob.STATUS_RUNNING])
+            .exclude(pk__in=stale_jobs().values('pk'))
+            .order_by('-created_at').first())
+
+
+def recover_stale_jobs() -> int:
+    """
+    Queues stale running jobs again, or fails them once they used up
+    settings.CALCULATION_JOB_MAX_ATTEMPTS (a job that keeps killing its worker must not loop forever).
+
+    Returns:
+    - int: Number of recovered jobs
+    """
+    max_attempts = getattr(settings, 'CALCULATION_JOB_MAX_ATTEMPTS', 2)
+    recovered = 0
+    for job in stale_jobs().only('pk', 'attempts'):
+        if job.attempts >= max_attempts:
+            changes = {'status': CalculationJob.STATUS_FAILED, 'finished_at': timezone.now(),
+                       'error': f"The worker running the job stopped responding ({job.attempts} attempts)."}
+        else:
+            changes = {'status': CalculationJob.STATUS_QUEUED, 'started_at': None, 'heartbeat_at': None}
+        # Conditional like the claim, the job may have finished in the meantime
+        updated = stale_jobs().filter(pk=job.pk).update(**changes)
+        if updated:
+            logger.warning(f"Calculation job {job.id} was abandoned by its worker, now {changes['status']}")
+            recovered += updated
+    return recovered
+
+
+def claim_next_job():
+    """
+    Atomically marks the oldest queued job as running.
+
+    The conditional UPDATE only succeeds for one worker, so several worker threads or
+    processes can poll the same table without handing out a job twice.
+
+    Returns:
+    - CalculationJob: The claimed job or None if the queue is empty
+    """
+    while True:
+        job = CalculationJob.objects.filter(status=CalculationJob.STATUS_QUEUED).order_by('created_at').first()
+        if job is None:
+            return None
+
+        started_at = timezone.now()
+        claimed = CalculationJob.objects.filter(pk=job.pk, status=CalculationJob.STATUS_QUEUED).update(
+            status=CalculationJob.STATUS_RUNNING, started_at=started_at, heartbeat_at=started_at,
+            attempts=F('attempts') + 1)
+        if claimed:
+            job.status = CalculationJob.STATUS_RUNNING
+            job.started_at = job.heartbeat_at = started_at
+            job.attempts += 1
+            return job
+
+
+def run_job(job: CalculationJob) -> CalculationJob:
+    """
+    Executes a claimed job with its handler and stores the result or the error.
+    """
+    # Stage timings of sampled jobs go to the stage histograms of the worker process and the log
+    with trace(is_sampled(), count_queries=False) as current:
+        try:
+            handler = import_string(JOB_HANDLERS[job.kind])
+            job.result = handler(job.payload)
+            job.status = CalculationJob.STATUS_DONE
+        except Exception as e:
+            logger.exception(f"Calculation job {job.id} failed")
+            job.status = CalculationJob.STATUS_FAILED
+            job.error = f"{e}\n{traceback.format_exc()}"
+    if current is not None and current.stages:
+        logger.info(f"Calculation job {job.id} ({job.kind}): {current.summary()}")
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+    return job
+
+
+def _run_in_thread(job: CalculationJob):
+    # Worker threads get their own database connection, close it when done
+    try:
+        return run_job(job)
+    finally:
+        close_old_connections()
+
+
+def run_worker(workers: int = None, poll_interval: float = None, once: bool = False, stop_event=None):
+    """
+    Processes queued jobs with a local thread pool until stopped.
+
+    Parameters:
+    - workers (int, optional): Number of jobs executed concurrently (settings.CALCULATION_JOB_WORKERS)
+    - poll_interval (float, optional): Seconds to wait when the queue is empty
+      (settings.CALCULATION_JOB_POLL_INTERVAL)
+    - once (bool): Stop when the queue is empty instead of waiting for new jobs
+    - stop_event (threading.Event, optional): Set it to stop the worker from another thread
+    """
+    workers = workers or getattr(settings, 'CALCULATION_JOB_WORKERS', 2)
+    poll_interval = poll_interval or getattr(settings, 'CALCULATION_JOB_POLL_INTERVAL', 1.0)
+    stop_event = stop_event or threading.Event()
+    # Heartbeats are sent a few times per stale timeout, stale jobs of other workers are looked for as often
+    heartbeat_interval = get_stale_timeout() / 4
+    next_heartbeat = 0.0
+    # Stored per-timestep results are evicted by age and size (see exports.evict_result_series)
+    eviction_interval = get_result_series_settings()['EVICTION_INTERVAL']
+    next_eviction = 0.0
+    # Future -> id of the job it runs
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='calculation-job') as executor:
+        while not stop_event.is_set():
+            if time.monotonic() >= next_heartbeat:
+                next_heartbeat = time.monotonic() + heartbeat_interval
+                if running:
+                    CalculationJob.objects.filter(pk__in=list(running.values()),
+                                                  status=CalculationJob.STATUS_RUNNING).update(
+                        heartbeat_at=timezone.now())
+                recover_stale_jobs()
+
+            if eviction_interval and time.monotonic() >= next_eviction:
+                next_eviction = time.monotonic() + eviction_interval
+                try:
+                    evicted = evict_result_series()
+                    if evicted['removed']:
+                        logger.info(f"Evicted {evicted['removed']} stored results "
+                                    f"({evicted['freed_bytes'] / 1024 ** 2:.1f} MB)")
+                except OSError:
+                    logger.exception("Evicting stored results failed")
+
+            # Only claim as many jobs as there are free workers, the rest stay queued
+            while len(running) < workers:
+                job = claim_next_job()
+                if job is None:
+                    break
+                running[executor.submit(_run_in_thread, job)] = job.pk
+
+            if not running:
+                if once:
+                    break
+                stop_event.wait(poll_interval)
+                continue
+
+            finished = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED).done
+            for future in finished:
+                del running[future]
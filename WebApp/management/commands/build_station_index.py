@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from WebApp.stations import build_station_index, get_station_index_path
+
+
+class Command(BaseCommand):
+    help = "Downloads the station inventory of the weather provider and rebuilds the station index"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = build_station_index()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(index)} stations in {get_station_index_path()} in {elapsed:.1f} s"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from WebApp.exports import evict_result_series, result_series_location
+
+
+class Command(BaseCommand):
+    help = "Removes stored per-timestep results above RESULT_SERIES['MAX_AGE'] or RESULT_SERIES['MAX_SIZE']"
+
+    def handle(self, *args, **options):
+        evicted = evict_result_series()
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {evicted['removed']} results ({evicted['freed_bytes'] / 1024 ** 2:.1f} MB) "
+            f"from {result_series_location()}"))
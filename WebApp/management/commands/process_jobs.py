@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from WebApp.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Runs queued calculation jobs with a local thread pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Jobs executed concurrently (default: settings.CALCULATION_JOB_WORKERS)")
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit when the queue is empty instead of waiting for new jobs")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Processing calculation jobs, press CTRL+C to stop.")
+        try:
+            run_worker(workers=options['workers'], poll_interval=options['poll_interval'], once=options['once'])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped.")
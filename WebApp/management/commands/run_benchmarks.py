@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from WebApp.benchmarks import run_benchmarks, compare, save_results, load_results, DEFAULT_THRESHOLD
+
+
+class Command(BaseCommand):
+    help = "Measures throughput and peak memory of the calculation hot paths offline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Write the results as a JSON baseline to this file")
+        parser.add_argument('--compare', help="Baseline JSON file to compare the results with")
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help="Throughput drop (fraction) reported as a regression")
+        parser.add_argument('--filter', help="Only run the cases whose name contains this text")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per case, the fastest counts")
+        parser.add_argument('--full', action='store_true', help="Include the 100 MB and 1 GB CSV files")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = load_results(options['compare'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read the baseline: {e}")
+
+        def progress(name, result):
+            self.stdout.write(f"{name:<55} {format_throughput(result['throughput'], result['unit']):>22} "
+                              f"{result['peak_memory_bytes'] / 2 ** 20:>10.1f} MiB")
+
+        results = run_benchmarks(options['filter'], options['full'], options['repeat'], progress=progress)
+
+        if options['output']:
+            save_results(results, options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(results['results'])} results to {options['output']}"))
+
+        if baseline is not None:
+            regressions = []
+            for name, before, after, change, regression in compare(baseline, results, options['threshold']):
+                line = f"{name:<55} {change:+8.1%}"
+                if regression:
+                    regressions.append(name)
+                    self.stdout.write(self.style.ERROR(line + "  SLOWER"))
+                else:
+                    self.stdout.write(line)
+
+            if regressions:
+                raise CommandError(f"{len(regressions)} case(s) are more than {options['threshold']:.0%} "
+                                   f"slower than the baseline")
+            self.stdout.write(self.style.SUCCESS("No regressions"))
+
+
+def format_throughput(value: float, unit: str) -> str:
+    if unit == 'bytes/s':
+        return f"{value / 2 ** 20:.1f} MiB/s"
+    for factor, prefix in ((1e9, 'G'), (1e6, 'M'), (1e3, 'k')):
+        if value >= factor:
+            return f"{value / factor:.2f} {prefix}{unit}"
+    return f"{value:.2f} {unit}"
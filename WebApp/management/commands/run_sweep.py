@@ -0,0 +1,44 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from WebApp.models import Turbine
+from WebApp.sweep import run_sweep, TURBINES_PER_TASK
+
+
+class Command(BaseCommand):
+    help = "Evaluates the turbine catalogue for many sites and years in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sites', required=True,
+                            help="CSV file with the columns name, latitude, longitude")
+        parser.add_argument('--years', required=True, nargs='+', type=int, help="Calendar years to evaluate")
+        parser.add_argument('--output', required=True, help="Result file, .csv or .parquet")
+        parser.add_argument('--turbines', nargs='*', type=int, default=None,
+                            help="Turbine ids to evaluate (default: the whole catalogue)")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+        parser.add_argument('--turbines-per-task', type=int, default=TURBINES_PER_TASK)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['sites'], newline='') as file:
+                sites = [
+                    {'name': row['name'], 'latitude': float(row['latitude']), 'longitude': float(row['longitude'])}
+                    for row in csv.DictReader(file)
+                ]
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f"Could not read the sites file: {e}")
+
+        turbines = Turbine.objects.all()
+        if options['turbines']:
+            turbines = turbines.filter(id__in=options['turbines'])
+
+        started = time.perf_counter()
+        rows = run_sweep(sites, options['years'], options['output'], turbines=turbines,
+                         workers=options['workers'], turbines_per_task=options['turbines_per_task'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {rows} results for {len(sites)} site(s) x {len(options['years'])} year(s) "
+            f"to {options['output']} in {elapsed:.1f} s"))
@@ -0,0 +1,241 @@
+import numpy as np
+
+# Hourly approximation of the BDEW H0 household standard load profile: mean load in W per
+# 1000 kWh of annual consumption for every hour of a workday, Saturday and Sunday
+H0_WINTER = np.array([
+    [67, 55, 50, 48, 48, 52, 75, 115, 125, 120, 118, 125, 140, 135, 120, 113, 120, 160, 205, 215, 195, 170, 140, 100],
+    [75, 60, 53, 50, 49, 50, 58, 80, 115, 140, 150, 155, 165, 155, 135, 125, 130, 165, 200, 205, 185, 165, 140, 105],
+    [80, 65, 56, 52, 50, 50, 55, 65, 95, 135, 160, 175, 185, 160, 135, 120, 125, 155, 190, 195, 175, 155, 125, 95],
+], dtype=np.float64)
+H0_SUMMER = np.array([
+    [75, 60, 53, 50, 50, 55, 75, 100, 110, 110, 112, 120, 135, 130, 115, 108, 110, 125, 145, 155, 160, 160, 140, 105],
+    [85, 68, 58, 53, 51, 52, 58, 75, 100, 120, 130, 135, 145, 140, 125, 115, 115, 130, 145, 150, 155, 155, 140, 110],
+    [90, 72, 60, 55, 52, 52, 55, 62, 85, 115, 135, 150, 160, 145, 125, 112, 110, 125, 140, 148, 152, 152, 135, 105],
+], dtype=np.float64)
+H0_TRANSITION = (H0_WINTER + H0_SUMMER) / 2
+# season × day type × hour
+H0_PROFILE = np.stack([H0_WINTER, H0_TRANSITION, H0_SUMMER])
+
+# Non-leap reference year the profiles are normalized over
+REFERENCE_YEAR = 2023
+
+# Steps solved per prefix scan of the battery kernel, bounds the temporary arrays
+BATTERY_CHUNK = 8192
+
+DEFAULT_BATTERY_EFFICIENCY = 0.9
+
+
+def h0_dynamization(day_of_year):
+    """
+    BDEW dynamization polynomial, scales the profile up in winter and down in summer.
+    """
+    return -3.916e-10 * day_of_year ** 4 + 3.2e-7 * day_of_year ** 3 - 7.02e-5 * day_of_year ** 2 \
+        + 2.1e-3 * day_of_year + 1.24
+
+
+def _h0_shape(hours: np.ndarray) -> np.ndarray:
+    # Unnormalized H0 load for hourly datetime64 timestamps
+    days = hours.astype('datetime64[D]')
+    hour = (hours - days).astype('timedelta64[h]').astype(np.int64)
+    day_of_year = (days - days.astype('datetime64[Y]')).astype(np.int64) + 1
+    # 1970-01-01 was a Thursday: 0 = Monday ... 6 = Sunday
+    weekday = (days.astype(np.int64) + 3) % 7
+    day_type = np.where(weekday == 6, 2, np.where(weekday == 5, 1, 0))
+
+    # Winter 1 Nov - 20 Mar, summer 15 May - 14 Sep, transition otherwise
+    month_day = (days - days.astype('datetime64[M]')).astype(np.int64) + 1
+    month = days.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    winter = (month >= 11) | (month <= 2) | ((month == 3) & (month_day <= 20))
+    summer = ((month == 5) & (month_day >= 15)) | ((month >= 6) & (month <= 8)) | ((month == 9) & (month_day <= 14))
+    season = np.where(winter, 0, np.where(summer, 2, 1))
+
+    return H0_PROFILE[season, day_type, hour] * h0_dynamization(day_of_year)
+
+
+_h0_reference_total = None
+
+
+def synthesize_load_profile(timestamps, annual_kwh: float, step_hours: float) -> np.ndarray:
+    """
+    Household consumption per timestep from an annual total, shaped with the H0 standard load profile.
+
+    The profile is normalized over a whole reference year, so a series covering only part of a
+    year gets the consumption of that season.
+
+    Parameters:
+    - timestamps (ndarray): datetime64 start of every timestep
+    - annual_kwh (float): Annual consumption in kWh
+    - step_hours (float): Length of one timestep in hours
+
+    Returns:
+    - ndarray: Consumption in kWh for every timestep
+    """
+    global _h0_reference_total
+    if _h0_reference_total is None:
+        reference = np.arange(np.datetime64(f'{REFERENCE_YEAR}-01-01T00', 'h'),
+                              np.datetime64(f'{REFERENCE_YEAR + 1}-01-01T00', 'h'))
+        _h0_reference_total = float(_h0_shape(reference).sum())
+
+    hours_per_step = max(int(round(step_hours)), 1)
+    hours = (np.asarray(timestamps, dtype='datetime64[h]')[:, None]
+             + np.arange(hours_per_step, dtype='timedelta64[h]')).ravel()
+    hourly = _h0_shape(hours) * (annual_kwh / _h0_reference_total)
+    return hourly.reshape(-1, hours_per_step).sum(axis=1)
+
+
+def resample_consumption(source_timestamps, source_kwh, timestamps, step_hours: float) -> np.ndarray:
+    """
+    Aligns measured consumption with the timesteps of a generation series.
+
+    Both are matched by hour of the year, so the consumption of one year can be compared with the
+    weather of another. Readings more frequent than hourly are summed per clock hour, coarser ones
+    are spread over the hours they cover. Hours the measurements do not cover get the mean hourly
+    consumption.
+
+    Parameters:
+    - source_timestamps (ndarray): datetime64 timestamps of the measurements
+    - source_kwh (ndarray): Consumption in kWh of every measurement
+    - timestamps (ndarray): datetime64 start of every generation timestep
+    - step_hours (float): Length of one generation timestep in hours
+
+    Returns:
+    - ndarray: Consumption in kWh for every generation timestep
+    """
+    # Sub-hourly readings are summed into clock hours first (sorted by np.unique), so 15-minute
+    # data gives hourly energies instead of the energy of one reading per hour
+    source_hours, hour_index = np.unique(np.asarray(source_timestamps, dtype='datetime64[s]').astype('datetime64[h]'),
+                                         return_inverse=True)
+    source_kwh = np.bincount(hour_index.ravel(), weights=np.asarray(source_kwh, dtype=np.float64),
+                             minlength=len(source_hours))
+
+    # Spread every hourly or coarser measurement evenly over the hours until the next one
+    source_step = np.diff(source_hours).astype(np.int64)
+    typical = int(np.median(source_step)) if len(source_step) else 1
+    source_step = np.clip(np.append(source_step, typical), 1, None)
+    hour_starts = np.repeat(source_hours, source_step) + (
+        np.arange(source_step.sum()) - np.repeat(np.cumsum(source_step) - source_step, source_step)
+    ).astype('timedelta64[h]')
+    hourly_kwh = np.repeat(source_kwh / source_step, source_step)
+
+    hour_of_year = _hour_of_year(hour_starts)
+    total = np.bincount(hour_of_year, weights=hourly_kwh, minlength=8784)
+    covered = np.bincount(hour_of_year, minlength=8784)
+    profile = np.where(covered > 0, total / np.maximum(covered, 1), hourly_kwh.mean())
+
+    hours_per_step = max(int(round(step_hours)), 1)
+    hours = (np.asarray(timestamps, dtype='datetime64[h]')[:, None]
+             + np.arange(hours_per_step, dtype='timedelta64[h]')).ravel()
+    return profile[_hour_of_year(hours)].reshape(-1, hours_per_step).sum(axis=1)
+
+
+def _hour_of_year(hours: np.ndarray) -> np.ndarray:
+    return (hours - hours.astype('datetime64[Y]')).astype('timedelta64[h]').astype(np.int64)
+
+
+def battery_state_of_charge(delta, capacity: float, initial: float = 0.0) -> np.ndarray:
+    """
+    Battery energy after every timestep: soc[t] = clip(soc[t - 1] + delta[t], 0, capacity).
+
+    Every step is a clamped shift x -> clip(x + a, low, high), and the composition of two such
+    functions is again one (a = a1 + a2, low/high = the earlier bounds shifted by a2 and clipped to
+    the later ones). The recursion is therefore solved as a parallel prefix scan over chunks of
+    BATTERY_CHUNK steps: log2(chunk) vectorized passes instead of one Python iteration per step.
+
+    Parameters:
+    - delta (ndarray): Energy flowing into (positive) or out of (negative) the battery per step in kWh
+    - capacity (float): Usable capacity in kWh
+    - initial (float): Energy stored before the first step in kWh
+
+    Returns:
+    - ndarray: Stored energy in kWh at the end of every step
+    """
+    delta = np.asarray(delta, dtype=np.float64)
+    soc = np.empty(len(delta))
+    level = min(max(initial, 0.0), capacity)
+
+    for start in range(0, len(delta), BATTERY_CHUNK):
+        # shift, low, high of the composition of all steps of the chunk up to every position
+        shift = delta[start:start + BATTERY_CHUNK].copy()
+        low = np.zeros(len(shift))
+        high = np.full(len(shift), float(capacity))
+
+        offset = 1
+        while offset < len(shift):
+            later = slice(offset, None)
+            earlier = slice(None, -offset)
+            # Right hand sides are evaluated before the assignment, so every pass reads the previous one
+            low[later], high[later], shift[later] = (
+                np.clip(low[earlier] + shift[later], low[later], high[later]),
+                np.clip(high[earlier] + shift[later], low[later], high[later]),
+                shift[earlier] + shift[later],
+            )
+            offset *= 2
+
+        chunk = np.clip(level + shift, low, high)
+        soc[start:start + len(chunk)] = chunk
+        level = chunk[-1]
+
+    return soc
+
+
+def match_generation_steps(generation_kwh, consumption_kwh, step_hours: float, battery: dict = None) -> dict:
+    """
+    Matches generation and consumption step by step, optionally with a battery.
+
+    Generation first covers the consumption of the same step, the surplus charges the battery
+    (up to its power and capacity) and the rest is exported, a deficit is covered from the
+    battery first and then imported from the grid.
+
+    Parameters:
+    - generation_kwh (ndarray): Generated energy per step in kWh
+    - consumption_kwh (ndarray): Consumed energy per step in kWh
+    - step_hours (float): Length of one step in hours
+    - battery (dict, optional): 'capacity' (kWh), 'power' (kW, None for unlimited) and
+      'efficiency' (round trip)
+
+    Returns:
+    - dict: Energy per step in kWh: self_consumption, grid_import, grid_export, battery_charge,
+      battery_discharge
+    """
+    generation_kwh = np.asarray(generation_kwh, dtype=np.float64)
+    consumption_kwh = np.asarray(consumption_kwh, dtype=np.float64)
+
+    direct = np.minimum(generation_kwh, consumption_kwh)
+    surplus = generation_kwh - direct
+    deficit = consumption_kwh - direct
+    charge = discharge = np.zeros_like(direct)
+
+    if battery and battery.get('capacity'):
+        # The round-trip losses are split evenly between charging and discharging
+        efficiency = np.sqrt(battery.get('efficiency') or DEFAULT_BATTERY_EFFICIENCY)
+        limit = battery['power'] * step_hours if battery.get('power') else np.inf
+        delta = np.minimum(surplus, limit) * efficiency - np.minimum(deficit, limit) / efficiency
+
+        soc = battery_state_of_charge(delta, battery['capacity'])
+        stored = np.diff(soc, prepend=0.0)
+        charge = np.maximum(stored, 0) / efficiency  # taken from the surplus
+        discharge = np.maximum(-stored, 0) * efficiency  # delivered to the consumption
+
+    return {
+        'self_consumption': direct + discharge,
+        'grid_import': deficit - discharge,
+        'grid_export': surplus - charge,
+        'battery_charge': charge,
+        'battery_discharge': discharge,
+    }
+
+
+def match_generation(generation_kwh, consumption_kwh, step_hours: float, battery: dict = None) -> dict:
+    """
+    Totals of match_generation_steps() over the series.
+
+    Returns:
+    - dict: Totals in kWh over the series: generation, consumption, self_consumption,
+      grid_import, grid_export, battery_charge, battery_discharge
+    """
+    steps = match_generation_steps(generation_kwh, consumption_kwh, step_hours, battery)
+    return {
+        'generation': float(np.sum(generation_kwh, dtype=np.float64)),
+        'consumption': float(np.sum(consumption_kwh, dtype=np.float64)),
+        **{name: float(values.sum()) for name, values in steps.items()},
+    }
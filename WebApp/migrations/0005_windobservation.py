@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('WebApp', '0004_winddata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WindObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(help_text='Time of the observation (UTC)')),
+                ('wind_speed', models.FloatField(help_text='Wind speed in m/s')),
+                ('temperature', models.FloatField(blank=True, help_text='Air temperature in °C', null=True)),
+                ('pressure', models.FloatField(blank=True, help_text='Air pressure in hPa', null=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='observations', to='WebApp.winddata')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dataset', 'timestamp'], name='windobs_dataset_time_idx')],
+            },
+        ),
+    ]
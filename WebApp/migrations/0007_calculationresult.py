@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('WebApp', '0006_calculationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calculationjob',
+            name='fingerprint',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='Content hash of the inputs, used to find running duplicates', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='CalculationResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(help_text='SHA-256 of the calculation inputs', max_length=64, unique=True)),
+                ('inputs', models.JSONField(help_text='Turbine parameters and consumption input the result was calculated for')),
+                ('summary', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('wind_data', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='WebApp.winddata')),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('WebApp', '0007_calculationresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PVSystem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, help_text='The name of the PV system', max_length=100, unique=True)),
+                ('company_name', models.CharField(help_text='The company name', max_length=50)),
+                ('peak_power', models.FloatField(help_text='Installed DC peak power in W (Watts)')),
+                ('tilt', models.FloatField(default=35.0, help_text='Panel tilt from horizontal in degrees')),
+                ('azimuth', models.FloatField(default=180.0, help_text='Panel orientation in degrees clockwise from north (180 = south)')),
+                ('temperature_coefficient', models.FloatField(default=-0.004, help_text='Relative power change per °C of cell temperature')),
+                ('noct', models.FloatField(default=45.0, help_text='Nominal operating cell temperature in °C')),
+                ('inverter_power', models.FloatField(help_text='AC inverter capacity in W (Watts)')),
+                ('system_losses', models.FloatField(default=0.14, help_text='Fraction of DC power lost in cables, soiling and mismatch')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='windobservation',
+            name='irradiance',
+            field=models.FloatField(blank=True, help_text='Mean global horizontal irradiance over the timestep in W/m²', null=True),
+        ),
+        migrations.AddField(
+            model_name='windobservation',
+            name='sunshine',
+            field=models.FloatField(blank=True, help_text='Sunshine duration within the timestep in minutes', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('WebApp', '0008_pvsystem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='winddata',
+            name='resolution',
+            field=models.CharField(choices=[('daily', 'Daily'), ('hourly', 'Hourly')], default='daily', help_text='Interval fetched from Meteostat', max_length=10),
+        ),
+    ]
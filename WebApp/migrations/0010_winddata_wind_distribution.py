@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('WebApp', '0009_winddata_resolution'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='winddata',
+            name='wind_distribution',
+            field=models.JSONField(blank=True, help_text='Fitted Weibull parameters and wind speed histogram', null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('WebApp', '0010_winddata_wind_distribution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PowerCurve',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wind_speeds', models.JSONField(help_text='Wind speeds of the curve points in m/s, ascending')),
+                ('power_outputs', models.JSONField(help_text='Power output at every curve point in W (Watts)')),
+                ('cut_in_speed', models.FloatField(help_text='Wind speed below which the turbine produces nothing (m/s)')),
+                ('cut_out_speed', models.FloatField(help_text='Wind speed above which the turbine shuts down (m/s)')),
+                ('reference_air_density', models.FloatField(default=1.225, help_text='Air density the curve was measured at (kg/m³)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('turbine', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='power_curve', to='WebApp.turbine')),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('WebApp', '0011_powercurve'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='turbine',
+            name='hub_height',
+            field=models.FloatField(blank=True, help_text='Hub height in m, leave empty to use the wind speeds as measured', null=True),
+        ),
+        migrations.AddField(
+            model_name='winddata',
+            name='elevation',
+            field=models.FloatField(blank=True, help_text='Site elevation in m above sea level, used to correct the sea-level pressure', null=True),
+        ),
+        migrations.AddField(
+            model_name='winddata',
+            name='measurement_height',
+            field=models.FloatField(default=10.0, help_text='Height of the wind speed measurements in m (10 m for Meteostat)'),
+        ),
+        migrations.AddField(
+            model_name='windobservation',
+            name='humidity',
+            field=models.FloatField(blank=True, help_text='Relative humidity in %', null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:16
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('WebApp', '0012_hub_height_and_humidity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumptionData',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('source', models.CharField(choices=[('csv', 'CSV')], default='csv', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ConsumptionObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(help_text='Start of the timestep (UTC)')),
+                ('consumption', models.FloatField(help_text='Consumed energy in kWh')),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='observations', to='WebApp.consumptiondata')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dataset', 'timestamp'], name='consobs_dataset_time_idx')],
+            },
+        ),
+    ]
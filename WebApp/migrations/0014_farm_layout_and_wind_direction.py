@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('WebApp', '0013_consumptiondata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FarmLayout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='The name of the wind farm', max_length=100, unique=True)),
+                ('wake_model', models.CharField(choices=[('jensen', 'Jensen')], default='jensen', max_length=20)),
+                ('wake_decay', models.FloatField(default=0.075, help_text='Wake expansion coefficient (about 0.075 onshore, 0.04-0.05 offshore)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='windobservation',
+            name='wind_direction',
+            field=models.FloatField(blank=True, help_text='Direction the wind comes from in degrees clockwise from north', null=True),
+        ),
+        migrations.CreateModel(
+            name='FarmTurbine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('x', models.FloatField(help_text='Distance east of the farm origin in m')),
+                ('y', models.FloatField(help_text='Distance north of the farm origin in m')),
+                ('layout', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='WebApp.farmlayout')),
+                ('turbine', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='farm_positions', to='WebApp.turbine')),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:49
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('WebApp', '0015_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='turbine',
+            name='hub_height',
+            field=models.FloatField(blank=True, help_text='Hub height in m, leave empty to use the wind speeds as measured', null=True, validators=[django.core.validators.MinValueValidator(1.0), django.core.validators.MaxValueValidator(300.0)]),
+        ),
+    ]
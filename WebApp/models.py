@@ -1,12 +1,175 @@
 import math
-from argparse import ArgumentError
+import threading
+from itertools import islice
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 import logging
+import numpy as np
 from rest_framework.exceptions import ValidationError
-from .utils import calculate_air_density
+from .preprocessing import prepare_series, shear_factor, get_wind_shear_settings, MEASUREMENT_HEIGHT
+from .instrumentation import timed
+from .solar import calculate_pv_power_output
+from .wake import WAKE_MODELS, DEFAULT_WAKE_DECAY, DEFAULT_DIRECTION_BINS, WakeTable, get_wake_model, \
+    thrust_coefficient
+from .utils import calculate_air_density, calculate_power_output, step_hours, fit_weibull, wind_speed_histogram, \
+    weibull_probabilities, bin_centers, DISTRIBUTION_BIN_WIDTH, DISTRIBUTION_MAX_SPEED
 import uuid
 
 # Create your models here.
+class TurbineQuerySet(models.QuerySet):
+    # Turbines evaluated per broadcast, keeps the turbine × timestep matrix bounded in memory
+    EVALUATION_CHUNK_SIZE = 256
+
+    @timed('turbine_evaluate_all')
+    def evaluate_all(self, wind_speeds, temp_celcius=None, pressure_hpa=None, humidity=None,
+                     measurement_height: float = MEASUREMENT_HEIGHT, elevation: float = None, cache_key=None) -> dict:
+        """
+        Evaluates every turbine in the queryset against one wind series.
+
+        Turbine specs are loaded with a single values_list() query into columnar arrays and the
+        power output is computed as a turbine × timestep matrix in one broadcast per chunk.
+        The wind speeds are extrapolated from the measurement height to the hub height of every
+        turbine like in sweep.run_sweep() (see preprocessing.prepare_series), turbines with the
+        same hub height share one prepared series.
+
+        Parameters:
+        - wind_speeds (array-like): Wind speeds (m/s) of the site
+        - temp_celcius (array-like, optional): Temperatures (°C) or None (default 15°C)
+        - pressure_hpa (array-like, optional): Sea-level pressures (hPa) or None (default 1013.5 hPa)
+        - humidity (array-like, optional): Relative humidities (%) or None (dry air)
+        - measurement_height (float, optional): Height of the wind speeds in m (default 10 m),
+          None if they are at hub height already
+        - elevation (float, optional): Site elevation in m above sea level
+        - cache_key (hashable, optional): Identifies the series for the preprocessing cache
+
+        Returns:
+        - dict: ids, names, annual_energy (Wh/year, the mean power scaled to 8760 h), capacity_factor
+          and ranking (indices into the arrays, best annual energy first)
+        """
+        rows = list(self.values_list('id', 'name', 'rotor_diameter', 'efficiency', 'nominal_power', 'startup_speed',
+                                     'hub_height'))
+        if not rows:
+            return {'ids': np.empty(0, dtype=np.int64), 'names': [], 'annual_energy': np.empty(0),
+                    'capacity_factor': np.empty(0), 'ranking': np.empty(0, dtype=np.int64)}
+
+        ids, names, rotor_diameter, efficiency, nominal_power, startup_speed, hub_heights = zip(*rows)
+        # Column vectors, so they broadcast against the (n_timesteps,) series
+        rotor_diameter = np.array(rotor_diameter, dtype=np.float64)[:, None]
+        efficiency = np.array(efficiency, dtype=np.float64)[:, None]
+        nominal_power = np.array(nominal_power, dtype=np.float64)[:, None]
+        startup_speed = np.array(startup_speed, dtype=np.float64)[:, None]
+
+        wind_speeds = np.asarray(wind_speeds, dtype=np.float64)
+        if wind_speeds.size == 0:
+            raise ValueError("No wind speed data provided")
+
+        series = {'wind_speed': wind_speeds, 'temperature': temp_celcius, 'pressure': pressure_hpa,
+                  'humidity': humidity}
+        # Air density and wind speeds depend only on the site and hub height, prepare them once per height
+        groups = {}
+        for position, hub_height in enumerate(hub_heights):
+            groups.setdefault(hub_height if measurement_height is not None else None, []).append(position)
+
+        mean_power = np.empty(len(rows))
+        prepared_by_position = {}
+        for hub_height, positions in groups.items():
+            prepared = prepare_series(series, hub_height, measurement_height, elevation, cache_key=cache_key)
+            positions = np.array(positions)
+            for start in range(0, len(positions), self.EVALUATION_CHUNK_SIZE):
+                chunk = positions[start:start + self.EVALUATION_CHUNK_SIZE]
+                power_matrix = calculate_power_output(prepared['wind_speed'], prepared['air_density'],
+                                                      rotor_diameter[chunk], efficiency[chunk],
+                                                      nominal_power[chunk], startup_speed[chunk])
+                mean_power[chunk] = power_matrix.mean(axis=1)
+            prepared_by_position.update(dict.fromkeys(positions.tolist(), prepared))
+
+        # Turbines with a tabulated power curve replace the idealised formula
+        positions = {turbine_id: position for position, turbine_id in enumerate(ids)}
+        for power_curve in PowerCurve.objects.filter(turbine__in=self.values('id')):
+            prepared = prepared_by_position[positions[power_curve.turbine_id]]
+            mean_power[positions[power_curve.turbine_id]] = power_curve.evaluate(
+                prepared['wind_speed'], prepared['air_density']).mean()
+
+        # Mean power over the series scaled to one year (8760 h) of operation
+        annual_energy = mean_power * 8760.0
+        capacity_factor = mean_power / nominal_power[:, 0]
+
+        return {
+            'ids': np.array(ids),
+            'names': list(names),
+            'annual_energy': annual_energy,
+            'capacity_factor': capacity_factor,
+            'ranking': np.argsort(-annual_energy, kind='stable'),
+        }
+
+
+    @timed('turbine_rank_by_distribution')
+    def rank_by_distribution(self, wind_data, method: str = 'histogram') -> dict:
+        """
+        Screens every turbine in the queryset against the stored wind speed distribution of a dataset.
+
+        The power curve of every turbine is integrated over the distribution bins, which costs
+        O(bins) per turbine instead of O(timesteps).
+
+        Parameters:
+        - wind_data (WindData): Dataset whose distribution is used (fitted once and stored)
+        - method (str): 'histogram' for the observed distribution or 'weibull' for the fitted one
+
+        Returns:
+        - dict: Same keys as evaluate_all()
+        """
+        distribution = wind_data.get_distribution()
+        probabilities = np.asarray(distribution_probabilities(distribution, method))
+        speeds = bin_centers(distribution['bin_width'], distribution['max_speed'])
+
+        rows = list(self.values_list('id', 'name', 'rotor_diameter', 'efficiency', 'nominal_power', 'startup_speed',
+                                     'hub_height'))
+        if not rows:
+            return {'ids': np.empty(0, dtype=np.int64), 'names': [], 'annual_energy': np.empty(0),
+                    'capacity_factor': np.empty(0), 'ranking': np.empty(0, dtype=np.int64)}
+
+        ids, names, *parameters, hub_heights = zip(*rows)
+        rotor_diameter, efficiency, nominal_power, startup_speed = (
+            np.array(values, dtype=np.float64)[:, None] for values in parameters)
+
+        # The bins move with the wind shear, the time share of every bin stays the same
+        shear = get_wind_shear_settings()
+        bin_speeds = speeds * np.array([[shear_factor(wind_data.measurement_height, hub_height, shear['METHOD'],
+                                                      shear['EXPONENT'], shear['ROUGHNESS_LENGTH'])]
+                                        for hub_height in hub_heights])
+
+        # turbine × bin power matrix weighted with the time share of every bin
+        power_matrix = calculate_power_output(bin_speeds, distribution['mean_air_density'], rotor_diameter, efficiency,
+                                              nominal_power, startup_speed)
+        positions = {turbine_id: position for position, turbine_id in enumerate(ids)}
+        for power_curve in PowerCurve.objects.filter(turbine__in=self.values('id')):
+            position = positions[power_curve.turbine_id]
+            power_matrix[position] = power_curve.evaluate(bin_speeds[position], distribution['mean_air_density'])
+        mean_power = power_matrix @ probabilities
+        annual_energy = mean_power * 8760.0
+
+        return {
+            'ids': np.array(ids),
+            'names': list(names),
+            'annual_energy': annual_energy,
+            'capacity_factor': mean_power / nominal_power[:, 0],
+            'ranking': np.argsort(-annual_energy, kind='stable'),
+        }
+
+
+def distribution_probabilities(distribution: dict, method: str = 'histogram'):
+    """
+    Returns the bin probabilities of a stored distribution (see WindData.fit_distribution()).
+    """
+    if method == 'weibull':
+        return weibull_probabilities(distribution['weibull_k'], distribution['weibull_c'],
+                                     distribution['bin_width'], distribution['max_speed'])
+    if method == 'histogram':
+        return distribution['probabilities']
+    raise ValueError(f"Unknown distribution method: {method}")
+
+
 class Turbine(models.Model):
     """
     A Django model representing a wind turbine
@@ -17,6 +180,10 @@ class Turbine(models.Model):
     efficiency = models.FloatField(help_text="Power coefficient (Cp), typically between 0.3 and 0.5")
     nominal_power = models.FloatField(help_text="Nominal power output in W (Watts)")
     startup_speed = models.FloatField(help_text="Minimum wind speed required for the turbine to start (m/s)")
+    hub_height = models.FloatField(blank=True, null=True, validators=[MinValueValidator(1.0), MaxValueValidator(300.0)],
+                                   help_text="Hub height in m, leave empty to use the wind speeds as measured")
+
+    objects = TurbineQuerySet.as_manager()
 
     def clean(self):
         """
@@ -38,13 +205,19 @@ class Turbine(models.Model):
             if startup_speed <= 0:
                 raise ValidationError('Startup speed must be a positive value.')
 
+
         except ValueError:
             raise ValidationError('Invalid value for one or more fields. Please ensure all values are numeric.')
 
     def save(self, *args, **kwargs):
         """
         Overrides save() to validate the model before saving.
+
+        Raises:
+        - django.core.exceptions.ValidationError: The hub height is outside of its validators' range
         """
+        # Checked by forms and serializers already, but a bad hub height must never be saved silently
+        self.clean_fields(exclude={field.name for field in self._meta.fields} - {'hub_height'})
         try:
             self.clean()
         except ValidationError as e:
@@ -92,33 +265,636 @@ class Turbine(models.Model):
             - list: A list of daily power outputs in Watts
             """
 
-        if not wind_speeds:
-            raise ArgumentError(message ='No wind speed data provided')
+        if wind_speeds is None or len(wind_speeds) == 0:
+            raise ValueError("No wind speed data provided")
+
+        if temp_celcius is not None and len(temp_celcius) != len(wind_speeds) or \
+                pressure_hpa is not None and len(pressure_hpa) != len(wind_speeds):
+            raise ValueError(
+                "Mismatched list lengths. Ensure wind_speeds, temp_celcius, and pressure_hpa are of the same length.")
+
+        return self.calculate_power_output_array(wind_speeds, temp_celcius, pressure_hpa).tolist()
+
+    @timed('turbine_power_output')
+    def calculate_power_output_array(self, wind_speeds, temp_celcius=None, pressure_hpa=None,
+                                     air_density=None) -> np.ndarray:
+        """
+            Vectorized power output for a whole wind series in one pass.
+
+            Parameters:
+            - wind_speeds (array-like): Wind speeds (m/s), e.g. a list, ndarray or Meteostat pandas Series
+            - temp_celcius (array-like, optional): Temperatures (°C) or None (default 15°C)
+            - pressure_hpa (array-like, optional): Pressures (hPa) or None (default 1013.5 hPa)
+            - air_density (array-like, optional): Air density (kg/m³), e.g. from a prepared series
+              (see preprocessing.prepare_series), replaces temperature and pressure
+
+            Returns:
+            - ndarray: Power output in Watts for every timestep
+            """
+        if air_density is None:
+            # Scalar defaults broadcast against the series, no per-day lists needed
+            if temp_celcius is None:
+                temp_celcius = 15.0
+            if pressure_hpa is None:
+                pressure_hpa = 1013.5
+
+            air_density = calculate_air_density(np.asarray(temp_celcius, dtype=np.float64),
+                                                np.asarray(pressure_hpa, dtype=np.float64))
+
+        power_curve = self.get_power_curve()
+        if power_curve is not None:
+            return power_curve.evaluate(wind_speeds, air_density)
+
+        return calculate_power_output(wind_speeds, air_density, self.rotor_diameter, self.efficiency,
+                                      self.nominal_power, self.startup_speed)
+
+
+    def get_power_curve(self):
+        """
+        Returns the tabulated power curve of the turbine or None if it uses the idealised formula.
+        """
+        if self.pk is None:
+            return None
+        try:
+            return self.power_curve
+        except PowerCurve.DoesNotExist:
+            return None
+
+    @timed('turbine_estimate_annual_energy')
+    def estimate_annual_energy(self, wind_data, method: str = 'histogram') -> float:
+        """
+        Quick annual energy estimate from the stored wind speed distribution of a dataset.
+
+        Parameters:
+        - wind_data (WindData): Dataset whose distribution is used
+        - method (str): 'histogram' or 'weibull'
+
+        Returns:
+        - float: Annual energy in Wh
+        """
+        distribution = wind_data.get_distribution()
+        shear = get_wind_shear_settings()
+        speeds = bin_centers(distribution['bin_width'], distribution['max_speed']) * shear_factor(
+            wind_data.measurement_height, self.hub_height, shear['METHOD'], shear['EXPONENT'], shear['ROUGHNESS_LENGTH'])
+        power_curve = self.get_power_curve()
+        if power_curve is not None:
+            power = power_curve.evaluate(speeds, distribution['mean_air_density'])
+        else:
+            power = calculate_power_output(speeds, distribution['mean_air_density'], self.rotor_diameter,
+                                           self.efficiency, self.nominal_power, self.startup_speed)
+        return float(power @ np.asarray(distribution_probabilities(distribution, method))) * 8760.0
+
+
+# Compiled lookup tables of the power curves in this process: pk -> (updated_at, table)
+_POWER_CURVE_TABLES = {}
+_POWER_CURVE_TABLES_LOCK = threading.Lock()
+
+
+class PowerCurve(models.Model):
+    """
+    A manufacturer power curve of a turbine, given as (wind speed, power) points
+    """
+    # Spacing of the compiled lookup table in m/s
+    TABLE_RESOLUTION = 0.01
+
+    turbine = models.OneToOneField(Turbine, on_delete=models.CASCADE, related_name='power_curve')
+    wind_speeds = models.JSONField(help_text="Wind speeds of the curve points in m/s, ascending")
+    power_outputs = models.JSONField(help_text="Power output at every curve point in W (Watts)")
+    cut_in_speed = models.FloatField(help_text="Wind speed below which the turbine produces nothing (m/s)")
+    cut_out_speed = models.FloatField(help_text="Wind speed above which the turbine shuts down (m/s)")
+    reference_air_density = models.FloatField(default=1.225, help_text="Air density the curve was measured at (kg/m³)")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def clean(self):
+        """
+        Validates that the curve points are consistent.
+
+        Raises:
+        - django.core.exceptions.ValidationError: Keyed by the offending field, so forms (and the
+          admin inline) show it next to that field
+        """
+        errors = {}
+        wind_speeds, power_outputs = self.wind_speeds, self.power_outputs
+        for name, values in (('wind_speeds', wind_speeds), ('power_outputs', power_outputs)):
+            if not isinstance(values, list) or not all(
+                    isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+                errors[name] = 'Enter a list of numbers, e.g. [3, 4, 5].'
+        if errors:
+            raise DjangoValidationError(errors)
+
+        if len(wind_speeds) < 2:
+            errors['wind_speeds'] = 'A power curve needs at least two points.'
+        elif any(later <= earlier for earlier, later in zip(wind_speeds, wind_speeds[1:])):
+            errors['wind_speeds'] = 'Power curve wind speeds must be strictly ascending.'
+        if len(power_outputs) != len(wind_speeds):
+            errors['power_outputs'] = 'Enter a power output for every wind speed.'
+        elif any(power < 0 for power in power_outputs):
+            errors['power_outputs'] = 'Power outputs must not be negative.'
+        if self.cut_in_speed is not None and self.cut_out_speed is not None and \
+                not (0 <= self.cut_in_speed < self.cut_out_speed):
+            errors['cut_in_speed'] = 'The cut-in speed must be below the cut-out speed.'
+        if errors:
+            raise DjangoValidationError(errors)
+
+    def save(self, *args, **kwargs):
+        self.clean()
+        super().save(*args, **kwargs)
+        self.invalidate()
+
+    def delete(self, *args, **kwargs):
+        self.invalidate()
+        return super().delete(*args, **kwargs)
+
+    def invalidate(self):
+        with _POWER_CURVE_TABLES_LOCK:
+            _POWER_CURVE_TABLES.pop(self.pk, None)
+
+    def compile(self) -> np.ndarray:
+        """
+        Compiles the curve into a dense, uniformly spaced lookup table, cached per process.
+
+        Index i holds the power at i * TABLE_RESOLUTION m/s, the last entry is 0 for speeds
+        above cut-out. Other processes notice a changed curve by its updated_at.
+
+        Returns:
+        - ndarray: The lookup table in W
+        """
+        with _POWER_CURVE_TABLES_LOCK:
+            cached = _POWER_CURVE_TABLES.get(self.pk)
+        if cached is not None and cached[0] == self.updated_at:
+            return cached[1]
+
+        speeds = np.arange(round(self.cut_out_speed / self.TABLE_RESOLUTION) + 1) * self.TABLE_RESOLUTION
+        table = np.interp(speeds, self.wind_speeds, self.power_outputs, left=0.0, right=self.power_outputs[-1])
+        table[speeds < self.cut_in_speed] = 0.0
+        table = np.append(table, 0.0)
+
+        if self.pk is not None:
+            with _POWER_CURVE_TABLES_LOCK:
+                _POWER_CURVE_TABLES[self.pk] = (self.updated_at, table)
+        return table
+
+    def evaluate(self, wind_speeds, air_density=None) -> np.ndarray:
+        """
+        Power output for a whole wind series with one table lookup (see lookup()).
+
+        Parameters:
+        - wind_speeds (array-like): Wind speeds (m/s)
+        - air_density (float or array-like, optional): Air density (kg/m³), default the reference density
+
+        Returns:
+        - ndarray: Power output in Watts for every timestep
+        """
+        return self.lookup(self.compile(), wind_speeds, air_density, self.reference_air_density)
+
+    @classmethod
+    def lookup(cls, table: np.ndarray, wind_speeds, air_density=None,
+               reference_air_density: float = 1.225) -> np.ndarray:
+        """
+        Power output from a compiled lookup table (see compile()), also used by the sweep workers,
+        which get the tables without the model instances.
+
+        The air density correction rescales the wind speed, v * (ρ / ρ_ref)^(1/3), before the lookup.
+
+        Parameters:
+        - table (ndarray): Compiled table of the curve in W
+        - wind_speeds (array-like): Wind speeds (m/s)
+        - air_density (float or array-like, optional): Air density (kg/m³), default the reference density
+        - reference_air_density (float): Air density the curve was measured at (kg/m³)
+
+        Returns:
+        - ndarray: Power output in Watts for every timestep
+        """
+        wind_speeds = np.asarray(wind_speeds, dtype=np.float64)
+        if air_density is not None:
+            wind_speeds = wind_speeds * np.cbrt(np.asarray(air_density, dtype=np.float64) / reference_air_density)
+
+        indices = np.rint(wind_speeds / cls.TABLE_RESOLUTION)
+        # Speeds above cut-out (and NaN) land on the final zero entry
+        indices = np.nan_to_num(indices, nan=len(table) - 1)
+        return table[np.clip(indices, 0, len(table) - 1).astype(np.intp)]
+
+
+class PVSystem(models.Model):
+    """
+    A Django model representing a solar PV system (panels and inverter)
+    """
+    name = models.CharField(max_length=100, unique=True, db_index=True, help_text="The name of the PV system")
+    company_name = models.CharField(max_length=50, help_text="The company name")
+    peak_power = models.FloatField(help_text="Installed DC peak power in W (Watts)")
+    tilt = models.FloatField(default=35.0, help_text="Panel tilt from horizontal in degrees")
+    azimuth = models.FloatField(default=180.0, help_text="Panel orientation in degrees clockwise from north (180 = south)")
+    temperature_coefficient = models.FloatField(default=-0.004, help_text="Relative power change per °C of cell temperature")
+    noct = models.FloatField(default=45.0, help_text="Nominal operating cell temperature in °C")
+    inverter_power = models.FloatField(help_text="AC inverter capacity in W (Watts)")
+    system_losses = models.FloatField(default=0.14, help_text="Fraction of DC power lost in cables, soiling and mismatch")
+
+    def __str__(self):
+        return f"{self.company_name} {self.name} ({self.peak_power} Wp)"
 
-            # Set default values if temperature or pressure data is not provided
-        if temp_celcius is None:
-            temp_celcius = [15.0] * len(wind_speeds)  # Default 15°C for all days
-        if pressure_hpa is None:
-            pressure_hpa = [1013.5] * len(wind_speeds)  # Default 1013.5 hPa for all days
+    def calculate_power_output_array(self, series: dict, latitude: float, longitude: float) -> np.ndarray:
+        """
+        Vectorized AC power output for a weather series as returned by WindData.get_series().
 
-        if len(wind_speeds) != len(temp_celcius) or len(wind_speeds) != len(pressure_hpa):
-            raise ArgumentError(
-                message ="Mismatched list lengths. Ensure wind_speeds, temp_celcius, and pressure_hpa are of the same length.")
+        Parameters:
+        - series (dict): 'timestamps' and the optional 'irradiance', 'sunshine' and 'temperature' arrays
+        - latitude, longitude (float): Location of the system in degrees
 
-        daily_outputs = []
-        for i in range(len(wind_speeds)):
-            power_output = self.calculate_daily_power_output(wind_speeds[i], temp_celcius[i], pressure_hpa[i])
-            daily_outputs.append(power_output)
+        Returns:
+        - ndarray: Mean AC power output in Watts for every timestep
+        """
+        return calculate_pv_power_output(
+            series['timestamps'], latitude, longitude, self.peak_power, self.tilt, self.azimuth,
+            self.temperature_coefficient, self.noct, self.inverter_power, self.system_losses,
+            step_hours=step_hours(series['timestamps']),
+            irradiance=series.get('irradiance'),
+            sunshine=series.get('sunshine'),
+            temperature=series.get('temperature'),
+        )
 
-        return daily_outputs
 
+class FarmLayout(models.Model):
+    """
+    A wind farm: several turbines placed by coordinates, evaluated together with a wake model
+    """
+    name = models.CharField(max_length=100, unique=True, help_text="The name of the wind farm")
+    wake_model = models.CharField(max_length=20, default='jensen',
+                                  choices=[(name, name.capitalize()) for name in WAKE_MODELS])
+    wake_decay = models.FloatField(default=DEFAULT_WAKE_DECAY,
+                                   help_text="Wake expansion coefficient (about 0.075 onshore, 0.04-0.05 offshore)")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Timesteps evaluated per block, keeps the timestep × turbine matrices bounded in memory
+    EVALUATION_CHUNK_SIZE = 2 ** 16
+
+    def __str__(self):
+        return self.name
+
+    def get_wake_table(self, positions=None, bins: int = DEFAULT_DIRECTION_BINS) -> WakeTable:
+        """
+        Precomputes the wake deficits of the farm for every wind direction bin (see wake.WakeTable).
+        """
+        positions = positions if positions is not None else list(self.positions.select_related('turbine'))
+        return WakeTable(
+            [position.x for position in positions],
+            [position.y for position in positions],
+            [position.turbine.rotor_diameter for position in positions],
+            thrust_coefficient(np.array([position.turbine.efficiency for position in positions])),
+            get_wake_model(self.wake_model, decay=self.wake_decay),
+            bins,
+        )
+
+    @timed('farm_evaluate')
+    def evaluate(self, series: dict, wind_data=None, bins: int = DEFAULT_DIRECTION_BINS) -> dict:
+        """
+        Annual energy of every turbine of the farm for a weather series, with and without wake losses.
+
+        The wake deficits are looked up per timestep from the direction bin table, the power of
+        all turbines of one type is computed in a single timestep × turbine broadcast.
+
+        Parameters:
+        - series (dict): Weather series as returned by WindData.get_series(), 'wind_direction' is
+          optional (the mean deficit over all directions is used without it)
+        - wind_data (WindData, optional): Dataset of the series, for its measurement height,
+          elevation and preprocessing cache
+        - bins (int): Wind direction bins of the deficit table
+
+        Returns:
+        - dict: ids (FarmTurbine ids), turbine_ids, annual_energy and gross_annual_energy (Wh/year
+          per turbine, with and without wakes), farm_annual_energy, farm_gross_annual_energy and
+          wake_loss (share of the gross energy lost in wakes)
+        """
+        positions = list(self.positions.select_related('turbine').order_by('id'))
+        if not positions:
+            raise ValueError("The farm layout does not contain any turbines.")
+        if len(series['wind_speed']) == 0:
+            raise ValueError("The series does not contain any observations.")
+
+        table = self.get_wake_table(positions, bins)
+        directions = series.get('wind_direction')
+        if directions is None:
+            directions = np.full(len(series['wind_speed']), np.nan)
+
+        # Turbines of the same type share the prepared series and one power evaluation
+        groups = {}
+        for column, position in enumerate(positions):
+            groups.setdefault(position.turbine_id, []).append(column)
+
+        mean_power = np.zeros(len(positions))
+        gross_mean_power = np.zeros(len(positions))
+        for columns in groups.values():
+            turbine = positions[columns[0]].turbine
+            if wind_data is not None:
+                prepared = wind_data.prepare_series(series, turbine.hub_height)
+            else:
+                prepared = prepare_series(series, turbine.hub_height)
+
+            gross_mean_power[columns] = turbine.calculate_power_output_array(
+                prepared['wind_speed'], air_density=prepared['air_density']).mean()
+            for start in range(0, len(directions), self.EVALUATION_CHUNK_SIZE):
+                chunk = slice(start, start + self.EVALUATION_CHUNK_SIZE)
+                wind_speeds = table.effective_speeds(prepared['wind_speed'][chunk], directions[chunk], columns)
+                power = turbine.calculate_power_output_array(wind_speeds,
+                                                             air_density=prepared['air_density'][chunk, None])
+                mean_power[columns] += power.sum(axis=0)
+        mean_power /= len(directions)
+
+        annual_energy = mean_power * 8760.0
+        gross_annual_energy = gross_mean_power * 8760.0
+        return {
+            'ids': np.array([position.id for position in positions]),
+            'turbine_ids': np.array([position.turbine_id for position in positions]),
+            'annual_energy': annual_energy,
+            'gross_annual_energy': gross_annual_energy,
+            'farm_annual_energy': float(annual_energy.sum()),
+            'farm_gross_annual_energy': float(gross_annual_energy.sum()),
+            'wake_loss': float(1 - annual_energy.sum() / gross_annual_energy.sum()) if gross_annual_energy.sum() else 0.0,
+        }
+
+
+class FarmTurbine(models.Model):
+    """
+    The position of one turbine in a FarmLayout
+    """
+    layout = models.ForeignKey(FarmLayout, on_delete=models.CASCADE, related_name='positions')
+    turbine = models.ForeignKey(Turbine, on_delete=models.PROTECT, related_name='farm_positions')
+    x = models.FloatField(help_text="Distance east of the farm origin in m")
+    y = models.FloatField(help_text="Distance north of the farm origin in m")
+
+    def __str__(self):
+        return f"{self.turbine} at ({self.x:.0f}, {self.y:.0f})"
 
 
 class WindData(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     source = models.CharField(max_length=20, choices=[('csv', 'CSV'), ('meteostat', 'Meteostat')])
+    resolution = models.CharField(max_length=10, choices=[('daily', 'Daily'), ('hourly', 'Hourly')], default='daily',
+                                  help_text="Interval fetched from Meteostat")
     csv_data = models.TextField(blank=True, null=True)
     location = models.CharField(max_length=100, blank=True, null=True)
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
     start_date = models.DateField(blank=True, null=True)
     end_date = models.DateField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+    wind_distribution = models.JSONField(blank=True, null=True,
+                                         help_text="Fitted Weibull parameters and wind speed histogram")
+    measurement_height = models.FloatField(default=MEASUREMENT_HEIGHT,
+                                           help_text="Height of the wind speed measurements in m (10 m for Meteostat)")
+    elevation = models.FloatField(blank=True, null=True,
+                                  help_text="Site elevation in m above sea level, used to correct the sea-level pressure")
+
+    # Rows written per INSERT when filling the observation table
+    OBSERVATION_BATCH_SIZE = 5000
+
+    def store_observations(self, rows, batch_size: int = None) -> int:
+        """
+        Stores parsed observations for this dataset using bulk_create in fixed-size chunks.
+
+        Parameters:
+        - rows (iterable): (timestamp, wind_speed, temperature, pressure, ...) tuples with the values
+          in the order of WindObservation.SERIES_FIELDS, trailing values may be left out, missing
+          values are None
+        - batch_size (int, optional): Rows per bulk_create call
+
+        Returns:
+        - int: Number of stored observations
+        """
+        batch_size = batch_size or self.OBSERVATION_BATCH_SIZE
+        fields = WindObservation.SERIES_FIELDS
+        rows = iter(rows)
+        stored = 0
+
+        while True:
+            batch = [
+                WindObservation(dataset=self, timestamp=row[0], **dict(zip(fields, row[1:])))
+                for row in islice(rows, batch_size)
+            ]
+            if not batch:
+                break
+            WindObservation.objects.bulk_create(batch, batch_size=batch_size)
+            stored += len(batch)
+
+        return stored
+
+    def get_series(self, start=None, end=None) -> dict:
+        """
+        Loads the stored observations as arrays, reading only the rows in the requested range.
+
+        Parameters:
+        - start (datetime, optional): First timestamp to include
+        - end (datetime, optional): Last timestamp to include
+
+        Returns:
+        - dict: 'timestamps' (datetime64[s]) and one float32 array per WindObservation.SERIES_FIELDS,
+          missing values are NaN
+        """
+        fields = WindObservation.SERIES_FIELDS
+        observations = self.observations.all()
+        if start is not None:
+            observations = observations.filter(timestamp__gte=start)
+        if end is not None:
+            observations = observations.filter(timestamp__lte=end)
+
+        rows = list(observations.order_by('timestamp').values_list('timestamp', *fields))
+        if not rows:
+            return {'timestamps': np.empty(0, dtype='datetime64[s]'),
+                    **{field: np.empty(0, dtype=np.float32) for field in fields}}
+
+        timestamps, *columns = zip(*rows)
+        return {
+            # Timestamps are stored in UTC, drop the tzinfo before converting to numpy
+            'timestamps': np.array([t.replace(tzinfo=None) for t in timestamps], dtype='datetime64[s]'),
+            **{field: np.array(column, dtype=np.float32) for field, column in zip(fields, columns)},
+        }
+
+
+    def fit_distribution(self, save: bool = True) -> dict:
+        """
+        Fits Weibull k/c and bins the observed wind speeds, stored on the dataset for quick screening.
+
+        Returns:
+        - dict: weibull_k, weibull_c, bin_width, max_speed, probabilities (one per bin),
+          mean_air_density (kg/m³) and samples
+        """
+        series = self.get_series()
+        if len(series['wind_speed']) == 0:
+            raise ValueError("The dataset does not contain any observations.")
+
+        weibull_k, weibull_c = fit_weibull(series['wind_speed'])
+        # Density at the measurement height, the distribution is shifted to hub height when it is used
+        air_density = prepare_series(series, measurement_height=self.measurement_height,
+                                     elevation=self.elevation)['air_density']
+
+        self.wind_distribution = {
+            'weibull_k': weibull_k,
+            'weibull_c': weibull_c,
+            'bin_width': DISTRIBUTION_BIN_WIDTH,
+            'max_speed': DISTRIBUTION_MAX_SPEED,
+            'probabilities': wind_speed_histogram(series['wind_speed']).tolist(),
+            'mean_air_density': float(air_density.mean(dtype=np.float64)),
+            'samples': len(series['wind_speed']),
+        }
+        if save:
+            self.save(update_fields=['wind_distribution'])
+        return self.wind_distribution
+
+    def get_distribution(self) -> dict:
+        """
+        Returns the stored wind speed distribution, fitting it on first use.
+        """
+        return self.wind_distribution or self.fit_distribution()
+
+    def prepare_series(self, series: dict, hub_height: float = None) -> dict:
+        """
+        Wind speeds at hub height and air density for a series of this dataset (see
+        preprocessing.prepare_series), cached per (dataset, hub height).
+        """
+        return prepare_series(series, hub_height, self.measurement_height, self.elevation, cache_key=str(self.pk))
+
+
+class WindObservation(models.Model):
+    """
+    A single weather measurement of a WindData dataset
+    """
+    # Measured values in the order used by WindData.store_observations() rows
+    SERIES_FIELDS = ('wind_speed', 'temperature', 'pressure', 'irradiance', 'sunshine', 'humidity', 'wind_direction')
+
+    dataset = models.ForeignKey(WindData, on_delete=models.CASCADE, related_name='observations')
+    timestamp = models.DateTimeField(help_text="Time of the observation (UTC)")
+    wind_speed = models.FloatField(help_text="Wind speed in m/s")
+    temperature = models.FloatField(blank=True, null=True, help_text="Air temperature in °C")
+    pressure = models.FloatField(blank=True, null=True, help_text="Air pressure in hPa")
+    irradiance = models.FloatField(blank=True, null=True,
+                                   help_text="Mean global horizontal irradiance over the timestep in W/m²")
+    sunshine = models.FloatField(blank=True, null=True, help_text="Sunshine duration within the timestep in minutes")
+    humidity = models.FloatField(blank=True, null=True, help_text="Relative humidity in %")
+    wind_direction = models.FloatField(blank=True, null=True,
+                                       help_text="Direction the wind comes from in degrees clockwise from north")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dataset', 'timestamp'], name='windobs_dataset_time_idx'),
+        ]
+
+
+class ConsumptionData(models.Model):
+    """
+    An uploaded household consumption series, referenced by id from the session and the calculation inputs
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    source = models.CharField(max_length=20, choices=[('csv', 'CSV')], default='csv')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Rows written per INSERT when filling the observation table
+    OBSERVATION_BATCH_SIZE = 5000
+
+    def store_observations(self, rows, batch_size: int = None) -> int:
+        """
+        Stores parsed consumption rows for this dataset using bulk_create in fixed-size chunks.
+
+        Parameters:
+        - rows (iterable): (timestamp, consumption_kwh) tuples
+        - batch_size (int, optional): Rows per bulk_create call
+
+        Returns:
+        - int: Number of stored rows
+        """
+        batch_size = batch_size or self.OBSERVATION_BATCH_SIZE
+        rows = iter(rows)
+        stored = 0
+
+        while True:
+            batch = [
+                ConsumptionObservation(dataset=self, timestamp=timestamp, consumption=consumption)
+                for timestamp, consumption in islice(rows, batch_size)
+            ]
+            if not batch:
+                break
+            ConsumptionObservation.objects.bulk_create(batch, batch_size=batch_size)
+            stored += len(batch)
+
+        return stored
+
+    def get_series(self) -> dict:
+        """
+        Loads the stored consumption as arrays sorted by time.
+
+        Returns:
+        - dict: 'timestamps' (datetime64[s]) and 'consumption' (float64, kWh per row)
+        """
+        rows = list(self.observations.order_by('timestamp').values_list('timestamp', 'consumption'))
+        if not rows:
+            return {'timestamps': np.empty(0, dtype='datetime64[s]'), 'consumption': np.empty(0, dtype=np.float64)}
+
+        timestamps, consumption = zip(*rows)
+        return {
+            # Timestamps are stored in UTC, drop the tzinfo before converting to numpy
+            'timestamps': np.array([t.replace(tzinfo=None) for t in timestamps], dtype='datetime64[s]'),
+            'consumption': np.array(consumption, dtype=np.float64),
+        }
+
+
+class ConsumptionObservation(models.Model):
+    """
+    The energy consumed in one timestep of a ConsumptionData dataset
+    """
+    dataset = models.ForeignKey(ConsumptionData, on_delete=models.CASCADE, related_name='observations')
+    timestamp = models.DateTimeField(help_text="Start of the timestep (UTC)")
+    consumption = models.FloatField(help_text="Consumed energy in kWh")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dataset', 'timestamp'], name='consobs_dataset_time_idx'),
+        ]
+
+
+class CalculationJob(models.Model):
+    """
+    A long-running calculation queued from a view and executed by the process_jobs worker
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50, help_text="Name of the job handler in WebApp.jobs.JOB_HANDLERS")
+    fingerprint = models.CharField(max_length=64, blank=True, default='', db_index=True,
+                                   help_text="Content hash of the inputs, used to find running duplicates")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    payload = models.JSONField(default=dict)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True,
+                                        help_text="Last sign of life of the worker running the job")
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Number of times a worker claimed the job")
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='calcjob_status_created_idx'),
+        ]
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+
+class CalculationResult(models.Model):
+    """
+    A memoized result of the calculation pipeline, keyed by a content hash of its inputs
+    """
+    fingerprint = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the calculation inputs")
+    wind_data = models.ForeignKey(WindData, on_delete=models.CASCADE, related_name='results')
+    inputs = models.JSONField(help_text="Turbine parameters and consumption input the result was calculated for")
+    summary = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
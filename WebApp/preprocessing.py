@@ -0,0 +1,213 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from WebApp.utils import R_DRY_AIR, R_VAPOUR
+
+# Standard atmosphere values for missing temperatures and pressures
+DEFAULT_TEMPERATURE = 15.0  # °C
+DEFAULT_PRESSURE = 1013.5  # hPa
+
+# Height of the Meteostat wind and temperature measurements
+MEASUREMENT_HEIGHT = 10.0  # m
+TEMPERATURE_HEIGHT = 2.0  # m
+TEMPERATURE_LAPSE_RATE = 0.0065  # K/m
+
+DEFAULT_WIND_SHEAR = {
+    'METHOD': 'power',  # 'power' (Hellmann exponent) or 'log' (logarithmic profile)
+    'EXPONENT': 1 / 7,
+    'ROUGHNESS_LENGTH': 0.03,  # m, open farmland
+}
+
+# Prepared series kept in this process, see prepare_series()
+PREPARED_CACHE_SIZE = 32
+
+
+def get_wind_shear_settings() -> dict:
+    return {**DEFAULT_WIND_SHEAR, **getattr(settings, 'WIND_SHEAR', {})}
+
+
+def shear_factor(measurement_height: float, hub_height: float, method: str = 'power',
+                 exponent: float = 1 / 7, roughness_length: float = 0.03) -> float:
+    """
+    Ratio of the wind speed at hub height to the measured wind speed.
+
+    Returns:
+    - float: 1.0 when the hub height is unknown or equal to the measurement height
+    """
+    if hub_height is None or measurement_height is None or hub_height == measurement_height:
+        return 1.0
+    if method == 'log':
+        return float(np.log(hub_height / roughness_length) / np.log(measurement_height / roughness_length))
+    if method == 'power':
+        return float((hub_height / measurement_height) ** exponent)
+    raise ValueError(f"Unknown wind shear method: {method}")
+
+
+class FillDefaults:
+    """
+    Replaces missing temperatures and pressures with the standard atmosphere and missing
+    humidities with 0 % (dry air).
+    """
+    key = ('defaults',)
+
+    def __call__(self, series: dict):
+        for name, default in (('temperature', DEFAULT_TEMPERATURE), ('pressure', DEFAULT_PRESSURE), ('humidity', 0.0)):
+            values = series[name]
+            np.copyto(values, default, where=np.isnan(values))
+
+
+class WindShear:
+    """
+    Extrapolates the measured wind speeds to hub height (power law or logarithmic profile).
+    """
+
+    def __init__(self, measurement_height: float, hub_height: float, **options):
+        options = {**get_wind_shear_settings(), **options}
+        self.factor = shear_factor(measurement_height, hub_height, options['METHOD'].lower(),
+                                   options['EXPONENT'], options['ROUGHNESS_LENGTH'])
+        self.key = ('shear', round(self.factor, 9))
+
+    def __call__(self, series: dict):
+        if self.factor != 1.0:
+            np.multiply(series['wind_speed'], self.factor, out=series['wind_speed'])
+
+
+class AltitudeCorrection:
+    """
+    Reduces the sea-level pressure reported by Meteostat to the altitude of the hub (site
+    elevation + hub height, barometric formula) and the 2 m temperature to hub height.
+    """
+
+    def __init__(self, elevation: float = None, hub_height: float = None):
+        self.elevation = elevation or 0.0
+        self.hub_height = hub_height or 0.0
+        altitude = self.elevation + self.hub_height
+        self.pressure_factor = (1 - 2.25577e-5 * altitude) ** 5.25588
+        self.temperature_offset = -TEMPERATURE_LAPSE_RATE * max(self.hub_height - TEMPERATURE_HEIGHT, 0.0)
+        self.key = ('altitude', round(altitude, 3), round(self.temperature_offset, 6))
+
+    def __call__(self, series: dict):
+        if self.pressure_factor != 1.0:
+            np.multiply(series['pressure'], self.pressure_factor, out=series['pressure'])
+        if self.temperature_offset:
+            np.add(series['temperature'], self.temperature_offset, out=series['temperature'])
+
+
+class AirDensity:
+    """
+    Moist air density (dry air and water vapour partial densities) as series['air_density'].
+
+    Works on the temperature/pressure/humidity arrays in place, only the result is allocated.
+    """
+    key = ('density',)
+
+    def __call__(self, series: dict):
+        temperature, humidity = series['temperature'], series['humidity']
+
+        # Vapour pressure in Pa: humidity * 6.1078 * 10 ** (7.5 T / (T + 237.3)) (Tetens), built in `humidity`
+        density = np.add(temperature, 237.3)
+        np.divide(temperature, density, out=density)
+        np.multiply(density, 7.5 * np.log(10), out=density)
+        np.exp(density, out=density)
+        np.multiply(humidity, density, out=humidity)
+        np.multiply(humidity, 6.1078, out=humidity)
+
+        # ρ = (p - e) / (R_d T) + e / (R_v T) = (p / R_d - e (1 / R_d - 1 / R_v)) / T
+        np.multiply(series['pressure'], 100 / R_DRY_AIR, out=density)
+        np.multiply(humidity, 1 / R_DRY_AIR - 1 / R_VAPOUR, out=humidity)
+        np.subtract(density, humidity, out=density)
+        np.add(temperature, 273.15, out=temperature)
+        np.divide(density, temperature, out=density)
+        series['air_density'] = density
+
+
+class Pipeline:
+    """
+    A sequence of vectorized stages applied to a weather series.
+
+    The input arrays are copied once, every stage then works in place on the copies, so the
+    series loaded from the database (or a cache) is never modified.
+    """
+    COLUMNS = ('wind_speed', 'temperature', 'pressure', 'humidity')
+
+    def __init__(self, stages: list):
+        self.stages = stages
+
+    @property
+    def key(self) -> tuple:
+        return tuple(stage.key for stage in self.stages)
+
+    def run(self, series: dict) -> dict:
+        length = len(series['wind_speed'])
+        working = {}
+        for name in self.COLUMNS:
+            values = series.get(name)
+            if values is None:
+                working[name] = np.full(length, np.nan, dtype=np.float32)
+            else:
+                # Scalars (e.g. a constant temperature) are broadcast to the length of the series
+                working[name] = np.array(np.broadcast_to(np.asarray(values, dtype=np.float32), (length,)))
+        for stage in self.stages:
+            stage(working)
+        return working
+
+
+def build_pipeline(hub_height: float = None, measurement_height: float = MEASUREMENT_HEIGHT,
+                   elevation: float = None) -> Pipeline:
+    """
+    The standard preprocessing: defaults, shear to hub height, altitude correction and moist air density.
+    """
+    return Pipeline([
+        FillDefaults(),
+        WindShear(measurement_height, hub_height),
+        AltitudeCorrection(elevation, hub_height),
+        AirDensity(),
+    ])
+
+
+_prepared = OrderedDict()
+_prepared_lock = threading.Lock()
+
+
+def prepare_series(series: dict, hub_height: float = None, measurement_height: float = MEASUREMENT_HEIGHT,
+                   elevation: float = None, cache_key=None) -> dict:
+    """
+    Runs the standard pipeline on a series, cached per (dataset, pipeline) when a cache_key is given.
+
+    Turbines with the same hub height share one prepared series, so evaluating many of them
+    does not repeat the transform.
+
+    Parameters:
+    - series (dict): 'wind_speed' and optionally 'temperature', 'pressure' and 'humidity' arrays
+    - hub_height (float, optional): Hub height in m, None keeps the measured wind speeds
+    - measurement_height (float): Height of the wind measurements in m
+    - elevation (float, optional): Site elevation in m above sea level
+    - cache_key (hashable, optional): Identifies the series, e.g. the id of a WindData dataset
+
+    Returns:
+    - dict: float32 'wind_speed' (m/s at hub height) and 'air_density' (kg/m³) arrays
+    """
+    pipeline = build_pipeline(hub_height, measurement_height, elevation)
+    key = None if cache_key is None else (cache_key, len(series['wind_speed']), pipeline.key)
+
+    if key is not None:
+        with _prepared_lock:
+            if key in _prepared:
+                _prepared.move_to_end(key)
+                return _prepared[key]
+
+    working = pipeline.run(series)
+    prepared = {'wind_speed': working['wind_speed'], 'air_density': working['air_density']}
+    for values in prepared.values():
+        # Shared between callers, must not be changed in place
+        values.flags.writeable = False
+
+    if key is not None:
+        with _prepared_lock:
+            _prepared[key] = prepared
+            while len(_prepared) > PREPARED_CACHE_SIZE:
+                _prepared.popitem(last=False)
+    return prepared
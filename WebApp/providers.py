@@ -0,0 +1,313 @@
+import os
+import re
+import tempfile
+import threading
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+DEFAULT_WEATHER_PROVIDER = {
+    'BACKEND': 'meteostat',  # 'meteostat', 'recorded' or 'synthetic'
+    'LOCATION': None,  # Directory of the recorded responses
+    'MODE': 'replay',  # Recorded backend: 'replay', 'record' or 'auto' (replay, record what is missing)
+    'SEED': 0,  # Synthetic backend
+}
+
+# Station grid of the synthetic backend in degrees, dense enough for the 100 km station search
+SYNTHETIC_GRID_DEGREES = 0.5
+SYNTHETIC_MAX_LATITUDE = 80.0
+
+# Sine components per slowly varying (synoptic) signal of the synthetic weather
+SYNOPTIC_COMPONENTS = 6
+
+
+class WeatherProviderError(Exception):
+    """
+    Raised when a provider cannot deliver the requested data, e.g. a recording that does not exist.
+    """
+
+
+class MeteostatProvider:
+    """
+    The live Meteostat service.
+    """
+    name = 'meteostat'
+
+    def stations(self) -> pd.DataFrame:
+        from meteostat import Stations
+        return Stations().fetch()
+
+    def hourly(self, station_id: str, start, end) -> pd.DataFrame:
+        from meteostat import Hourly
+        return Hourly(station_id, start=start, end=end).fetch()
+
+    def daily(self, station_id: str, start, end) -> pd.DataFrame:
+        from meteostat import Daily
+        return Daily(station_id, start=start, end=end).fetch()
+
+
+def _without_objects(values: np.ndarray) -> np.ndarray:
+    # Strings are stored as fixed-width unicode, so the files load without pickle
+    return values.astype(str) if values.dtype == object else values
+
+
+def _frame_to_npz(frame: pd.DataFrame) -> dict:
+    arrays = {'__index__': _without_objects(frame.index.to_numpy())}
+    if frame.index.name:
+        arrays['__index_name__'] = np.array(frame.index.name)
+    for column in frame.columns:
+        arrays[f"column:{column}"] = _without_objects(frame[column].to_numpy())
+    return arrays
+
+
+def _npz_to_frame(stored) -> pd.DataFrame:
+    index_name = str(stored['__index_name__']) if '__index_name__' in stored.files else None
+    columns = {name[len('column:'):]: stored[name] for name in stored.files if name.startswith('column:')}
+    return pd.DataFrame(columns, index=pd.Index(stored['__index__'], name=index_name))
+
+
+class RecordedProvider:
+    """
+    Replays responses recorded from another provider (the live Meteostat service by default).
+
+    Every response is one compressed .npz file in LOCATION, named after the request. MODE 'record'
+    fetches everything from the upstream provider and (re)writes the files, 'replay' only reads
+    them and fails on a missing recording, 'auto' replays and records what is missing.
+    """
+    name = 'recorded'
+    MODES = ('replay', 'record', 'auto')
+
+    def __init__(self, location, mode: str = 'replay', upstream=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown recording mode: {mode}")
+        self.location = Path(location)
+        self.mode = mode
+        self.upstream = upstream or MeteostatProvider()
+
+    def _path(self, kind: str, *parts) -> Path:
+        name = "_".join([kind, *(re.sub(r'[^0-9A-Za-z]+', '-', str(part)).strip('-') for part in parts)])
+        return self.location / f"{name}.npz"
+
+    def _replay_or_record(self, path: Path, fetch) -> pd.DataFrame:
+        if self.mode != 'record' and path.exists():
+            with np.load(path, allow_pickle=False) as stored:
+                return _npz_to_frame(stored)
+        if self.mode == 'replay':
+            raise WeatherProviderError(f"No recorded weather data in {path}, record it with MODE 'record' or 'auto'")
+
+        frame = fetch()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first, so a concurrent reader never sees a partial recording
+        handle, temporary = tempfile.mkstemp(dir=path.parent, suffix='.npz')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                np.savez_compressed(file, **_frame_to_npz(frame))
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        return frame
+
+    def stations(self) -> pd.DataFrame:
+        return self._replay_or_record(self._path('stations'), self.upstream.stations)
+
+    def hourly(self, station_id: str, start, end) -> pd.DataFrame:
+        return self._replay_or_record(self._path('hourly', station_id, start, end),
+                                      lambda: self.upstream.hourly(station_id, start, end))
+
+    def daily(self, station_id: str, start, end) -> pd.DataFrame:
+        return self._replay_or_record(self._path('daily', station_id, start, end),
+                                      lambda: self.upstream.daily(station_id, start, end))
+
+
+def _synoptic_signal(rng, hours: np.ndarray) -> np.ndarray:
+    # Sum of slow sines with random periods (1.5 - 10 days) and phases, zero mean and unit variance
+    periods = rng.uniform(36, 240, SYNOPTIC_COMPONENTS)
+    phases = rng.uniform(0, 2 * np.pi, SYNOPTIC_COMPONENTS)
+    amplitudes = rng.uniform(0.5, 1.0, SYNOPTIC_COMPONENTS)
+    amplitudes *= np.sqrt(2 / (amplitudes ** 2).sum())
+    signal = np.zeros(len(hours))
+    for period, phase, amplitude in zip(periods, phases, amplitudes):
+        signal += amplitude * np.sin(2 * np.pi * hours / period + phase)
+    return signal
+
+
+def _hashed_noise(key: int, minutes: np.ndarray) -> np.ndarray:
+    # Uniform noise in [-0.5, 0.5) that only depends on the key and the timestamp (splitmix64)
+    with np.errstate(over='ignore'):
+        x = minutes.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) + np.uint64(key)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / 2 ** 53 - 0.5
+
+
+def synthetic_weather(latitude: float, longitude: float, timestamps, seed: int = 0) -> pd.DataFrame:
+    """
+    Realistic looking weather at any resolution in Meteostat hourly columns and units.
+
+    Every value is a function of the timestamp (slow synoptic sines plus hashed noise), so any
+    range, chunk or resolution of the same site gives consistent, reproducible series. Temperature
+    follows the latitude, season and local solar time, pressure lows bring stronger winds, wind
+    speeds are Weibull distributed and the sunshine follows the solar elevation and cloud cover.
+
+    Parameters:
+    - latitude, longitude (float): Site or station location
+    - timestamps (array-like): datetime64 start of every timestep, evenly spaced
+    - seed (int): Different seeds give different, equally plausible weather
+
+    Returns:
+    - DataFrame: temp, dwpt (°C), rhum (%), prcp (mm), snow, wdir (°), wspd, wpgt (km/h), pres
+      (hPa), tsun (minutes) and coco indexed by the timestamps
+    """
+    timestamps = np.asarray(timestamps, dtype='datetime64[s]')
+    minutes = timestamps.astype('datetime64[m]').astype(np.int64)
+    hours = minutes / 60
+    step_minutes = float(np.median(np.diff(minutes))) if len(minutes) > 1 else 60.0
+
+    key = zlib.crc32(f"{seed}:{latitude:.4f}:{longitude:.4f}".encode())
+    rng = np.random.default_rng(key)
+    pressure_signal, wind_signal, temperature_signal, cloud_signal, east_signal, north_signal = (
+        _synoptic_signal(rng, hours) for _ in range(6))
+
+    day_of_year = (timestamps - timestamps.astype('datetime64[Y]')).astype('timedelta64[D]').astype(np.float64)
+    solar_hour = (hours + longitude / 15) % 24
+    season = np.cos(2 * np.pi * (day_of_year - 15) / 365.25) * np.sign(latitude or 1)  # 1 in mid-winter
+    diurnal = np.cos(2 * np.pi * (solar_hour - 15) / 24)  # 1 in the afternoon
+
+    mean_temperature = 28 - 0.35 * abs(latitude) + rng.normal(0, 1.5)
+    temperature = (mean_temperature - 0.2 * abs(latitude) * season + 4 * diurnal + 3 * temperature_signal
+                   + _hashed_noise(key + 1, minutes))
+    pressure = 1013 + 9 * pressure_signal + 0.5 * _hashed_noise(key + 2, minutes)
+    humidity = np.clip(75 - 12 * diurnal + 10 * cloud_signal + 4 * _hashed_noise(key + 3, minutes), 15, 100)
+    gamma = np.log(humidity / 100) + 17.62 * temperature / (243.12 + temperature)
+    dew_point = 243.12 * gamma / (17.62 - gamma)
+
+    # Weibull wind speeds: a normal variable (windy lows) through the logistic CDF approximation
+    scale = rng.uniform(4.5, 7.5) * (1 + 0.15 * season) * (1 + 0.1 * diurnal)
+    normal = (0.8 * wind_signal - 0.4 * pressure_signal) / np.hypot(0.8, 0.4) + 0.6 * _hashed_noise(key + 4, minutes)
+    uniform = np.clip(1 / (1 + np.exp(-1.702 * normal)), 1e-6, 1 - 1e-6)
+    wind_speed = scale * (-np.log1p(-uniform)) ** (1 / rng.uniform(1.8, 2.4)) * 3.6
+
+    declination = np.radians(23.44) * np.sin(2 * np.pi * (day_of_year - 80) / 365.25)
+    hour_angle = np.radians(15 * (solar_hour - 12))
+    sin_elevation = (np.sin(np.radians(latitude)) * np.sin(declination)
+                     + np.cos(np.radians(latitude)) * np.cos(declination) * np.cos(hour_angle))
+    cloud = 1 / (1 + np.exp(-(1.5 * cloud_signal - 0.5 * pressure_signal)))
+    sunshine = np.where(sin_elevation > 0, step_minutes * np.clip(1.2 - 1.3 * cloud, 0, 1), 0.0)
+    precipitation = np.where(cloud > 0.8, (cloud - 0.8) * 5 * step_minutes / 60, 0.0)
+    condition = np.where(precipitation > 0, 7, 1 + np.floor(cloud * 4))
+
+    return pd.DataFrame({
+        'temp': temperature,
+        'dwpt': dew_point,
+        'rhum': humidity,
+        'prcp': precipitation,
+        'snow': np.nan,
+        'wdir': np.degrees(np.arctan2(east_signal, north_signal)) % 360,
+        'wspd': wind_speed,
+        'wpgt': wind_speed * (1.4 + 0.2 * (_hashed_noise(key + 5, minutes) + 0.5)),
+        'pres': pressure,
+        'tsun': sunshine,
+        'coco': condition,
+    }, index=pd.DatetimeIndex(timestamps, name='time'))
+
+
+class SyntheticProvider:
+    """
+    Generated weather for a worldwide grid of stations, deterministic and without any network access.
+    """
+    name = 'synthetic'
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+
+    @staticmethod
+    def station_location(station_id: str):
+        # Station ids encode their grid cell: SYN<row>_<column>
+        row, column = map(int, station_id[3:].split('_'))
+        return (-SYNTHETIC_MAX_LATITUDE + (row + 0.5) * SYNTHETIC_GRID_DEGREES,
+                -180 + (column + 0.5) * SYNTHETIC_GRID_DEGREES)
+
+    def stations(self) -> pd.DataFrame:
+        rows = int(round(2 * SYNTHETIC_MAX_LATITUDE / SYNTHETIC_GRID_DEGREES))
+        columns = int(round(360 / SYNTHETIC_GRID_DEGREES))
+        row, column = np.divmod(np.arange(rows * columns), columns)
+        latitude = -SYNTHETIC_MAX_LATITUDE + (row + 0.5) * SYNTHETIC_GRID_DEGREES
+        longitude = -180 + (column + 0.5) * SYNTHETIC_GRID_DEGREES
+        elevation = np.clip(250 + 300 * np.sin(np.radians(3 * longitude)) * np.cos(np.radians(2 * latitude)), 0, None)
+        start = np.full(len(row), np.datetime64('1970-01-01'), dtype='datetime64[ns]')
+        end = np.full(len(row), np.datetime64('NaT'), dtype='datetime64[ns]')
+        return pd.DataFrame({
+            'name': 'Synthetic',
+            'latitude': latitude,
+            'longitude': longitude,
+            'elevation': elevation.round(),
+            'hourly_start': start,
+            'hourly_end': end,
+            'daily_start': start,
+            'daily_end': end,
+        }, index=pd.Index([f"SYN{r}_{c}" for r, c in zip(row.tolist(), column.tolist())], name='id'))
+
+    def hourly(self, station_id: str, start, end) -> pd.DataFrame:
+        timestamps = np.arange(np.datetime64(start, 'h'), np.datetime64(end, 'h') + 1, dtype='datetime64[h]')
+        return synthetic_weather(*self.station_location(station_id), timestamps, self.seed)
+
+    def daily(self, station_id: str, start, end) -> pd.DataFrame:
+        first, last = np.datetime64(start, 'D'), np.datetime64(end, 'D')
+        hourly = self.hourly(station_id, first.astype('datetime64[h]'), (last + 1).astype('datetime64[h]') - 1)
+        days = hourly.resample('D')
+        angles = np.radians(hourly['wdir'])
+        directions = pd.DataFrame({'east': np.sin(angles), 'north': np.cos(angles)}).resample('D')
+        means = directions.mean()
+        return pd.DataFrame({
+            'tavg': days['temp'].mean(),
+            'tmin': days['temp'].min(),
+            'tmax': days['temp'].max(),
+            'prcp': days['prcp'].sum(),
+            'snow': np.nan,
+            'wdir': np.degrees(np.arctan2(means['east'], means['north'])) % 360,
+            'wspd': days['wspd'].mean(),
+            'wpgt': days['wpgt'].max(),
+            'pres': days['pres'].mean(),
+            'tsun': days['tsun'].sum(),
+        })
+
+
+def get_weather_provider_settings() -> dict:
+    return {**DEFAULT_WEATHER_PROVIDER, **getattr(settings, 'WEATHER_PROVIDER', {})}
+
+
+def build_weather_provider(options: dict):
+    backend = options['BACKEND']
+    if backend == 'meteostat':
+        return MeteostatProvider()
+    if backend == 'recorded':
+        location = options['LOCATION'] or Path(settings.BASE_DIR) / 'weather_recordings'
+        return RecordedProvider(location, options['MODE'])
+    if backend == 'synthetic':
+        return SyntheticProvider(options['SEED'])
+    raise ValueError(f"Unknown weather provider: {backend}")
+
+
+_weather_provider = None
+_weather_provider_options = None
+_weather_provider_lock = threading.Lock()
+
+
+def get_weather_provider():
+    """
+    Returns the process-wide weather provider configured by settings.WEATHER_PROVIDER, rebuilt
+    when the settings change (e.g. with override_settings in tests).
+    """
+    global _weather_provider, _weather_provider_options
+    options = get_weather_provider_settings()
+    if _weather_provider is None or options != _weather_provider_options:
+        with _weather_provider_lock:
+            if _weather_provider is None or options != _weather_provider_options:
+                _weather_provider = build_weather_provider(options)
+                _weather_provider_options = options
+    return _weather_provider
@@ -4,4 +4,74 @@ from .models import Turbine
 class TurbineSerializer(serializers.ModelSerializer):
     class Meta:
         model = Turbine
-        fields = "__all__"
\ No newline at end of file
+        fields = "__all__"
+
+
+class TurbineImportSerializer(TurbineSerializer):
+    """
+    One turbine of a bulk import, the unique names are checked for the whole batch in the view.
+    """
+    name = serializers.CharField(max_length=100)
+
+    class Meta(TurbineSerializer.Meta):
+        fields = ['name', 'company_name', 'rotor_diameter', 'efficiency', 'nominal_power', 'startup_speed',
+                  'hub_height']
+
+    def validate(self, attrs):
+        # Same range checks as Turbine.save()
+        Turbine(**attrs).clean()
+        return attrs
+
+
+class TurbineSearchSerializer(serializers.Serializer):
+    """
+    Query parameters of the catalogue search, see catalogue.CatalogueSnapshot.search().
+    """
+    q = serializers.CharField(required=False, allow_blank=True, max_length=100)
+    manufacturer = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    min_power = serializers.FloatField(required=False, min_value=0)
+    max_power = serializers.FloatField(required=False, min_value=0)
+    min_diameter = serializers.FloatField(required=False, min_value=0)
+    max_diameter = serializers.FloatField(required=False, min_value=0)
+    min_startup = serializers.FloatField(required=False, min_value=0)
+    max_startup = serializers.FloatField(required=False, min_value=0)
+
+
+class DatasetUploadSerializer(serializers.Serializer):
+    """
+    Query parameters (or form fields) describing an uploaded CSV dataset.
+    """
+    kind = serializers.ChoiceField(choices=['wind', 'consumption'], default='wind')
+    latitude = serializers.FloatField(required=False, allow_null=True, min_value=-90, max_value=90)
+    longitude = serializers.FloatField(required=False, allow_null=True, min_value=-180, max_value=180)
+    measurement_height = serializers.FloatField(required=False, allow_null=True, min_value=0.5, max_value=300)
+    elevation = serializers.FloatField(required=False, allow_null=True, min_value=-500, max_value=9000)
+
+
+class CalculationPairSerializer(serializers.Serializer):
+    turbine = serializers.IntegerField()
+    dataset = serializers.UUIDField()
+
+
+class CalculationBatchSerializer(serializers.Serializer):
+    """
+    Turbine × dataset combinations of a batch calculation: explicit pairs and/or every combination
+    of the turbines and datasets lists.
+    """
+    pairs = CalculationPairSerializer(many=True, required=False, default=list)
+    turbines = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    datasets = serializers.ListField(child=serializers.UUIDField(), required=False, default=list)
+
+    def __init__(self, *args, max_pairs: int = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_pairs = max_pairs
+
+    def validate(self, attrs):
+        pairs = [(pair['turbine'], pair['dataset']) for pair in attrs['pairs']]
+        pairs += [(turbine, dataset) for dataset in attrs['datasets'] for turbine in attrs['turbines']]
+        if not pairs:
+            raise serializers.ValidationError("Provide pairs or turbines and datasets.")
+        if self.max_pairs is not None and len(pairs) > self.max_pairs:
+            raise serializers.ValidationError(f"At most {self.max_pairs} combinations per request.")
+        attrs['combinations'] = pairs
+        return attrs
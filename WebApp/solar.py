@@ -0,0 +1,179 @@
+import numpy as np
+
+SOLAR_CONSTANT = 1361.0  # W/m²
+
+# Ångström-Prescott coefficients, global irradiance = extraterrestrial * (a + b * sunshine fraction)
+ANGSTROM_A = 0.25
+ANGSTROM_B = 0.50
+
+# Sunshine fraction assumed when a timestep has neither irradiance nor sunshine data
+DEFAULT_SUNSHINE_FRACTION = 0.4
+
+GROUND_ALBEDO = 0.2
+INVERTER_EFFICIENCY = 0.96
+
+# Below this cosine of the zenith angle the sun is too low for a meaningful beam/diffuse split
+MIN_COS_ZENITH = 0.065
+
+
+def solar_position(timestamps: np.ndarray, latitude: float, longitude: float):
+    """
+    Vectorized solar position (NOAA approximation) for UTC timestamps.
+
+    Parameters:
+    - timestamps (ndarray): datetime64 UTC timestamps
+    - latitude (float): Latitude in degrees
+    - longitude (float): Longitude in degrees, east positive
+
+    Returns:
+    - tuple: (cos_zenith, azimuth in radians clockwise from north, day_of_year) arrays
+    """
+    timestamps = np.asarray(timestamps, dtype='datetime64[s]')
+    days = timestamps.astype('datetime64[D]')
+    day_of_year = (days - days.astype('datetime64[Y]')).astype(np.float64) + 1
+    hour = (timestamps - days).astype(np.float64) / 3600
+
+    gamma = 2 * np.pi / 365 * (day_of_year - 1 + (hour - 12) / 24)
+    equation_of_time = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                                 - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))
+    declination = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+                   - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma)
+                   - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+
+    # True solar time in minutes and the hour angle
+    solar_time = hour * 60 + equation_of_time + 4 * longitude
+    hour_angle = np.radians(solar_time / 4 - 180)
+
+    lat = np.radians(latitude)
+    cos_zenith = np.sin(lat) * np.sin(declination) + np.cos(lat) * np.cos(declination) * np.cos(hour_angle)
+    azimuth = np.arctan2(np.sin(hour_angle),
+                         np.cos(hour_angle) * np.sin(lat) - np.tan(declination) * np.cos(lat)) + np.pi
+
+    return np.clip(cos_zenith, -1.0, 1.0), azimuth, day_of_year
+
+
+def expand_to_samples(timestamps: np.ndarray, step_hours: float):
+    """
+    Splits every timestep of a coarser series (e.g. daily) into hourly samples, steps of an hour or
+    less are kept as one sample of their own length.
+
+    Returns:
+    - tuple: (sample timestamps, samples per step, sample length in hours), the sample array has
+      shape (n_steps * samples_per_step,)
+    """
+    samples_per_step = max(int(round(step_hours)), 1)
+    sample_seconds = int(round(step_hours * 3600 / samples_per_step))
+    offsets = np.arange(samples_per_step, dtype=np.int64) * sample_seconds
+    # Samples represent the middle of their interval
+    samples = (np.asarray(timestamps, dtype='datetime64[s]')[:, None]
+               + (offsets + sample_seconds // 2).astype('timedelta64[s]'))
+    return samples.ravel(), samples_per_step, sample_seconds / 3600
+
+
+def global_irradiance(cos_zenith, day_of_year, sunshine_fraction):
+    """
+    Global horizontal irradiance (W/m²) from the sunshine fraction using the Ångström-Prescott relation.
+    """
+    extraterrestrial = SOLAR_CONSTANT * (1 + 0.033 * np.cos(2 * np.pi * day_of_year / 365))
+    return extraterrestrial * np.maximum(cos_zenith, 0) * (ANGSTROM_A + ANGSTROM_B * sunshine_fraction)
+
+
+def plane_of_array_irradiance(ghi, cos_zenith, sun_azimuth, day_of_year, tilt: float, azimuth: float):
+    """
+    Irradiance on a tilted panel using the Erbs beam/diffuse split and an isotropic sky.
+
+    Parameters:
+    - ghi (ndarray): Global horizontal irradiance in W/m²
+    - cos_zenith, sun_azimuth, day_of_year (ndarray): From solar_position()
+    - tilt (float): Panel tilt from horizontal in degrees
+    - azimuth (float): Panel azimuth in degrees clockwise from north (180 = south)
+
+    Returns:
+    - ndarray: Plane-of-array irradiance in W/m²
+    """
+    extraterrestrial = SOLAR_CONSTANT * (1 + 0.033 * np.cos(2 * np.pi * day_of_year / 365))
+    cos_zenith_safe = np.maximum(cos_zenith, MIN_COS_ZENITH)
+    clearness = np.clip(ghi / (extraterrestrial * cos_zenith_safe), 0, 1)
+
+    diffuse_fraction = np.where(
+        clearness <= 0.22, 1 - 0.09 * clearness,
+        np.where(clearness <= 0.80,
+                 0.9511 - 0.1604 * clearness + 4.388 * clearness ** 2 - 16.638 * clearness ** 3 + 12.336 * clearness ** 4,
+                 0.165))
+    dhi = diffuse_fraction * ghi
+    dni = np.where(cos_zenith > MIN_COS_ZENITH, (ghi - dhi) / cos_zenith_safe, 0.0)
+
+    tilt, azimuth = np.radians(tilt), np.radians(azimuth)
+    sin_zenith = np.sqrt(1 - cos_zenith_safe ** 2)
+    cos_incidence = cos_zenith_safe * np.cos(tilt) + sin_zenith * np.sin(tilt) * np.cos(sun_azimuth - azimuth)
+
+    return (dni * np.maximum(cos_incidence, 0)
+            + dhi * (1 + np.cos(tilt)) / 2
+            + ghi * GROUND_ALBEDO * (1 - np.cos(tilt)) / 2)
+
+
+def calculate_pv_power_output(timestamps, latitude: float, longitude: float, peak_power, tilt: float, azimuth: float,
+                              temperature_coefficient: float, noct: float, inverter_power, system_losses: float,
+                              step_hours: float = 1.0, irradiance=None, sunshine=None, temperature=None) -> np.ndarray:
+    """
+    Vectorized AC power output of a PV system for a whole weather series.
+
+    Series coarser than one hour (e.g. daily Meteostat data) are expanded to hours, evaluated with
+    the hourly sun position and averaged back, so the result has one value per input timestep.
+    Sub-hourly steps (e.g. 10-minute data) are evaluated at the middle of every step.
+
+    Parameters:
+    - timestamps (ndarray): datetime64 UTC start of every timestep
+    - latitude, longitude (float): Location of the system in degrees
+    - peak_power (float): Installed DC peak power in W
+    - tilt, azimuth (float): Panel orientation in degrees (azimuth 180 = south)
+    - temperature_coefficient (float): Relative power change per °C of cell temperature
+    - noct (float): Nominal operating cell temperature in °C
+    - inverter_power (float): AC inverter capacity in W, the output is clipped to it
+    - system_losses (float): Fraction of DC power lost in cables, soiling and mismatch
+    - step_hours (float): Length of one timestep in hours
+    - irradiance (array-like, optional): Mean global horizontal irradiance per timestep in W/m², NaN if unknown
+    - sunshine (array-like, optional): Sunshine duration per timestep in minutes, NaN if unknown
+    - temperature (array-like, optional): Air temperature per timestep in °C (default 15°C)
+
+    Returns:
+    - ndarray: Mean AC power output in Watts for every timestep
+    """
+    n_steps = len(timestamps)
+    sample_timestamps, samples_per_step, sample_hours = expand_to_samples(timestamps, step_hours)
+    cos_zenith, sun_azimuth, day_of_year = solar_position(sample_timestamps, latitude, longitude)
+
+    # (n_steps, samples_per_step) views, so per-step inputs broadcast over the samples of the step
+    cos_zenith = cos_zenith.reshape(n_steps, samples_per_step)
+    sun_azimuth = sun_azimuth.reshape(n_steps, samples_per_step)
+    day_of_year = day_of_year.reshape(n_steps, samples_per_step)
+
+    def per_step(values):
+        if values is None:
+            return np.full((n_steps, 1), np.nan)
+        return np.asarray(values, dtype=np.float64).reshape(n_steps, 1)
+
+    # Sunshine minutes relative to the daylight minutes of the step
+    daylight_minutes = (cos_zenith > 0).sum(axis=1, keepdims=True) * sample_hours * 60
+    sunshine_fraction = np.clip(per_step(sunshine) / np.maximum(daylight_minutes, 1), 0, 1)
+    sunshine_fraction = np.where(np.isnan(sunshine_fraction), DEFAULT_SUNSHINE_FRACTION, sunshine_fraction)
+    ghi = global_irradiance(cos_zenith, day_of_year, sunshine_fraction)
+
+    # Measured irradiance replaces the estimate, keeping the daily shape of the sun path
+    measured = per_step(irradiance)
+    has_measurement = ~np.isnan(measured)
+    if has_measurement.any():
+        shape = ghi.mean(axis=1, keepdims=True)
+        scale = np.where(shape > 0, np.nan_to_num(measured) / np.where(shape > 0, shape, 1), 0)
+        ghi = np.where(has_measurement, ghi * scale, ghi)
+
+    poa = plane_of_array_irradiance(ghi, cos_zenith, sun_azimuth, day_of_year, tilt, azimuth)
+
+    air_temperature = per_step(temperature)
+    air_temperature = np.where(np.isnan(air_temperature), 15.0, air_temperature)
+    cell_temperature = air_temperature + (noct - 20) / 800 * poa
+
+    dc_power = peak_power * poa / 1000 * (1 + temperature_coefficient * (cell_temperature - 25)) * (1 - system_losses)
+    ac_power = np.clip(dc_power * INVERTER_EFFICIENCY, 0, inverter_power)
+
+    return ac_power.mean(axis=1)
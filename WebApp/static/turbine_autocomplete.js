@@ -0,0 +1,77 @@
+// Turbine autocomplete of step 1: queries the catalogue search API page by page
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('.turbine-autocomplete').forEach(function (widget) {
+        const value = widget.querySelector('.turbine-autocomplete-value');
+        const query = widget.querySelector('.turbine-autocomplete-query');
+        const manufacturer = widget.querySelector('.turbine-autocomplete-manufacturer');
+        const minPower = widget.querySelector('.turbine-autocomplete-min-power');
+        const maxPower = widget.querySelector('.turbine-autocomplete-max-power');
+        const results = widget.querySelector('.turbine-autocomplete-results');
+        const more = widget.querySelector('.turbine-autocomplete-more');
+        let nextUrl = null;
+        let timer = null;
+        let request = 0;
+
+        function searchUrl() {
+            const params = new URLSearchParams();
+            if (query.value.trim()) params.set('q', query.value.trim());
+            if (manufacturer.value) params.set('manufacturer', manufacturer.value);
+            // The API expects W, the form asks for kW
+            if (minPower.value) params.set('min_power', minPower.value * 1000);
+            if (maxPower.value) params.set('max_power', maxPower.value * 1000);
+            return widget.dataset.searchUrl + '?' + params.toString();
+        }
+
+        function updateManufacturers(facets) {
+            if (manufacturer.value) return;
+            manufacturer.length = 1;
+            facets.manufacturers.forEach(function (facet) {
+                manufacturer.add(new Option(facet.name + ' (' + facet.count + ')', facet.name));
+            });
+        }
+
+        function show(url, append) {
+            const current = ++request;
+            fetch(url, {headers: {'Accept': 'application/json'}})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    // Answers of outdated requests are dropped
+                    if (current !== request) return;
+                    if (!append) {
+                        results.innerHTML = '';
+                        updateManufacturers(data.facets);
+                    }
+                    data.results.forEach(function (turbine) {
+                        const item = document.createElement('li');
+                        item.textContent = turbine.company_name + ' ' + turbine.name + ' (' +
+                            (turbine.nominal_power / 1000) + ' kW, ' + turbine.rotor_diameter + ' m)';
+                        item.addEventListener('click', function () {
+                            value.value = turbine.id;
+                            query.value = turbine.company_name + ' ' + turbine.name;
+                            results.innerHTML = '';
+                            more.hidden = true;
+                        });
+                        results.appendChild(item);
+                    });
+                    nextUrl = data.next;
+                    more.hidden = !nextUrl;
+                });
+        }
+
+        function search() {
+            clearTimeout(timer);
+            timer = setTimeout(function () { show(searchUrl(), false); }, 200);
+        }
+
+        query.addEventListener('input', function () {
+            value.value = '';
+            search();
+        });
+        [manufacturer, minPower, maxPower].forEach(function (element) {
+            element.addEventListener('change', search);
+        });
+        more.addEventListener('click', function () {
+            if (nextUrl) show(nextUrl, true);
+        });
+    });
+});
@@ -0,0 +1,284 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from WebApp.providers import get_weather_provider
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+DEFAULT_STATION_INDEX = {
+    'LOCATION': None,  # Default: weather_cache/stations.npz in BASE_DIR
+    'MAX_AGE': 30 * 24 * 60 * 60,  # Rebuild from the Meteostat inventory after this many seconds
+    'CELL_DEGREES': 1.0,  # Size of the grid cells
+    'NEIGHBOURS': 4,  # Stations blended for one site
+    'MAX_DISTANCE_KM': 100.0,  # Stations further away are not blended, only the nearest one is used if none is closer
+    'POWER': 2.0,  # Exponent of the inverse distance weights
+}
+
+# Inventory columns stored with the index, the coverage dates tell which stations have data for a period
+COVERAGE_COLUMNS = ('hourly_start', 'hourly_end', 'daily_start', 'daily_end')
+
+
+def get_station_index_settings() -> dict:
+    return {**DEFAULT_STATION_INDEX, **getattr(settings, 'STATION_INDEX', {})}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Vectorized great-circle distance in km.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class StationIndex:
+    """
+    Latitude/longitude grid over the Meteostat station inventory.
+
+    Stations are sorted by grid cell and cell_starts holds the first position of every cell
+    (like a CSR matrix), so the stations of a cell are one slice. A k-nearest query only
+    looks at the rings of cells around the site until the k-th distance is proven.
+    """
+
+    def __init__(self, ids, latitude, longitude, elevation, coverage: dict, cell_degrees: float = 1.0):
+        self.cell_degrees = cell_degrees
+        self.rows = int(np.ceil(180 / cell_degrees))
+        self.columns = int(np.ceil(360 / cell_degrees))
+
+        cells = self._cells(np.asarray(latitude, dtype=np.float64), np.asarray(longitude, dtype=np.float64))
+        order = np.argsort(cells, kind='stable')
+        self.ids = np.asarray(ids, dtype=str)[order]
+        self.latitude = np.asarray(latitude, dtype=np.float64)[order]
+        self.longitude = np.asarray(longitude, dtype=np.float64)[order]
+        self.elevation = np.asarray(elevation, dtype=np.float64)[order]
+        self.coverage = {name: np.asarray(values, dtype='datetime64[D]')[order] for name, values in coverage.items()}
+        self.cell_starts = np.searchsorted(cells[order], np.arange(self.rows * self.columns + 1))
+        self._cell_starts = self.cell_starts.tolist()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _row(self, latitude):
+        return np.clip(((latitude + 90) // self.cell_degrees).astype(np.int64), 0, self.rows - 1)
+
+    def _column(self, longitude):
+        return ((longitude + 180) // self.cell_degrees).astype(np.int64) % self.columns
+
+    def _cells(self, latitude, longitude):
+        return self._row(latitude) * self.columns + self._column(longitude)
+
+    def _ring(self, row: int, column: int, radius: int) -> np.ndarray:
+        # Positions of the stations in the cells at exactly `radius` cells from (row, column).
+        # A ring has only 8 * radius cells, plain Python is faster than building index grids.
+        cells = set()
+        for ring_row in range(max(row - radius, 0), min(row + radius, self.rows - 1) + 1):
+            if abs(ring_row - row) == radius:
+                ring_columns = range(column - radius, column + radius + 1)
+            else:
+                ring_columns = (column - radius, column + radius)
+            cells.update(ring_row * self.columns + ring_column % self.columns for ring_column in ring_columns)
+
+        starts = self._cell_starts
+        return np.array([position for cell in cells for position in range(starts[cell], starts[cell + 1])],
+                        dtype=np.int64)
+
+    def _unvisited_bound_km(self, latitude: float, radius: int) -> float:
+        # Lower bound for the distance of a station outside of the rings visited so far
+        degrees = radius * self.cell_degrees
+        highest = min(abs(latitude) + degrees + self.cell_degrees, 90.0)
+        return np.radians(degrees) * EARTH_RADIUS_KM * np.cos(np.radians(highest))
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1, max_distance_km: float = None,
+                interval: str = None, start_date=None, end_date=None):
+        """
+        Finds the k nearest stations of a site.
+
+        Parameters:
+        - latitude, longitude (float): The site in degrees
+        - k (int): Number of stations
+        - max_distance_km (float, optional): Stations further away are left out
+        - interval (str, optional): 'daily' or 'hourly', together with start_date and end_date only
+          stations whose inventory covers part of the period are returned
+
+        Returns:
+        - tuple: (positions, distances in km) arrays sorted by distance, possibly shorter than k
+        """
+        row, column = int(self._row(np.float64(latitude))), int(self._column(np.float64(longitude)))
+        check_coverage = interval is not None and start_date is not None and end_date is not None
+        if check_coverage:
+            first, last = self.coverage[f'{interval}_start'], self.coverage[f'{interval}_end']
+            start, end = np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D')
+
+        candidates = np.empty(0, dtype=np.int64)
+        distances = np.empty(0)
+        max_radius = max(self.rows, self.columns // 2)
+        for radius in range(max_radius + 1):
+            found = self._ring(row, column, radius)
+            if check_coverage and len(found):
+                # Stations without inventory dates are kept, Meteostat decides when data is fetched
+                found = found[(np.isnat(first[found]) | (first[found] <= end))
+                              & (np.isnat(last[found]) | (last[found] >= start))]
+            if len(found):
+                candidates = np.concatenate([candidates, found])
+                distances = np.concatenate([distances, haversine_km(
+                    latitude, longitude, self.latitude[found], self.longitude[found])])
+
+            bound = self._unvisited_bound_km(latitude, radius)
+            if max_distance_km is not None and bound > max_distance_km:
+                break
+            if len(distances) >= k and np.partition(distances, k - 1)[k - 1] <= bound:
+                break
+
+        order = np.argsort(distances, kind='stable')[:k]
+        candidates, distances = candidates[order], distances[order]
+        if max_distance_km is not None:
+            within = distances <= max_distance_km
+            candidates, distances = candidates[within], distances[within]
+        return candidates, distances
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so readers never see a partial index
+        temporary = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.npz')
+        np.savez(temporary, ids=self.ids, latitude=self.latitude, longitude=self.longitude,
+                 elevation=self.elevation, cell_degrees=self.cell_degrees, **self.coverage)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path) -> 'StationIndex':
+        with np.load(path) as stored:
+            return cls(stored['ids'], stored['latitude'], stored['longitude'], stored['elevation'],
+                       {name: stored[name] for name in COVERAGE_COLUMNS},
+                       cell_degrees=float(stored['cell_degrees']))
+
+    @classmethod
+    def from_inventory(cls, inventory, cell_degrees: float = 1.0) -> 'StationIndex':
+        """
+        Builds the index from a station inventory DataFrame in the Meteostat format (indexed by
+        station id, latitude, longitude, elevation and the *_start/*_end coverage columns).
+        """
+        inventory = inventory[inventory['latitude'].notna() & inventory['longitude'].notna()]
+        coverage = {}
+        for name in COVERAGE_COLUMNS:
+            if name in inventory:
+                coverage[name] = inventory[name].to_numpy(dtype='datetime64[D]')
+            else:
+                coverage[name] = np.full(len(inventory), np.datetime64('NaT'), dtype='datetime64[D]')
+        elevation = inventory['elevation'] if 'elevation' in inventory else np.full(len(inventory), np.nan)
+        return cls(inventory.index.to_numpy(dtype=str), inventory['latitude'], inventory['longitude'],
+                   np.asarray(elevation, dtype=np.float64), coverage, cell_degrees=cell_degrees)
+
+
+def get_station_index_path() -> Path:
+    """
+    Index file of the configured weather provider, providers other than Meteostat get their own file.
+    """
+    location = get_station_index_settings()['LOCATION']
+    path = Path(location) if location else Path(settings.BASE_DIR) / 'weather_cache' / 'stations.npz'
+    provider = get_weather_provider().name
+    if provider != 'meteostat':
+        path = path.with_name(f"{path.stem}-{provider}{path.suffix}")
+    return path
+
+
+def build_station_index() -> StationIndex:
+    """
+    Downloads the station inventory of the weather provider, stores the index on disk and makes it
+    the process-wide index.
+    """
+    global _station_index, _station_index_path
+    options = get_station_index_settings()
+    path = get_station_index_path()
+    index = StationIndex.from_inventory(get_weather_provider().stations(), options['CELL_DEGREES'])
+    index.save(path)
+    with _station_index_lock:
+        _station_index, _station_index_path = index, path
+    return index
+
+
+_station_index = None
+_station_index_path = None
+_station_index_lock = threading.Lock()
+
+
+def get_station_index() -> StationIndex:
+    """
+    Returns the process-wide station index, loaded from disk or built when it is missing or
+    older than STATION_INDEX['MAX_AGE']. Switching the weather provider switches the index.
+    """
+    global _station_index, _station_index_path
+    path = get_station_index_path()
+    if _station_index is None or _station_index_path != path:
+        with _station_index_lock:
+            if _station_index is None or _station_index_path != path:
+                _station_index = None
+                max_age = get_station_index_settings()['MAX_AGE']
+                if path.exists() and time.time() - path.stat().st_mtime < max_age:
+                    _station_index, _station_index_path = StationIndex.load(path), path
+        if _station_index is None:
+            build_station_index()
+    return _station_index
+
+
+def nearest_stations(latitude: float, longitude: float, interval: str = None, start_date=None, end_date=None):
+    """
+    The stations blended for a site, as configured in settings.STATION_INDEX.
+
+    Offshore and remote sites without a station within MAX_DISTANCE_KM fall back to the single
+    nearest station, like before the stations were blended.
+
+    Returns:
+    - list: (station id, distance in km, elevation in m or None) tuples sorted by distance
+    """
+    options = get_station_index_settings()
+    index = get_station_index()
+    positions, distances = index.nearest(latitude, longitude, k=options['NEIGHBOURS'],
+                                         max_distance_km=options['MAX_DISTANCE_KM'],
+                                         interval=interval, start_date=start_date, end_date=end_date)
+    if len(positions) == 0 and options['MAX_DISTANCE_KM'] is not None:
+        positions, distances = index.nearest(latitude, longitude, k=1, interval=interval, start_date=start_date,
+                                             end_date=end_date)
+        if len(positions):
+            logger.warning(f"No weather station within {options['MAX_DISTANCE_KM']:g} km of ({latitude}, {longitude}), "
+                           f"using the nearest one {distances[0]:.0f} km away")
+    return [(str(index.ids[position]), float(distance),
+             None if np.isnan(index.elevation[position]) else float(index.elevation[position]))
+            for position, distance in zip(positions, distances)]
+
+
+def weighted_elevation(stations: list, weights) -> float:
+    """
+    Weighted mean elevation of (station id, distance, elevation) tuples, None if no elevation is known.
+    """
+    elevations = np.array([np.nan if elevation is None else elevation for _, _, elevation in stations])
+    known = ~np.isnan(elevations)
+    if not known.any():
+        return None
+    return float(np.average(elevations[known], weights=np.asarray(weights, dtype=np.float64)[known]))
+
+
+def site_elevation(latitude: float, longitude: float) -> float:
+    """
+    Estimates the elevation of a site in m from the stations around it, None if unknown.
+    """
+    stations = nearest_stations(latitude, longitude)
+    if not stations:
+        return None
+    power = get_station_index_settings()['POWER']
+    return weighted_elevation(stations, idw_weights([distance for _, distance, _ in stations], power))
+
+
+def idw_weights(distances, power: float = 2.0, min_distance_km: float = 0.1) -> np.ndarray:
+    """
+    Inverse distance weights, a station (almost) at the site dominates instead of dividing by zero.
+    """
+    return 1.0 / np.maximum(np.asarray(distances, dtype=np.float64), min_distance_km) ** power
@@ -0,0 +1,257 @@
+import csv
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from WebApp.models import Turbine, PowerCurve
+from WebApp.preprocessing import prepare_series, MEASUREMENT_HEIGHT
+from WebApp.utils import calculate_power_output
+
+logger = logging.getLogger(__name__)
+
+# Turbines evaluated by one worker task
+TURBINES_PER_TASK = 256
+
+OUTPUT_FIELDS = ['site', 'latitude', 'longitude', 'year', 'turbine_id', 'turbine', 'timesteps',
+                 'annual_energy_kwh', 'capacity_factor']
+
+
+def _init_worker():
+    # Workers started with "spawn" have to set up Django themselves, forked ones inherit it
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _fetch_site_year(site_index: int, site: dict, year: int, directory: str):
+    """
+    Worker task: fetches one site-year and writes it to a .npy file the evaluation tasks memory-map.
+
+    Returns:
+    - tuple: (site_index, year, path or None if no data was found, site elevation in m or None)
+    """
+    from WebApp.weather import get_hourly_wind_series
+
+    series = get_hourly_wind_series(site['latitude'], site['longitude'], date(year, 1, 1), date(year, 12, 31))
+    if series is None:
+        return site_index, year, None, None
+
+    # One row per SITE_ROWS entry, the evaluation tasks prepare them for the hub heights they need
+    site_array = np.stack([series[name] for name in SITE_ROWS]).astype(np.float32)
+
+    path = Path(directory) / f"site_{site_index}_{year}.npy"
+    np.save(path, site_array)
+    return site_index, year, str(path), series['elevation']
+
+
+# Rows of the site-year arrays, the measured series the preprocessing pipeline needs
+SITE_ROWS = ('wind_speed', 'temperature', 'pressure', 'humidity')
+
+_turbine_arrays = {}
+
+
+def _load_turbines(path: str) -> dict:
+    # The catalogue file is opened once per worker process and shared through the page cache
+    if path not in _turbine_arrays:
+        with np.load(path) as stored:
+            _turbine_arrays[path] = {name: stored[name] for name in stored.files}
+    return _turbine_arrays[path]
+
+
+def _evaluate(site_path: str, elevation, measurement_height: float, turbines_path: str, start: int, stop: int):
+    """
+    Worker task: evaluates the turbines [start, stop) of the catalogue against one memory-mapped site-year.
+
+    The site-year is prepared once per hub height and worker process (see preprocessing.prepare_series),
+    so later chunks with the same hub heights reuse it.
+
+    Returns:
+    - tuple: (site_path, start, mean power per turbine in W, number of timesteps)
+    """
+    site_array = np.load(site_path, mmap_mode='r')
+    series = dict(zip(SITE_ROWS, site_array))
+    turbines = _load_turbines(turbines_path)
+    hub_heights = turbines['hub_height'][start:stop]
+    mean_power = np.empty(stop - start)
+
+    # NaN marks turbines without a hub height, they use the measured wind speeds
+    for hub_height in np.unique(hub_heights):
+        group = np.flatnonzero(hub_heights == hub_height) if not np.isnan(hub_height) \
+            else np.flatnonzero(np.isnan(hub_heights))
+        prepared = prepare_series(series, None if np.isnan(hub_height) else float(hub_height), measurement_height,
+                                  elevation, cache_key=site_path)
+        wind_speeds, air_density = prepared['wind_speed'], prepared['air_density']
+        chunk = start + group
+
+        power_matrix = calculate_power_output(
+            wind_speeds, air_density,
+            turbines['rotor_diameter'][chunk, None], turbines['efficiency'][chunk, None],
+            turbines['nominal_power'][chunk, None], turbines['startup_speed'][chunk, None])
+        mean_power[group] = power_matrix.mean(axis=1)
+
+        # Tabulated power curves replace the idealised formula
+        for position in group[turbines['curve_offsets'][chunk] >= 0]:
+            offset = turbines['curve_offsets'][start + position]
+            table = turbines['curve_tables'][offset:offset + turbines['curve_lengths'][start + position]]
+            mean_power[position] = PowerCurve.lookup(table, wind_speeds, air_density,
+                                                     turbines['curve_densities'][start + position]).mean()
+
+    return site_path, start, mean_power, site_array.shape[1]
+
+
+def _write_turbine_arrays(turbines, path: Path) -> dict:
+    """
+    Stores the catalogue as columnar arrays (with compiled power curve tables) for the workers.
+    """
+    rows = list(turbines.values_list('id', 'name', 'rotor_diameter', 'efficiency', 'nominal_power', 'startup_speed',
+                                     'hub_height'))
+    ids, names, rotor_diameter, efficiency, nominal_power, startup_speed, hub_height = zip(*rows) if rows else ([],) * 7
+    positions = {turbine_id: position for position, turbine_id in enumerate(ids)}
+
+    curve_offsets = np.full(len(rows), -1, dtype=np.int64)
+    curve_lengths = np.zeros(len(rows), dtype=np.int64)
+    curve_densities = np.ones(len(rows))
+    tables = []
+    offset = 0
+    for power_curve in PowerCurve.objects.filter(turbine__in=turbines.values('id')):
+        table = power_curve.compile()
+        position = positions[power_curve.turbine_id]
+        curve_offsets[position], curve_lengths[position] = offset, len(table)
+        curve_densities[position] = power_curve.reference_air_density
+        tables.append(table)
+        offset += len(table)
+
+    np.savez(path,
+             rotor_diameter=np.array(rotor_diameter, dtype=np.float64),
+             efficiency=np.array(efficiency, dtype=np.float64),
+             nominal_power=np.array(nominal_power, dtype=np.float64),
+             startup_speed=np.array(startup_speed, dtype=np.float64),
+             hub_height=np.array([np.nan if height is None else height for height in hub_height], dtype=np.float64),
+             curve_offsets=curve_offsets, curve_lengths=curve_lengths, curve_densities=curve_densities,
+             curve_tables=np.concatenate(tables) if tables else np.empty(0))
+    return {'ids': list(ids), 'names': list(names), 'nominal_power': np.array(nominal_power, dtype=np.float64)}
+
+
+class _SweepWriter:
+    """
+    Appends result rows to a CSV file, or to a Parquet file (one row group per batch) when the
+    output ends with .parquet and pyarrow is installed.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.parquet = path.suffix == '.parquet'
+        if self.parquet:
+            import pyarrow
+            import pyarrow.parquet
+            self._pyarrow = pyarrow
+            self._writer = None
+        else:
+            self._file = open(path, 'w', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(OUTPUT_FIELDS)
+
+    def write(self, columns: dict):
+        if self.parquet:
+            table = self._pyarrow.table(columns)
+            if self._writer is None:
+                self._writer = self._pyarrow.parquet.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            self._writer.writerows(zip(*(columns[field] for field in OUTPUT_FIELDS)))
+
+    def close(self):
+        if self.parquet:
+            if self._writer is not None:
+                self._writer.close()
+        else:
+            self._file.close()
+
+
+def run_sweep(sites: list, years: list, output, turbines=None, workers: int = None,
+              turbines_per_task: int = TURBINES_PER_TASK, work_directory=None) -> int:
+    """
+    Evaluates a grid of sites × years × turbines in parallel and streams the results to a file.
+
+    Site-years are fetched in worker processes and written to .npy files. Evaluation tasks
+    memory-map them, so the arrays are shared through the page cache instead of being pickled
+    to every worker. Results are written as soon as a task finishes. Use the 'disk' weather
+    cache backend to share fetched data between the worker processes and later sweeps.
+
+    Parameters:
+    - sites (list): dicts with 'name', 'latitude' and 'longitude'
+    - years (list): Calendar years to evaluate
+    - output (str or Path): Result file, .csv or .parquet
+    - turbines (QuerySet, optional): Turbines to evaluate, default the whole catalogue
+    - workers (int, optional): Worker processes, default the number of CPUs
+    - turbines_per_task (int): Catalogue chunk evaluated by one task
+    - work_directory (str, optional): Where the shared arrays are written, default a temporary directory
+
+    Returns:
+    - int: Number of result rows written
+    """
+    turbines = Turbine.objects.all() if turbines is None else turbines
+    written = 0
+
+    with tempfile.TemporaryDirectory(dir=work_directory, prefix='sweep_') as directory:
+        turbines_path = Path(directory) / 'turbines.npz'
+        catalogue = _write_turbine_arrays(turbines, turbines_path)
+        n_turbines = len(catalogue['ids'])
+        if n_turbines == 0:
+            return 0
+
+        writer = _SweepWriter(Path(output))
+        site_years = {}
+        fetches = set()
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker) as executor:
+                for site_index, site in enumerate(sites):
+                    for year in years:
+                        fetches.add(executor.submit(_fetch_site_year, site_index, site, year, directory))
+
+                pending = set(fetches)
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+
+                        if future in fetches:
+                            site_index, year, site_path, elevation = result
+                            if site_path is None:
+                                logger.warning(f"No weather data for {sites[site_index]['name']} in {year}")
+                                continue
+                            site_years[site_path] = (sites[site_index], year)
+                            # Fan the catalogue out over the workers as soon as the site-year is available
+                            for start in range(0, n_turbines, turbines_per_task):
+                                # Meteostat wind speeds are measured at 10 m, sheared like in evaluate_all()
+                                pending.add(executor.submit(_evaluate, site_path, elevation, MEASUREMENT_HEIGHT,
+                                                            str(turbines_path), start,
+                                                            min(start + turbines_per_task, n_turbines)))
+                            continue
+
+                        site_path, start, mean_power, timesteps = result
+                        site, year = site_years[site_path]
+                        chunk = slice(start, start + len(mean_power))
+                        writer.write({
+                            'site': [site['name']] * len(mean_power),
+                            'latitude': [site['latitude']] * len(mean_power),
+                            'longitude': [site['longitude']] * len(mean_power),
+                            'year': [year] * len(mean_power),
+                            'turbine_id': catalogue['ids'][chunk],
+                            'turbine': catalogue['names'][chunk],
+                            'timesteps': [timesteps] * len(mean_power),
+                            'annual_energy_kwh': (mean_power * 8760 / 1000).tolist(),
+                            'capacity_factor': (mean_power / catalogue['nominal_power'][chunk]).tolist(),
+                        })
+                        written += len(mean_power)
+        finally:
+            writer.close()
+
+    return written
@@ -1,3 +1,1353 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from WebApp import jobs
+from WebApp.benchmarks import BenchmarkCase, MIN_RUN_SECONDS, compare, measure, offline_weather, run_benchmarks
+from WebApp.calculations import annual_consumption_kwh, calculation_fingerprint, run_calculation
+from WebApp.catalogue import CatalogueSnapshot, get_catalogue
+from WebApp.exports import RESULT_COLUMNS, evict_result_series, export_stream, open_result_series, \
+    store_result_series
+from WebApp.ingest import IngestReport, parse_consumption_rows, parse_wind_rows
+from WebApp.instrumentation import MetricsRegistry, span, timed, trace
+from WebApp.matching import battery_state_of_charge, match_generation, resample_consumption
+from WebApp.models import Turbine, PowerCurve, WindData, ConsumptionData, CalculationJob, CalculationResult, \
+    FarmLayout, FarmTurbine
+from WebApp.preprocessing import DEFAULT_PRESSURE, DEFAULT_TEMPERATURE, MEASUREMENT_HEIGHT, prepare_series, \
+    shear_factor
+from WebApp.providers import RecordedProvider, SyntheticProvider, WeatherProviderError, build_weather_provider
+from WebApp.solar import calculate_pv_power_output, expand_to_samples, solar_position
+from WebApp.stations import COVERAGE_COLUMNS, StationIndex, haversine_km, idw_weights, nearest_stations
+from WebApp.sweep import SITE_ROWS, _evaluate, _write_turbine_arrays, run_sweep
+from WebApp.uncertainty import bootstrap_annual_energy
+from WebApp.utils import calculate_air_density, fit_weibull, weibull_probabilities, wind_speed_histogram
+from WebApp.wake import JensenWakeModel, WakeModel, WakeTable, get_wake_model, thrust_coefficient
+from WebApp.weather import DiskCacheBackend, MemoryCacheBackend, WeatherCache, fetch_daily, fetch_range, \
+    fill_direction_gaps, fill_gaps, find_gaps, get_hourly_wind_series, get_weather_cache
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def csv_file(text: str) -> io.BytesIO:
+    return io.BytesIO(text.encode('utf-8'))
+
+
+def daily_wind_csv(days: int = 365, start: datetime.date = datetime.date(2023, 1, 1)) -> bytes:
+    rows = (f"{start + datetime.timedelta(days=day)},{4 + day % 7},{10 + day % 5},1010" for day in range(days))
+    return ("date,wind_speed,temperature,pressure\n" + "\n".join(rows) + "\n").encode()
+
+
+def create_turbine(name: str = 'T1', **fields) -> Turbine:
+    return Turbine.objects.create(**{'name': name, 'company_name': 'Test', 'rotor_diameter': 50.0, 'efficiency': 0.4,
+                                     'nominal_power': 500000.0, 'startup_speed': 3.0, **fields})
+
+
+def echo_handler(payload: dict) -> dict:
+    # Job handler of the queue tests
+    if payload.get('fail'):
+        raise ValueError("Requested failure")
+    return {'echo': payload['value']}
+
+
+class PowerOutputTests(TestCase):
+    def test_vectorized_output_matches_scalar_formula(self):
+        turbine = create_turbine()
+        rng = np.random.default_rng(0)
+        wind_speeds = rng.uniform(0, 30, 500)
+        temperatures = rng.uniform(-20, 35, 500)
+        pressures = rng.uniform(950, 1040, 500)
+
+        vectorized = turbine.calculate_power_output_array(wind_speeds, temperatures, pressures)
+        scalar = [turbine.calculate_daily_power_output(*values) for values in zip(wind_speeds, temperatures, pressures)]
+
+        np.testing.assert_allclose(vectorized, scalar, rtol=1e-9)
+        self.assertEqual(turbine.calculate_annual_wind_power_output(list(wind_speeds[:3])),
+                         turbine.calculate_power_output_array(wind_speeds[:3]).tolist())
+
+    def test_invalid_input_raises_value_error(self):
+        turbine = create_turbine()
+
+        with self.assertRaises(ValueError):
+            turbine.calculate_annual_wind_power_output([])
+        with self.assertRaises(ValueError):
+            turbine.calculate_annual_wind_power_output([5.0, 6.0], temp_celcius=[10.0])
+
+
+class BatchEvaluationTests(TestCase):
+    def test_catalogue_evaluation_matches_single_turbine(self):
+        turbines = [create_turbine('A'), create_turbine('B', rotor_diameter=80.0, nominal_power=2e6),
+                    create_turbine('C', rotor_diameter=30.0, nominal_power=1e5)]
+        wind_speeds = np.random.default_rng(1).weibull(2.0, 1000) * 7
+
+        evaluated = Turbine.objects.all().evaluate_all(wind_speeds, measurement_height=None)
+
+        self.assertEqual(sorted(evaluated['ids'].tolist()), sorted(turbine.pk for turbine in turbines))
+        for position, turbine_id in enumerate(evaluated['ids']):
+            turbine = next(turbine for turbine in turbines if turbine.pk == turbine_id)
+            expected = turbine.calculate_power_output_array(wind_speeds).mean() * 8760
+            self.assertAlmostEqual(evaluated['annual_energy'][position] / expected, 1.0, places=6)
+            self.assertAlmostEqual(evaluated['capacity_factor'][position], expected / 8760 / turbine.nominal_power,
+                                   places=6)
+        self.assertEqual(evaluated['annual_energy'][evaluated['ranking']].tolist(),
+                         sorted(evaluated['annual_energy'].tolist(), reverse=True))
+
+    def test_empty_queryset(self):
+        evaluated = Turbine.objects.none().evaluate_all([5.0, 6.0])
+
+        self.assertEqual(len(evaluated['ids']), 0)
+        self.assertEqual(evaluated['names'], [])
+
+
+class WindObservationStoreTests(TestCase):
+    def test_stored_observations(self):
+        wind_data = WindData.objects.create(source='csv')
+        report = IngestReport()
+
+        stored = wind_data.store_observations(parse_wind_rows(io.BytesIO(daily_wind_csv(40)), report), batch_size=16)
+
+        self.assertEqual(stored, 40)
+        series = wind_data.get_series()
+        self.assertEqual(series['timestamps'][0], np.datetime64('2023-01-01T00:00:00'))
+        self.assertEqual(series['wind_speed'].dtype, np.float32)
+        self.assertEqual(series['wind_speed'][:3].tolist(), [4.0, 5.0, 6.0])
+        self.assertEqual(series['pressure'][0], 1010.0)
+        self.assertTrue(np.isnan(series['humidity']).all())
+
+    def test_range_is_read_from_the_table(self):
+        wind_data = WindData.objects.create(source='csv')
+        wind_data.store_observations(parse_wind_rows(io.BytesIO(daily_wind_csv(40)), IngestReport()))
+
+        series = wind_data.get_series(datetime.datetime(2023, 1, 10, tzinfo=datetime.timezone.utc),
+                                      datetime.datetime(2023, 1, 19, tzinfo=datetime.timezone.utc))
+
+        self.assertEqual(len(series['timestamps']), 10)
+        self.assertEqual(series['timestamps'][0], np.datetime64('2023-01-10T00:00:00'))
+        self.assertEqual(len(WindData.objects.create(source='csv').get_series()['wind_speed']), 0)
+
+
+class IngestTests(TestCase):
+    def test_wind_rows_with_header_and_bad_rows(self):
+        report = IngestReport()
+        rows = list(parse_wind_rows(csv_file(
+            "date,wind_speed,temp\n2023-01-01,5.5,10\n2023-01-02,abc,10\n2023-01-03,150,10\n2023-01-04,4,\n"),
+            report))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0][1:3], (5.5, 10.0))
+        self.assertIsNone(rows[1][2])
+        self.assertEqual(report.rows, 2)
+        self.assertEqual([line for line, _ in report.errors], [3, 4])
+
+    def test_wind_rows_without_header(self):
+        report = IngestReport()
+        rows = list(parse_wind_rows(csv_file("2023-01-01,5\n2023-01-02,6,12,1010\n"), report))
+
+        self.assertEqual([row[1] for row in rows], [5.0, 6.0])
+        self.assertEqual(rows[1][2:4], (12.0, 1010.0))
+        self.assertEqual(report.error_count, 0)
+
+    def test_header_without_wind_speed_column(self):
+        report = IngestReport()
+        rows = list(parse_wind_rows(csv_file("date,speed_ms\n2023-01-01,5\n"), report))
+
+        self.assertEqual(rows, [])
+        self.assertEqual(report.error_count, 1)
+        self.assertIn("header has no wind_speed column", report.errors[0][1])
+
+    def test_header_without_consumption_column(self):
+        report = IngestReport()
+        rows = list(parse_consumption_rows(csv_file("time,usage\n2023-01-01,5\n"), report))
+
+        self.assertEqual(rows, [])
+        self.assertEqual(report.errors[0][0], 1)
+        self.assertIn("header has no consumption column", report.errors[0][1])
+
+    def test_upload_with_missing_column_is_rejected(self):
+        # Used to fail with an unhandled KeyError in store_observations
+        upload = SimpleUploadedFile('wind.csv', b"date,speed_ms\n2023-01-01,5\n", content_type='text/csv')
+        response = self.client.post('/calculate/step2/', {'csv_submit': '1', 'csv_file': upload}, follow=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "header has no wind_speed column")
+        self.assertFalse(WindData.objects.exists())
+
+        upload = SimpleUploadedFile('usage.csv', b"time,usage\n2023-01-01,5\n", content_type='text/csv')
+        response = self.client.post('/api/datasets/?kind=consumption', {'file': upload})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ConsumptionData.objects.exists())
+
+
+class WeatherCacheTests(TestCase):
+    def test_memory_backend_evicts_least_recently_used(self):
+        backend = MemoryCacheBackend(max_entries=2)
+        backend.set('a', {'value': 1}, timeout=60)
+        backend.set('b', {'value': 2}, timeout=60)
+        backend.get('a')
+        backend.set('c', {'value': 3}, timeout=60)
+
+        self.assertEqual(backend.get('a'), {'value': 1})
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.evictions, 1)
+        backend.set('d', {'value': 4}, timeout=-1)
+        self.assertIsNone(backend.get('d'))
+
+    def test_disk_backend_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = DiskCacheBackend(directory, max_entries=2)
+            for key in ('a', 'b', 'c'):
+                backend.set(key, {'wspd': np.arange(3, dtype=np.float32)}, timeout=60)
+
+            np.testing.assert_array_equal(backend.get('c')['wspd'], [0, 1, 2])
+            self.assertEqual(len(list(Path(directory).glob('*.npz'))), 2)
+            self.assertEqual(backend.evictions, 1)
+            self.assertIsNone(backend.get('missing'))
+
+    def test_get_or_fetch_counts_hits_and_misses(self):
+        cache = WeatherCache(MemoryCacheBackend(), timeout=60)
+        fetch = mock.Mock(return_value={'wspd': np.ones(2)})
+
+        first = cache.get_or_fetch('daily', ('station', 2023), fetch)
+        second = cache.get_or_fetch('daily', ('station', 2023), fetch)
+
+        fetch.assert_called_once()
+        self.assertIs(first, second)
+        self.assertEqual(cache.stats()['daily'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_daily_fetch_is_cached(self):
+        with offline_weather(), mock.patch.object(SyntheticProvider, 'daily', autospec=True,
+                                                  side_effect=SyntheticProvider.daily) as daily:
+            first = fetch_daily('SYN284_402', datetime.date(2023, 1, 1), datetime.date(2023, 1, 31))
+            second = fetch_daily('SYN284_402', datetime.date(2023, 1, 1), datetime.date(2023, 1, 31))
+
+            self.assertEqual(daily.call_count, 1)
+            self.assertEqual(len(first['time']), 31)
+            np.testing.assert_array_equal(first['wspd'], second['wspd'])
+            self.assertEqual(get_weather_cache().stats()['daily']['hits'], 1)
+
+
+@mock.patch.dict(jobs.JOB_HANDLERS, {'echo': 'WebApp.tests.echo_handler'})
+class JobQueueTests(TestCase):
+    def test_claim_and_run(self):
+        first = jobs.enqueue_job('echo', {'value': 1})
+        second = jobs.enqueue_job('echo', {'value': 2})
+
+        claimed = jobs.claim_next_job()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertEqual(CalculationJob.objects.get(pk=first.pk).status, CalculationJob.STATUS_RUNNING)
+
+        jobs.run_job(claimed)
+        first.refresh_from_db()
+        self.assertEqual(first.status, CalculationJob.STATUS_DONE)
+        self.assertEqual(first.result, {'echo': 1})
+        self.assertIsNotNone(first.finished_at)
+
+        self.assertEqual(jobs.claim_next_job().pk, second.pk)
+        self.assertIsNone(jobs.claim_next_job())
+
+    def test_failed_job_keeps_the_error(self):
+        jobs.enqueue_job('echo', {'fail': True})
+
+        with self.assertLogs('WebApp.jobs', 'ERROR'):
+            job = jobs.run_job(jobs.claim_next_job())
+
+        self.assertEqual(job.status, CalculationJob.STATUS_FAILED)
+        self.assertIn("Requested failure", job.error)
+
+    def test_unknown_kind_is_rejected(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue_job('unknown', {})
+
+    @override_settings(CALCULATION_JOB_STALE_TIMEOUT=60, CALCULATION_JOB_MAX_ATTEMPTS=2)
+    def test_stale_running_job_is_recovered(self):
+        job = jobs.enqueue_job('echo', {'value': 1}, fingerprint='a' * 64)
+        jobs.claim_next_job()
+        self.assertEqual(jobs.find_active_job('a' * 64).pk, job.pk)
+
+        # The worker died: no heartbeat for longer than the timeout
+        CalculationJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        self.assertIsNone(jobs.find_active_job('a' * 64))
+        with self.assertLogs('WebApp.jobs', 'WARNING'):
+            self.assertEqual(jobs.recover_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CalculationJob.STATUS_QUEUED)
+
+        # The second abandoned attempt fails the job instead of queueing it forever
+        jobs.claim_next_job()
+        CalculationJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        with self.assertLogs('WebApp.jobs', 'WARNING'):
+            jobs.recover_stale_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, CalculationJob.STATUS_FAILED)
+
+
+@override_settings(UNCERTAINTY={'SCENARIOS': 200, 'PROCESSES': 1})
+class CalculationTestCase(TestCase):
+    """
+    Runs the calculation wizard with a custom turbine and a year of daily wind data, the per-timestep
+    results go to a temporary directory.
+    """
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        settings_override = override_settings(RESULT_SERIES={'LOCATION': self.location, 'CHUNK_ROWS': 100})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def calculate(self) -> CalculationJob:
+        self.client.post('/calculate/step1/', {'create_submit': '1', 'name': 'Custom', 'company_name': 'Test',
+                                               'rotor_diameter': '50', 'efficiency': '0.4', 'nominal_power': '500000',
+                                               'startup_speed': '3'})
+        self.client.post('/calculate/step2/', {'csv_submit': '1', 'csv_file': SimpleUploadedFile(
+            'wind.csv', daily_wind_csv())})
+        self.client.post('/calculate/step3/', {'average_submit': '1', 'average_consumption': 'medium'})
+        self.client.get('/calculate/result/')
+        job = jobs.run_job(jobs.claim_next_job())
+        self.assertEqual(job.status, CalculationJob.STATUS_DONE, job.error)
+        return job
+
+
+class CalculationResultTests(CalculationTestCase):
+    def test_result_is_memoized(self):
+        job = self.calculate()
+
+        self.assertTrue(CalculationResult.objects.filter(fingerprint=job.fingerprint).exists())
+        response = self.client.get('/calculate/result/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['fingerprint'], job.fingerprint)
+        self.assertEqual(response.context['result'], job.result)
+        self.assertEqual(CalculationJob.objects.count(), 1)
+
+    def test_stored_result_is_not_recalculated(self):
+        job = self.calculate()
+
+        with mock.patch('WebApp.calculations.calculate_summary') as calculate_summary:
+            summary = run_calculation(job.payload)
+
+        calculate_summary.assert_not_called()
+        self.assertEqual(summary, job.result)
+        self.assertGreater(summary['annual_generation_kwh'], 0)
+
+    def test_fingerprint_depends_on_all_inputs(self):
+        turbine = {'id': None, 'rotor_diameter': 50.0, 'efficiency': 0.4, 'nominal_power': 5e5, 'startUp': 3.0,
+                   'hub_height': None}
+        consumption = {'type': 'average', 'level': 'medium'}
+        fingerprint = calculation_fingerprint(turbine, 'wind', consumption)
+
+        self.assertEqual(fingerprint, calculation_fingerprint({**turbine, 'rotor_diameter': '50'}, 'wind', consumption))
+        self.assertNotEqual(fingerprint, calculation_fingerprint({**turbine, 'hub_height': 80.0}, 'wind', consumption))
+        self.assertNotEqual(fingerprint, calculation_fingerprint(turbine, 'other', consumption))
+        self.assertNotEqual(fingerprint, calculation_fingerprint(turbine, 'wind', {**consumption, 'level': 'high'}))
+        self.assertNotEqual(fingerprint, calculation_fingerprint(turbine, 'wind', consumption,
+                                                                 battery_data={'capacity': 10.0}))
+
+
+class SolarTests(TestCase):
+    SYSTEM = {'latitude': 52.2, 'longitude': 21.0, 'peak_power': 5000.0, 'tilt': 35.0, 'azimuth': 180.0,
+              'temperature_coefficient': -0.004, 'noct': 45.0, 'inverter_power': 5000.0, 'system_losses': 0.14}
+
+    def clear_sky(self, timestamps, step: np.timedelta64) -> np.ndarray:
+        # Sunshine minutes of a cloudless day: the whole step while the sun is up
+        cos_zenith = solar_position(timestamps + step // 2, self.SYSTEM['latitude'], self.SYSTEM['longitude'])[0]
+        return np.where(cos_zenith > 0, step / np.timedelta64(1, 'm'), 0.0)
+
+    def test_samples_of_a_step(self):
+        start = np.array(['2023-06-21T00:00'], dtype='datetime64[s]')
+
+        samples, per_step, sample_hours = expand_to_samples(start, 24.0)
+        self.assertEqual((len(samples), per_step, sample_hours), (24, 24, 1.0))
+        self.assertEqual(samples[1], np.datetime64('2023-06-21T01:30:00'))
+
+        samples, per_step, sample_hours = expand_to_samples(start, 1 / 6)
+        self.assertEqual((len(samples), per_step), (1, 1))
+        self.assertAlmostEqual(sample_hours, 1 / 6)
+        self.assertEqual(samples[0], np.datetime64('2023-06-21T00:05:00'))
+
+    def test_resolutions_give_the_same_yield(self):
+        day = np.datetime64('2023-06-21T00:00', 's')
+        hourly = day + np.arange(24) * np.timedelta64(1, 'h')
+        ten_minutes = day + np.arange(144) * np.timedelta64(10, 'm')
+        hourly_sunshine = self.clear_sky(hourly, np.timedelta64(60, 'm'))
+
+        hourly_power = calculate_pv_power_output(hourly, step_hours=1.0, sunshine=hourly_sunshine, **self.SYSTEM)
+        ten_minute_power = calculate_pv_power_output(ten_minutes, step_hours=1 / 6, sunshine=self.clear_sky(
+            ten_minutes, np.timedelta64(10, 'm')), **self.SYSTEM)
+        daily_power = calculate_pv_power_output(day[None], step_hours=24.0, sunshine=[hourly_sunshine.sum()],
+                                                **self.SYSTEM)
+
+        self.assertAlmostEqual(ten_minute_power.mean() / hourly_power.mean(), 1.0, places=2)
+        self.assertAlmostEqual(daily_power[0] / hourly_power.mean(), 1.0, places=2)
+        # Hour by hour away from sunrise and sunset, where the hourly samples miss part of the daylight
+        np.testing.assert_allclose(ten_minute_power.reshape(24, 6).mean(axis=1)[6:17], hourly_power[6:17], rtol=0.01)
+
+    def test_no_output_at_night(self):
+        night = np.datetime64('2023-12-21T20:00', 's') + np.arange(6) * np.timedelta64(1, 'h')
+
+        power = calculate_pv_power_output(night, step_hours=1.0, sunshine=np.zeros(6), **self.SYSTEM)
+
+        np.testing.assert_array_equal(power, 0.0)
+
+    def test_output_is_limited_by_the_inverter(self):
+        noon = np.array(['2023-06-21T10:00'], dtype='datetime64[s]')
+
+        power = calculate_pv_power_output(noon, step_hours=1.0, irradiance=[1100.0], temperature=[5.0],
+                                          **{**self.SYSTEM, 'inverter_power': 3000.0})
+
+        self.assertEqual(power[0], 3000.0)
+
+
+class HourlyWindSeriesTests(TestCase):
+    def test_fill_gaps(self):
+        values = np.array([np.nan, 1.0, np.nan, 3.0, np.nan], dtype=np.float32)
+
+        fill_gaps(values)
+
+        np.testing.assert_array_equal(values, [1.0, 1.0, 2.0, 3.0, 3.0])
+        self.assertTrue(np.isnan(fill_gaps(np.full(3, np.nan))).all())
+
+    def test_direction_gaps_are_filled_through_north(self):
+        directions = np.array([350.0, np.nan, 10.0])
+
+        fill_direction_gaps(directions)
+
+        self.assertAlmostEqual(min(directions[1], 360 - directions[1]), 0.0, places=6)
+
+    def test_hourly_series_on_a_complete_grid(self):
+        hourly = SyntheticProvider.hourly
+
+        def hourly_with_gap(provider, station_id, start, end):
+            frame = hourly(provider, station_id, start, end)
+            return frame.drop(frame.index[5:10])
+
+        with offline_weather(), mock.patch.object(SyntheticProvider, 'hourly', autospec=True,
+                                                  side_effect=hourly_with_gap):
+            series = get_hourly_wind_series(52.23, 21.01, datetime.date(2023, 1, 1), datetime.date(2023, 1, 31))
+
+        self.assertEqual(len(series['timestamps']), 31 * 24)
+        self.assertTrue(np.all(np.diff(series['timestamps']) == np.timedelta64(1, 'h')))
+        self.assertEqual(series['filled'], 5)
+        for name in ('wind_speed', 'temperature', 'pressure', 'humidity', 'wind_direction'):
+            self.assertEqual(series[name].dtype, np.float32)
+            self.assertFalse(np.isnan(series[name]).any(), name)
+        # Meteostat km/h converted to m/s
+        self.assertLess(series['wind_speed'].max(), 40.0)
+        self.assertAlmostEqual(sum(weight for _, _, weight in series['stations']), 1.0)
+
+
+class WindDistributionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.wind_speeds = np.random.default_rng(6).weibull(2.0, 20000) * 7.0
+        start = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+        cls.wind_data = WindData.objects.create(source='csv')
+        cls.wind_data.store_observations((start + datetime.timedelta(hours=hour), float(wind_speed))
+                                         for hour, wind_speed in enumerate(cls.wind_speeds))
+
+    def test_weibull_fit(self):
+        k, c = fit_weibull(self.wind_speeds)
+
+        self.assertAlmostEqual(k, 2.0, delta=0.05)
+        self.assertAlmostEqual(c, 7.0, delta=0.1)
+        self.assertAlmostEqual(weibull_probabilities(k, c).sum(), 1.0)
+        self.assertAlmostEqual(wind_speed_histogram(self.wind_speeds).sum(), 1.0)
+
+    def test_distribution_is_stored_on_the_dataset(self):
+        distribution = self.wind_data.get_distribution()
+
+        self.assertEqual(distribution['samples'], 20000)
+        self.assertEqual(WindData.objects.get(pk=self.wind_data.pk).wind_distribution['weibull_k'],
+                         distribution['weibull_k'])
+
+    def test_estimates_match_the_full_series(self):
+        turbine = create_turbine()
+        exact = turbine.calculate_power_output_array(self.wind_data.get_series()['wind_speed'],
+                                                     air_density=self.wind_data.get_distribution()['mean_air_density'])
+
+        for method in ('histogram', 'weibull'):
+            estimate = turbine.estimate_annual_energy(self.wind_data, method)
+            self.assertAlmostEqual(estimate / (exact.mean() * 8760), 1.0, delta=0.03, msg=method)
+
+    def test_ranking_matches_evaluate_all(self):
+        for index, (diameter, power) in enumerate(((30.0, 1e5), (50.0, 5e5), (80.0, 2e6))):
+            create_turbine(f'T{index}', rotor_diameter=diameter, nominal_power=power)
+        series = self.wind_data.get_series()
+
+        screened = Turbine.objects.all().rank_by_distribution(self.wind_data)
+        evaluated = Turbine.objects.all().evaluate_all(series['wind_speed'], measurement_height=None)
+
+        self.assertEqual(screened['ids'][screened['ranking']].tolist(), evaluated['ids'][evaluated['ranking']].tolist())
+        np.testing.assert_allclose(screened['annual_energy'], evaluated['annual_energy'], rtol=0.03)
+
+
+class PowerCurveTests(TestCase):
+    def setUp(self):
+        self.turbine = create_turbine()
+        self.power_curve = PowerCurve.objects.create(turbine=self.turbine, wind_speeds=[3, 6, 9, 12],
+                                                     power_outputs=[0, 100000, 350000, 500000],
+                                                     cut_in_speed=3.5, cut_out_speed=25)
+
+    def test_table_lookup_matches_the_curve(self):
+        wind_speeds = np.array([0.0, 3.4, 4.5, 7.25, 12.0, 20.0, 25.0, 25.5, np.nan])
+
+        power = self.power_curve.evaluate(wind_speeds)
+
+        expected = np.interp(wind_speeds, [3, 6, 9, 12], [0, 100000, 350000, 500000])
+        expected[[0, 1, 7, 8]] = 0.0
+        np.testing.assert_allclose(power, expected)
+        np.testing.assert_allclose(self.power_curve.evaluate([6.0], air_density=1.225 * 1.5 ** 3), [350000.0])
+
+    def test_turbine_uses_its_power_curve(self):
+        turbine = Turbine.objects.get(pk=self.turbine.pk)
+
+        np.testing.assert_allclose(turbine.calculate_power_output_array([4.5, 7.5]), [50000.0, 225000.0], rtol=1e-3)
+
+    def test_changed_curve_is_recompiled(self):
+        self.power_curve.compile()
+        self.power_curve.power_outputs = [0, 200000, 350000, 500000]
+        self.power_curve.save()
+
+        self.assertEqual(PowerCurve.objects.get(pk=self.power_curve.pk).evaluate([6.0])[0], 200000.0)
+
+    def test_invalid_curve_is_rejected_per_field(self):
+        invalid = {'wind_speeds': [3, 3, 9], 'power_outputs': [0, -1, 5], 'cut_in_speed': 30}
+        for name, value in invalid.items():
+            power_curve = PowerCurve(turbine=create_turbine(f'Invalid {name}'), wind_speeds=[3, 6, 9],
+                                     power_outputs=[0, 1, 2], cut_in_speed=3, cut_out_speed=25)
+            setattr(power_curve, name, value)
+
+            with self.assertRaises(ValidationError) as context:
+                power_curve.full_clean()
+            self.assertEqual(list(context.exception.message_dict), [name])
+
+        with self.assertRaises(ValidationError) as context:
+            PowerCurve(turbine=self.turbine, wind_speeds="3, 6", power_outputs=[0, 1], cut_in_speed=3,
+                       cut_out_speed=25).clean()
+        self.assertIn('wind_speeds', context.exception.message_dict)
+
+    def test_admin_inline_shows_the_error(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        data = {'name': self.turbine.name, 'company_name': 'Test', 'rotor_diameter': '50', 'efficiency': '0.4',
+                'nominal_power': '500000', 'startup_speed': '3', 'hub_height': '',
+                'power_curve-TOTAL_FORMS': '1', 'power_curve-INITIAL_FORMS': '1', 'power_curve-MIN_NUM_FORMS': '0',
+                'power_curve-MAX_NUM_FORMS': '1', 'power_curve-0-id': str(self.power_curve.pk),
+                'power_curve-0-turbine': str(self.turbine.pk), 'power_curve-0-wind_speeds': '[3, 9, 6]',
+                'power_curve-0-power_outputs': '[0, 1, 2]', 'power_curve-0-cut_in_speed': '3',
+                'power_curve-0-cut_out_speed': '25', 'power_curve-0-reference_air_density': '1.225'}
+
+        response = self.client.post(f'/admin/WebApp/turbine/{self.turbine.pk}/change/', data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Power curve wind speeds must be strictly ascending.')
+        self.assertEqual(PowerCurve.objects.get(pk=self.power_curve.pk).wind_speeds, [3, 6, 9, 12])
+
+
+class SweepTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        create_turbine('Formula')
+        create_turbine('High', hub_height=100.0, rotor_diameter=80.0, nominal_power=2e6)
+        PowerCurve.objects.create(turbine=create_turbine('Curve', hub_height=80.0), wind_speeds=[3, 6, 9, 12],
+                                  power_outputs=[0, 100000, 350000, 500000], cut_in_speed=3.5, cut_out_speed=25)
+        self.turbines = Turbine.objects.order_by('pk')
+        self.turbines_path = str(Path(self.directory) / 'turbines.npz')
+        _write_turbine_arrays(self.turbines, self.turbines_path)
+
+    def write_site(self, series: dict) -> str:
+        path = str(Path(self.directory) / 'site.npy')
+        np.save(path, np.stack([series[name] for name in SITE_ROWS]).astype(np.float32))
+        return path
+
+    def site_series(self) -> dict:
+        rng = np.random.default_rng(7)
+        return {'wind_speed': (rng.weibull(2.0, 2000) * 7).astype(np.float32),
+                'temperature': rng.uniform(-5, 25, 2000).astype(np.float32),
+                'pressure': rng.uniform(990, 1030, 2000).astype(np.float32),
+                'humidity': rng.uniform(40, 100, 2000).astype(np.float32)}
+
+    def test_evaluation_matches_evaluate_all(self):
+        series = self.site_series()
+
+        _, start, mean_power, timesteps = _evaluate(self.write_site(series), 120.0, MEASUREMENT_HEIGHT,
+                                                    self.turbines_path, 0, 3)
+
+        evaluated = self.turbines.evaluate_all(series['wind_speed'], series['temperature'], series['pressure'],
+                                               series['humidity'], elevation=120.0)
+        self.assertEqual((start, timesteps), (0, 2000))
+        np.testing.assert_allclose(mean_power * 8760, evaluated['annual_energy'], rtol=1e-6)
+
+    def test_missing_wind_speeds_in_the_curve_lookup(self):
+        # Used to turn NaN into an arbitrary table index
+        series = self.site_series()
+        series['wind_speed'][::10] = np.nan
+
+        mean_power = _evaluate(self.write_site(series), None, MEASUREMENT_HEIGHT, self.turbines_path, 2, 3)[2]
+
+        power_curve = PowerCurve.objects.get()
+        prepared = prepare_series(series, 80.0)
+        self.assertTrue(np.isfinite(mean_power[0]))
+        self.assertAlmostEqual(mean_power[0], power_curve.evaluate(prepared['wind_speed'],
+                                                                   prepared['air_density']).mean())
+
+    def test_sweep_writes_one_row_per_site_year_and_turbine(self):
+        output = Path(self.directory) / 'sweep.csv'
+        sites = [{'name': 'Warsaw', 'latitude': 52.23, 'longitude': 21.01},
+                 {'name': 'Hamburg', 'latitude': 53.55, 'longitude': 9.99}]
+
+        with offline_weather():
+            written = run_sweep(sites, [2022], output, turbines=self.turbines, workers=2, turbines_per_task=2,
+                                work_directory=self.directory)
+
+        with open(output, newline='') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(written, 6)
+        self.assertEqual(len(rows), 6)
+        self.assertEqual({(row['site'], row['turbine']) for row in rows},
+                         {(site['name'], turbine.name) for site in sites for turbine in self.turbines})
+        self.assertTrue(all(int(row['timesteps']) == 8760 and float(row['annual_energy_kwh']) > 0 for row in rows))
+
+
+class ChunkedFetchTests(TestCase):
+    def test_find_gaps(self):
+        step = np.timedelta64(1, 'D')
+        times = np.array(['2023-01-02', '2023-01-03', '2023-01-06', '2023-01-07'], dtype='datetime64[D]')
+
+        gaps = find_gaps(times, step, np.datetime64('2023-01-01'), np.datetime64('2023-01-09'))
+
+        self.assertEqual(gaps, [(np.datetime64('2023-01-01'), np.datetime64('2023-01-01')),
+                                (np.datetime64('2023-01-04'), np.datetime64('2023-01-05')),
+                                (np.datetime64('2023-01-08'), np.datetime64('2023-01-09'))])
+        self.assertEqual(find_gaps(times, step), [(np.datetime64('2023-01-04'), np.datetime64('2023-01-05'))])
+
+    def test_long_range_is_fetched_in_yearly_chunks(self):
+        with offline_weather(), mock.patch.object(SyntheticProvider, 'daily', autospec=True,
+                                                  side_effect=SyntheticProvider.daily) as daily:
+            data = fetch_range('SYN284_402', 'daily', datetime.date(2021, 7, 1), datetime.date(2023, 3, 31))
+
+            self.assertEqual(sorted(call.args[2].year for call in daily.call_args_list), [2021, 2022, 2023])
+            self.assertEqual(data['time'][0], np.datetime64('2021-07-01T00:00:00'))
+            self.assertEqual(data['time'][-1], np.datetime64('2023-03-31T00:00:00'))
+            self.assertEqual(len(data['time']), 639)
+            self.assertEqual(data['gaps'], [])
+
+            # Overlapping ranges only fetch the years that are not cached yet
+            fetch_range('SYN284_402', 'daily', datetime.date(2022, 6, 1), datetime.date(2024, 1, 31))
+            self.assertEqual(daily.call_count, 4)
+
+    def test_missing_days_are_reported(self):
+        daily = SyntheticProvider.daily
+
+        def daily_with_gap(provider, station_id, start, end):
+            frame = daily(provider, station_id, start, end)
+            return frame[(frame.index < '2022-02-10') | (frame.index > '2022-02-12')]
+
+        with offline_weather(), mock.patch.object(SyntheticProvider, 'daily', autospec=True,
+                                                  side_effect=daily_with_gap):
+            data = fetch_range('SYN284_402', 'daily', datetime.date(2022, 1, 1), datetime.date(2022, 12, 31))
+
+        self.assertEqual(len(data['time']), 362)
+        self.assertEqual(data['gaps'], [(np.datetime64('2022-02-10T00:00:00'), np.datetime64('2022-02-12T00:00:00'))])
+
+
+class StationIndexTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(14)
+        self.latitude = rng.uniform(-89, 89, 3000)
+        self.longitude = rng.uniform(-180, 180, 3000)
+        self.ids = np.array([f'S{i:05d}' for i in range(3000)])
+        coverage = {name: np.full(3000, np.datetime64('NaT'), dtype='datetime64[D]') for name in COVERAGE_COLUMNS}
+        self.index = StationIndex(self.ids, self.latitude, self.longitude, np.zeros(3000), coverage, cell_degrees=2.0)
+
+    def test_nearest_matches_brute_force(self):
+        for latitude, longitude in [(52.5, 13.4), (-33.9, 151.2), (0.0, 179.9), (88.5, -40.0), (-75.0, 0.0)]:
+            positions, distances = self.index.nearest(latitude, longitude, k=5)
+
+            expected = np.sort(haversine_km(latitude, longitude, self.latitude, self.longitude))[:5]
+            np.testing.assert_allclose(distances, expected)
+            np.testing.assert_allclose(haversine_km(latitude, longitude, self.index.latitude[positions],
+                                                    self.index.longitude[positions]), distances)
+
+    def test_max_distance(self):
+        positions, distances = self.index.nearest(52.5, 13.4, k=50, max_distance_km=300)
+
+        expected = haversine_km(52.5, 13.4, self.latitude, self.longitude)
+        self.assertEqual(len(positions), int((expected <= 300).sum()))
+        self.assertTrue((distances <= 300).all())
+
+    def test_coverage_filter(self):
+        coverage = {name: np.full(3, np.datetime64('NaT'), dtype='datetime64[D]') for name in COVERAGE_COLUMNS}
+        coverage['hourly_end'] = np.array(['2010-12-31', 'NaT', '2024-12-31'], dtype='datetime64[D]')
+        index = StationIndex(['A', 'B', 'C'], [50.0, 50.1, 50.2], [8.0, 8.0, 8.0], [0, 0, 0], coverage)
+
+        positions, _ = index.nearest(50.0, 8.0, k=3, interval='hourly',
+                                     start_date=datetime.date(2023, 1, 1), end_date=datetime.date(2023, 12, 31))
+
+        self.assertEqual(list(index.ids[positions]), ['B', 'C'])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'stations.npz'
+            self.index.save(path)
+            loaded = StationIndex.load(path)
+
+        np.testing.assert_array_equal(loaded.ids, self.index.ids)
+        np.testing.assert_array_equal(loaded.nearest(10.0, 20.0, k=3)[0], self.index.nearest(10.0, 20.0, k=3)[0])
+
+    @override_settings(STATION_INDEX={'MAX_DISTANCE_KM': 1.0})
+    def test_remote_site_falls_back_to_nearest_station(self):
+        with offline_weather(), self.assertLogs('WebApp.stations', level='WARNING'):
+            stations = nearest_stations(40.0, -30.0)
+
+        self.assertEqual(len(stations), 1)
+        self.assertGreater(stations[0][1], 1.0)
+
+    def test_idw_weights(self):
+        weights = idw_weights([0.0, 1.0, 2.0])
+
+        np.testing.assert_allclose(weights, [100.0, 1.0, 0.25])
+
+
+class PreprocessingTests(TestCase):
+    def test_shear_factor(self):
+        self.assertAlmostEqual(shear_factor(10, 80), 8 ** (1 / 7))
+        self.assertAlmostEqual(shear_factor(10, 80, method='log', roughness_length=0.03),
+                               np.log(80 / 0.03) / np.log(10 / 0.03))
+        self.assertEqual(shear_factor(10, None), 1.0)
+        self.assertEqual(shear_factor(10, 10), 1.0)
+        with self.assertRaises(ValueError):
+            shear_factor(10, 80, method='cubic')
+
+    def test_air_density_matches_scalar_formula(self):
+        series = {'wind_speed': np.array([5.0, 6.0, 7.0]), 'temperature': np.array([-5.0, 15.0, 30.0]),
+                  'pressure': np.array([1030.0, 1013.25, 990.0]), 'humidity': np.array([90.0, 50.0, 20.0])}
+
+        prepared = prepare_series(series)
+
+        expected = [calculate_air_density(t, p, h) for t, p, h in
+                    zip(series['temperature'], series['pressure'], series['humidity'])]
+        np.testing.assert_allclose(prepared['air_density'], expected, rtol=1e-5)
+        np.testing.assert_allclose(prepared['wind_speed'], series['wind_speed'])
+
+    def test_missing_values_use_standard_atmosphere(self):
+        series = {'wind_speed': np.array([5.0, 6.0]), 'temperature': np.array([np.nan, 15.0]),
+                  'pressure': None, 'humidity': np.array([np.nan, 0.0])}
+
+        prepared = prepare_series(series)
+
+        expected = calculate_air_density(DEFAULT_TEMPERATURE, DEFAULT_PRESSURE)
+        np.testing.assert_allclose(prepared['air_density'], [expected, expected], rtol=1e-5)
+        # The input series is not modified
+        self.assertTrue(np.isnan(series['temperature'][0]))
+
+    def test_hub_height_and_elevation(self):
+        series = {'wind_speed': np.full(4, 6.0), 'temperature': np.full(4, 10.0), 'pressure': np.full(4, 1013.25)}
+
+        prepared = prepare_series(series, hub_height=80, elevation=500)
+
+        np.testing.assert_allclose(prepared['wind_speed'], 6.0 * shear_factor(MEASUREMENT_HEIGHT, 80), rtol=1e-6)
+        self.assertLess(prepared['air_density'][0], calculate_air_density(10.0, 1013.25) * 0.95)
+
+    def test_cached_series_are_shared_and_read_only(self):
+        series = {'wind_speed': np.arange(10, dtype=np.float64)}
+
+        first = prepare_series(series, hub_height=60, cache_key='test_cached_series')
+        second = prepare_series(series, hub_height=60, cache_key='test_cached_series')
+        other = prepare_series(series, hub_height=100, cache_key='test_cached_series')
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertEqual(first['wind_speed'].dtype, np.float32)
+        with self.assertRaises(ValueError):
+            first['wind_speed'][0] = 1.0
+
+
+class BatteryTests(TestCase):
+    def naive_state_of_charge(self, delta, capacity, initial=0.0):
+        soc = []
+        level = initial
+        for value in delta:
+            level = min(max(level + value, 0.0), capacity)
+            soc.append(level)
+        return np.array(soc)
+
+    def test_state_of_charge_matches_loop(self):
+        rng = np.random.default_rng(2)
+        # Longer than one scan chunk, so the level is carried from chunk to chunk
+        delta = rng.normal(0.0, 2.0, 10000)
+        for capacity, initial in ((5.0, 0.0), (13.5, 7.0), (100.0, 100.0)):
+            np.testing.assert_allclose(battery_state_of_charge(delta, capacity, initial),
+                                       self.naive_state_of_charge(delta, capacity, initial), atol=1e-9)
+
+    def test_energy_balance(self):
+        rng = np.random.default_rng(3)
+        generation = rng.uniform(0, 3, 2000)
+        consumption = rng.uniform(0, 2, 2000)
+
+        matched = match_generation(generation, consumption, 1.0, {'capacity': 10.0, 'power': 3.0, 'efficiency': 0.9})
+
+        self.assertAlmostEqual(matched['self_consumption'] + matched['grid_import'], matched['consumption'])
+        self.assertLessEqual(matched['battery_discharge'], matched['battery_charge'])
+        without = match_generation(generation, consumption, 1.0)
+        self.assertGreater(matched['self_consumption'], without['self_consumption'])
+
+    def test_sub_hourly_consumption_is_summed_per_hour(self):
+        hours = np.arange(np.datetime64('2022-03-07T00'), np.datetime64('2022-03-14T00'))
+        hourly_kwh = np.random.default_rng(4).uniform(0.2, 2.0, len(hours))
+        quarter_hours = (hours[:, None] + np.arange(0, 60, 15, dtype='timedelta64[m]')).ravel()
+        quarter_hour_kwh = np.repeat(hourly_kwh / 4, 4)
+        year = np.arange(np.datetime64('2023-01-01T00'), np.datetime64('2024-01-01T00'))
+
+        from_hourly = resample_consumption(hours, hourly_kwh, year, 1.0)
+        from_quarter_hours = resample_consumption(quarter_hours, quarter_hour_kwh, year, 1.0)
+
+        np.testing.assert_allclose(from_quarter_hours, from_hourly)
+        self.assertAlmostEqual(from_quarter_hours.sum(), hourly_kwh.mean() * 8760)
+
+        # The calculation scales the uploaded data to one year the same way
+        for timestamps, energy in ((hours, hourly_kwh), (quarter_hours, quarter_hour_kwh)):
+            dataset = ConsumptionData.objects.create()
+            dataset.store_observations((timestamp.replace(tzinfo=datetime.timezone.utc), kwh)
+                                       for timestamp, kwh in zip(timestamps.astype(datetime.datetime), energy))
+            self.assertAlmostEqual(annual_consumption_kwh({'type': 'csv', 'dataset_id': dataset.id}),
+                                   from_hourly.sum(), places=6)
+
+
+class SessionPayloadTests(CalculationTestCase):
+    def test_custom_turbine_stays_out_of_catalogue(self):
+        job = self.calculate()
+
+        self.assertFalse(Turbine.objects.exists())
+        self.assertIsNone(job.payload['turbine']['id'])
+        self.assertEqual(self.client.session['custom_turbine']['rotor_diameter'], 50.0)
+
+    def test_consumption_csv_is_stored_as_dataset(self):
+        consumption_csv = "date,consumption\n" + "".join(
+            f"{datetime.datetime(2023, 1, 1) + timedelta(hours=hour):%Y-%m-%d %H:%M},0.5\n" for hour in range(2000))
+        self.client.post('/calculate/step1/', {'create_submit': '1', 'name': 'Custom', 'company_name': 'Test',
+                                               'rotor_diameter': '50', 'efficiency': '0.4', 'nominal_power': '500000',
+                                               'startup_speed': '3'})
+        self.client.post('/calculate/step2/', {'csv_submit': '1', 'csv_file': SimpleUploadedFile(
+            'wind.csv', daily_wind_csv())})
+
+        response = self.client.post('/calculate/step3/', {'csv_submit': '1', 'csv_file': SimpleUploadedFile(
+            'consumption.csv', consumption_csv.encode())})
+
+        self.assertEqual(response.status_code, 302)
+        dataset = ConsumptionData.objects.get()
+        self.assertEqual(self.client.session['consumption_data_id'], str(dataset.id))
+        self.assertEqual(dataset.observations.count(), 2000)
+        # Only the id is kept, the session stays small whatever the upload size
+        self.assertLess(len(self.client.session.encode(dict(self.client.session.items()))), 1000)
+
+        self.client.get('/calculate/result/')
+        job = jobs.run_job(jobs.claim_next_job())
+        self.assertEqual(job.payload['consumption'], {'type': 'csv', 'dataset_id': str(dataset.id)})
+        self.assertAlmostEqual(job.result['annual_consumption_kwh'], 0.5 * 8760)
+
+
+class ApiTests(TestCase):
+    def upload_wind_dataset(self, days: int = 365) -> str:
+        upload = SimpleUploadedFile('wind.csv', daily_wind_csv(days), content_type='text/csv')
+        response = self.client.post('/api/datasets/?kind=wind&latitude=52.2&longitude=21.0', {'file': upload})
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def test_turbine_list(self):
+        for index in range(3):
+            create_turbine(f'T{index}')
+
+        response = self.client.get('/api/turbines/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([turbine['name'] for turbine in response.json()['results']], ['T0', 'T1', 'T2'])
+
+    def test_dataset_upload_reports_bad_rows(self):
+        upload = SimpleUploadedFile('wind.csv', b"date,wind_speed\n2023-01-01,5\n2023-01-02,x\n",
+                                    content_type='text/csv')
+
+        response = self.client.post('/api/datasets/?kind=wind', {'file': upload})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['rows'], 1)
+        self.assertEqual(response.json()['invalid_rows'], 1)
+
+    def test_batch_calculation(self):
+        turbines = [create_turbine('A'), create_turbine('B', rotor_diameter=70.0, nominal_power=1.5e6)]
+        dataset_id = self.upload_wind_dataset()
+
+        response = self.client.post('/api/calculate/', {'turbines': [turbine.pk for turbine in turbines],
+                                                        'datasets': [dataset_id]}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['turbine'], [turbine.pk for turbine in turbines])
+        wind_data = WindData.objects.get(pk=dataset_id)
+        series = wind_data.get_series()
+        evaluated = Turbine.objects.filter(pk=turbines[0].pk).evaluate_all(
+            series['wind_speed'], series['temperature'], series['pressure'], series['humidity'],
+            measurement_height=wind_data.measurement_height, elevation=wind_data.elevation)
+        self.assertAlmostEqual(data['annual_energy_kwh'][0], evaluated['annual_energy'][0] / 1000)
+
+    def test_batch_calculation_with_unknown_dataset(self):
+        turbine = create_turbine()
+
+        response = self.client.post('/api/calculate/', {'pairs': [
+            {'turbine': turbine.pk, 'dataset': '00000000-0000-0000-0000-000000000000'}]},
+            content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class WeatherProviderTests(TestCase):
+    def test_synthetic_weather_is_deterministic(self):
+        provider = SyntheticProvider(seed=0)
+
+        year = provider.hourly('SYN284_402', datetime.datetime(2023, 1, 1), datetime.datetime(2023, 12, 31, 23))
+        chunk = provider.hourly('SYN284_402', datetime.datetime(2023, 6, 1), datetime.datetime(2023, 6, 30, 23))
+
+        self.assertEqual(len(year), 8760)
+        # Any chunk of the same site gives the same values
+        np.testing.assert_allclose(year.loc[chunk.index, 'wspd'], chunk['wspd'])
+        self.assertFalse(np.allclose(SyntheticProvider(seed=1).hourly(
+            'SYN284_402', datetime.datetime(2023, 6, 1), datetime.datetime(2023, 6, 30, 23))['wspd'], chunk['wspd']))
+        self.assertTrue((year['wspd'] >= 0).all())
+        self.assertGreater(year['wspd'].mean(), 5)
+
+    def test_synthetic_daily_aggregates_hourly(self):
+        provider = SyntheticProvider()
+
+        daily = provider.daily('SYN284_402', datetime.date(2023, 3, 1), datetime.date(2023, 3, 31))
+        hourly = provider.hourly('SYN284_402', datetime.datetime(2023, 3, 1), datetime.datetime(2023, 3, 31, 23))
+
+        self.assertEqual(len(daily), 31)
+        np.testing.assert_allclose(daily['wspd'].to_numpy(), hourly['wspd'].to_numpy().reshape(31, 24).mean(axis=1))
+
+    def test_record_and_replay(self):
+        upstream = SyntheticProvider()
+        with tempfile.TemporaryDirectory() as directory:
+            start, end = datetime.date(2023, 1, 1), datetime.date(2023, 1, 31)
+            with self.assertRaises(WeatherProviderError):
+                RecordedProvider(directory, 'replay', upstream).daily('SYN284_402', start, end)
+
+            recorded = RecordedProvider(directory, 'record', upstream).daily('SYN284_402', start, end)
+            with mock.patch.object(SyntheticProvider, 'daily', autospec=True) as daily:
+                replayed = RecordedProvider(directory, 'replay', upstream).daily('SYN284_402', start, end)
+                auto = RecordedProvider(directory, 'auto', upstream).daily('SYN284_402', start, end)
+
+            daily.assert_not_called()
+            pd.testing.assert_frame_equal(replayed, recorded, check_freq=False)
+            pd.testing.assert_frame_equal(auto, recorded, check_freq=False)
+
+    def test_build_weather_provider(self):
+        self.assertIsInstance(build_weather_provider({'BACKEND': 'synthetic', 'SEED': 3}), SyntheticProvider)
+        with self.assertRaises(ValueError):
+            build_weather_provider({'BACKEND': 'unknown'})
+        with self.assertRaises(ValueError):
+            RecordedProvider('recordings', 'rewind')
+
+    def test_cache_keys_are_kept_per_provider(self):
+        with offline_weather(), tempfile.TemporaryDirectory() as directory:
+            fetch_daily('SYN284_402', datetime.date(2022, 1, 1), datetime.date(2022, 1, 31))
+
+            # The synthetic response cached above is not replayed for another provider
+            with override_settings(WEATHER_PROVIDER={'BACKEND': 'recorded', 'LOCATION': directory, 'MODE': 'replay'}), \
+                    self.assertRaises(WeatherProviderError):
+                fetch_daily('SYN284_402', datetime.date(2022, 1, 1), datetime.date(2022, 1, 31))
+
+
+class UncertaintyTests(CalculationTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(4)
+        self.timestamps = np.datetime64('2021-01-01T00:00') + np.arange(2 * 365 * 24) * np.timedelta64(1, 'h')
+        self.power = rng.weibull(2.0, len(self.timestamps)) * 2e5
+
+    def test_exceedance_levels_are_ordered(self):
+        result = bootstrap_annual_energy(self.power, self.timestamps, 5e5, scenarios=2000, processes=1)
+
+        self.assertGreaterEqual(result['p50'], result['p75'])
+        self.assertGreaterEqual(result['p75'], result['p90'])
+        self.assertGreater(result['p90'], 0)
+        self.assertEqual(result['days'], 730)
+
+    def test_result_is_reproducible(self):
+        first = bootstrap_annual_energy(self.power, self.timestamps, 5e5, scenarios=500, seed=7, processes=1)
+        second = bootstrap_annual_energy(self.power, self.timestamps, 5e5, scenarios=500, seed=7, processes=1)
+
+        self.assertEqual(first, second)
+
+    def test_month_blocks(self):
+        result = bootstrap_annual_energy(self.power, self.timestamps, 5e5, scenarios=500, block='month', processes=1)
+
+        self.assertGreaterEqual(result['p50'], result['p90'])
+
+    def test_partial_year_is_rejected(self):
+        # A winter dataset must not be reported as annual values
+        with self.assertRaises(ValueError):
+            bootstrap_annual_energy(self.power[:90 * 24], self.timestamps[:90 * 24], 5e5, scenarios=100)
+
+    def test_calculation_reports_exceedance(self):
+        job = self.calculate()
+
+        exceedance = job.result['exceedance']
+        self.assertGreaterEqual(exceedance['p50'], exceedance['p90'])
+        self.assertNotIn('exceedance_note', job.result)
+
+
+class WakeTests(TestCase):
+    def test_jensen_deficit_of_aligned_pair(self):
+        diameter, distance, decay = 80.0, 400.0, 0.075
+        thrust = float(thrust_coefficient(0.4))
+        # Turbine 1 is 400 m north of turbine 0, a northerly wind puts turbine 0 in its wake
+        table = WakeTable([0.0, 0.0], [0.0, distance], [diameter, diameter], [thrust, thrust],
+                          JensenWakeModel(decay), bins=36)
+
+        expected = (1 - np.sqrt(1 - thrust)) * (diameter / (diameter + 2 * decay * distance)) ** 2
+        north = table.bin_index([0.0])[0]
+        self.assertAlmostEqual(table.deficits[north, 0], expected)
+        self.assertEqual(table.deficits[north, 1], 0.0)
+        # Southerly wind: the roles are swapped
+        south = table.bin_index([180.0])[0]
+        self.assertAlmostEqual(table.deficits[south, 1], expected)
+        self.assertEqual(table.deficits[south, 0], 0.0)
+        # Crosswind: no wake effect
+        self.assertTrue(np.all(table.deficits[table.bin_index([90.0])[0]] == 0.0))
+
+    def test_farm_wake_loss(self):
+        turbine = create_turbine(rotor_diameter=80.0, nominal_power=2e6)
+        layout = FarmLayout.objects.create(name='Pair')
+        upstream = FarmTurbine.objects.create(layout=layout, turbine=turbine, x=0.0, y=400.0)
+        downstream = FarmTurbine.objects.create(layout=layout, turbine=turbine, x=0.0, y=0.0)
+        series = {'wind_speed': np.full(100, 8.0), 'wind_direction': np.zeros(100)}
+
+        result = layout.evaluate(series)
+
+        energy = dict(zip(result['ids'].tolist(), result['annual_energy']))
+        gross = dict(zip(result['ids'].tolist(), result['gross_annual_energy']))
+        self.assertAlmostEqual(energy[upstream.pk] / gross[upstream.pk], 1.0)
+        self.assertLess(energy[downstream.pk], gross[downstream.pk])
+        self.assertGreater(result['wake_loss'], 0.0)
+
+    def test_wake_model_requires_pair_deficits(self):
+        class Incomplete(WakeModel):
+            name = 'incomplete'
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+        self.assertIsInstance(get_wake_model('jensen', decay=0.05), JensenWakeModel)
+        with self.assertRaises(ValueError):
+            get_wake_model('gaussian')
+
+
+class CatalogueTests(TestCase):
+    def setUp(self):
+        self.snapshot = CatalogueSnapshot([
+            (1, 'V90', 'Vestas', 90.0, 0.45, 2e6, 3.5, 80.0),
+            (2, 'E-82', 'Enercon', 82.0, 0.45, 2.3e6, 2.5, None),
+            (3, 'V112', 'Vestas', 112.0, 0.45, 3.3e6, 3.0, 94.0),
+            (4, 'SWT-2.3', 'Siemens', 93.0, 0.44, 2.3e6, 4.0, 80.0),
+        ])
+
+    def names(self, positions) -> list:
+        return [row['name'] for row in self.snapshot.rows(positions)]
+
+    def test_search(self):
+        self.assertEqual(self.names(self.snapshot.search('v1')), ['V112'])
+        # Prefixes of "company name" match as well
+        self.assertEqual(self.names(self.snapshot.search('vestas v')), ['V112', 'V90'])
+        self.assertEqual(self.names(self.snapshot.search(manufacturers=['Enercon', 'Siemens'])), ['E-82', 'SWT-2.3'])
+        self.assertEqual(self.names(self.snapshot.search(min_power=2.2e6, max_diameter=95)), ['E-82', 'SWT-2.3'])
+        self.assertEqual(len(self.snapshot.search('nordex')), 0)
+
+    def test_facets_and_rows(self):
+        facets = self.snapshot.facets(self.snapshot.search(min_power=2.2e6))
+
+        self.assertEqual(facets['manufacturers'], [{'name': 'Enercon', 'count': 1}, {'name': 'Siemens', 'count': 1},
+                                                   {'name': 'Vestas', 'count': 1}])
+        self.assertEqual(facets['power'], {'min': 2.3e6, 'max': 3.3e6})
+        self.assertIsNone(self.snapshot.get(2)['hub_height'])
+        self.assertEqual(self.snapshot.get(3)['company_name'], 'Vestas')
+        self.assertIsNone(self.snapshot.get(99))
+
+    def test_snapshot_is_rebuilt_after_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            turbine = create_turbine('V90')
+        first = get_catalogue()
+        self.assertIs(get_catalogue(), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            turbine.nominal_power = 2.1e6
+            turbine.save()
+
+        second = get_catalogue()
+        self.assertIsNot(second, first)
+        self.assertEqual(second.get(turbine.pk)['nominal_power'], 2.1e6)
+
+    def test_turbine_search(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_turbine('V90', company_name='Vestas', nominal_power=2e6)
+            create_turbine('E-82', company_name='Enercon', nominal_power=2.3e6)
+            create_turbine('V112', company_name='Vestas', nominal_power=3.3e6)
+
+        response = self.client.get('/api/turbines/search/', {'q': 'vestas', 'max_power': 2500000})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([turbine['name'] for turbine in data['results']], ['V90'])
+        self.assertIn('facets', data)
+
+
+class InstrumentationTests(TestCase):
+    def test_render_prometheus_format(self):
+        metrics = MetricsRegistry()
+        metrics.inc('webapp_http_requests_total', view='home', method='GET', status='200')
+        metrics.inc('webapp_http_requests_total', view='home', method='GET', status='200')
+        metrics.observe('webapp_http_request_duration_seconds', 0.003, buckets=(0.001, 0.01), view='home')
+        metrics.cache_lookup('weather', True)
+        metrics.add_collector(lambda: [('webapp_cache_lookups_total', {'cache': 'weather', 'result': 'miss'}, 3)])
+
+        lines = metrics.render().splitlines()
+
+        self.assertIn('# TYPE webapp_http_requests_total counter', lines)
+        self.assertIn('webapp_http_requests_total{method="GET",status="200",view="home"} 2', lines)
+        self.assertIn('webapp_http_request_duration_seconds_bucket{view="home",le="0.001"} 0', lines)
+        self.assertIn('webapp_http_request_duration_seconds_bucket{view="home",le="0.01"} 1', lines)
+        self.assertIn('webapp_http_request_duration_seconds_bucket{view="home",le="+Inf"} 1', lines)
+        self.assertIn('webapp_http_request_duration_seconds_count{view="home"} 1', lines)
+        self.assertIn('webapp_cache_hit_ratio{cache="weather"} 0.25', lines)
+
+    def test_timed_stages(self):
+        @timed('square')
+        def square(value):
+            return value * value
+
+        @timed('rows')
+        def rows(count):
+            yield from range(count)
+
+        # Outside of a trace the functions are not timed
+        self.assertEqual(square(3), 9)
+        with trace() as current:
+            square(2)
+            square(4)
+            self.assertEqual(list(rows(3)), [0, 1, 2])
+            with span('block'):
+                Turbine.objects.count()
+
+        self.assertEqual(list(current.stages), ['square', 'rows', 'block'])
+        self.assertEqual(current.stages['square'][1], 2)
+        self.assertEqual(current.db_queries, 1)
+        with trace(sampled=False) as skipped:
+            self.assertIsNone(skipped)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    @override_settings(INSTRUMENTATION={'METRICS_ALLOWED_IPS': []})
+    def test_metrics_endpoint_requires_staff(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+        self.client.force_login(User.objects.create_user('staff', password='secret', is_staff=True))
+        response = self.client.get('/metrics/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('webapp_http_requests_total{', response.content.decode())
+
+    def test_metrics_endpoint_allows_scraper_ip(self):
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='127.0.0.1').status_code, 200)
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='10.0.0.5').status_code, 403)
+
+
+class ExportTests(CalculationTestCase):
+    def test_csv_export(self):
+        job = self.calculate()
+
+        response = self.client.get(f'/api/results/{job.fingerprint}/export/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(tuple(rows[0]), RESULT_COLUMNS)
+        self.assertEqual(len(rows), 366)
+        # Annual totals of the summary from the exported steps (one year of daily values)
+        generation = sum(float(row[RESULT_COLUMNS.index('generation_kwh')]) for row in rows[1:])
+        self.assertAlmostEqual(generation / job.result['annual_generation_kwh'], 1.0, places=6)
+
+    def test_gzip_and_npz_exports_match_csv(self):
+        job = self.calculate()
+        url = f'/api/results/{job.fingerprint}/export/'
+
+        plain = b''.join(self.client.get(url).streaming_content)
+        compressed = b''.join(self.client.get(url, {'compress': 'gzip'}).streaming_content)
+        self.assertEqual(gzip.decompress(compressed), plain)
+
+        rows = list(csv.reader(io.StringIO(plain.decode())))[1:]
+        for compress in ('', 'gzip'):
+            archive = np.load(io.BytesIO(b''.join(self.client.get(
+                url, {'format': 'npz', 'compress': compress}).streaming_content)))
+            self.assertEqual(archive.files, list(RESULT_COLUMNS))
+            # The CSV holds exactly the stored values
+            np.testing.assert_array_equal(archive['grid_export_kwh'],
+                                          [float(row[RESULT_COLUMNS.index('grid_export_kwh')]) for row in rows])
+
+    def test_chunked_streams_match_stored_values(self):
+        values = np.random.default_rng(5).random(1050) * 1e6
+        timestamps = np.datetime64('2023-01-01T00:00') + np.arange(1050) * np.timedelta64(10, 'm')
+        store_result_series('b' * 64, {name: timestamps if name == 'timestamp' else values for name in RESULT_COLUMNS})
+        columns = open_result_series('b' * 64)
+
+        stream, content_type, extension = export_stream(columns, 'npz', chunk_rows=100)
+        archive = np.load(io.BytesIO(b''.join(stream)))
+        np.testing.assert_array_equal(archive['wind_power_w'], values)
+        np.testing.assert_array_equal(archive['timestamp'], timestamps.astype('datetime64[s]'))
+
+        stream, content_type, extension = export_stream(columns, 'csv', compress=True, chunk_rows=100)
+        self.assertEqual(extension, 'csv.gz')
+        rows = list(csv.reader(io.StringIO(gzip.decompress(b''.join(stream)).decode())))
+        np.testing.assert_array_equal([float(row[2]) for row in rows[1:]], values)
+
+    def test_invalid_requests(self):
+        job = self.calculate()
+
+        self.assertEqual(self.client.get(f'/api/results/{job.fingerprint}/export/', {'format': 'xls'}).status_code, 400)
+        self.assertEqual(self.client.get(f'/api/results/{"0" * 64}/export/').status_code, 404)
+        self.assertEqual(self.client.get('/api/results/not-a-fingerprint/export/').status_code, 404)
+
+    @skipIf(pyarrow is not None, "pyarrow is installed")
+    def test_parquet_without_pyarrow(self):
+        job = self.calculate()
+
+        self.assertEqual(self.client.get(f'/api/results/{job.fingerprint}/export/',
+                                         {'format': 'parquet'}).status_code, 501)
+
+    def test_deleting_the_result_removes_the_series(self):
+        job = self.calculate()
+
+        CalculationResult.objects.filter(fingerprint=job.fingerprint).delete()
+
+        with self.assertRaises(FileNotFoundError):
+            open_result_series(job.fingerprint)
+
+    def store(self, fingerprint: str, age_seconds: float, rows: int = 100) -> int:
+        values = np.arange(rows, dtype=np.float64)
+        store_result_series(fingerprint, {name: values.astype('datetime64[s]') if name == 'timestamp' else values
+                                          for name in RESULT_COLUMNS})
+        path = Path(self.location) / fingerprint
+        modified = time.time() - age_seconds
+        os.utime(path, (modified, modified))
+        return sum(file.stat().st_size for file in path.iterdir())
+
+    def test_eviction_by_age(self):
+        self.store('a' * 64, 40 * 24 * 60 * 60)
+        self.store('b' * 64, 2 * 24 * 60 * 60)
+        CalculationResult.objects.create(fingerprint='a' * 64, wind_data=WindData.objects.create(source='csv'),
+                                         inputs={}, summary={})
+        # Leftovers of an interrupted write, and a write in progress
+        interrupted = Path(tempfile.mkdtemp(dir=self.location, prefix='.aaaaaaaaaaaa-'))
+        os.utime(interrupted, (time.time() - 2 * 60 * 60,) * 2)
+        writing = Path(tempfile.mkdtemp(dir=self.location, prefix='.bbbbbbbbbbbb-'))
+
+        with override_settings(RESULT_SERIES={'LOCATION': self.location, 'MAX_AGE': 30 * 24 * 60 * 60,
+                                              'MAX_SIZE': None}):
+            evicted = evict_result_series()
+
+        self.assertEqual(evicted['removed'], 1)
+        self.assertFalse(CalculationResult.objects.exists())
+        with self.assertRaises(FileNotFoundError):
+            open_result_series('a' * 64)
+        self.assertEqual(len(open_result_series('b' * 64)['wind_power_w']), 100)
+        self.assertFalse(interrupted.exists())
+        self.assertTrue(writing.exists())
+
+    def test_eviction_by_size(self):
+        size = self.store('b' * 64, 3 * 24 * 60 * 60)
+        self.store('c' * 64, 2 * 24 * 60 * 60)
+        self.store('d' * 64, 24 * 60 * 60)
+        # Too fresh to be evicted, its result may not be stored yet
+        self.store('e' * 64, 10 * 60)
+
+        with override_settings(RESULT_SERIES={'LOCATION': self.location, 'MAX_AGE': None, 'MAX_SIZE': 2.5 * size}):
+            evicted = evict_result_series()
+
+        self.assertEqual(evicted, {'removed': 2, 'freed_bytes': 2 * size})
+        self.assertEqual(sorted(path.name[0] for path in Path(self.location).iterdir()), ['d', 'e'])
+
+    def test_worker_and_command_evict(self):
+        self.store('a' * 64, 40 * 24 * 60 * 60)
+        jobs.run_worker(once=True)
+        self.assertFalse((Path(self.location) / ('a' * 64)).exists())
+
+        self.store('b' * 64, 40 * 24 * 60 * 60)
+        output = io.StringIO()
+        call_command('evict_result_series', stdout=output)
+        self.assertFalse((Path(self.location) / ('b' * 64)).exists())
+        self.assertIn('Removed 1 results', output.getvalue())
+
+
+class BenchmarkTests(TestCase):
+    def results(self, **throughputs) -> dict:
+        return {'results': {name: {'throughput': value} for name, value in throughputs.items()}}
+
+    def test_compare_reports_regressions(self):
+        baseline = self.results(fast=100.0, slow=100.0, removed=100.0)
+        current = self.results(fast=90.0, slow=70.0, added=100.0)
+
+        comparison = {name: (change, regression) for name, _, _, change, regression in
+                      compare(baseline, current, threshold=0.2)}
+
+        self.assertEqual(set(comparison), {'fast', 'slow'})
+        self.assertAlmostEqual(comparison['fast'][0], -0.1)
+        self.assertFalse(comparison['fast'][1])
+        self.assertTrue(comparison['slow'][1])
+
+    def test_measure_loops_short_runs(self):
+        calls = []
+
+        @contextmanager
+        def setup():
+            yield (lambda: calls.append(sum(range(1000)))), 1000
+
+        result = measure(BenchmarkCase('sum', setup, 'items/s'), repeat=2)
+
+        self.assertGreater(result['loops'], 1)
+        self.assertGreaterEqual(result['seconds'] * result['loops'] * 2, MIN_RUN_SECONDS)
+        self.assertAlmostEqual(result['throughput'], 1000 / result['seconds'])
+        self.assertEqual(len(calls), 1 + result['loops'] * 2 + 1)
+        self.assertGreaterEqual(result['peak_memory_bytes'], 0)
+
+    def test_run_filtered_cases(self):
+        progress = []
+
+        run = run_benchmarks('parse_wind_rows[1KB]', repeat=1, progress=lambda name, result: progress.append(name))
+
+        self.assertEqual(list(run['results']), ['parse_wind_rows[1KB]'])
+        self.assertEqual(progress, ['parse_wind_rows[1KB]'])
+        self.assertEqual(run['results']['parse_wind_rows[1KB]']['unit'], 'bytes/s')
+        self.assertIn('numpy', run['environment'])
@@ -0,0 +1,231 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+from django.conf import settings
+
+from WebApp.instrumentation import timed
+from WebApp.utils import calculate_power_output, step_hours
+
+DEFAULT_UNCERTAINTY = {
+    'SCENARIOS': 10000,
+    'BLOCK': 'day',  # 'day' (days within SEASONAL_WINDOW days of the calendar day) or 'month' (whole months)
+    'SEASONAL_WINDOW': 15,  # days
+    'CP_SIGMA': 0.03,  # Relative standard deviation of the power coefficient
+    'AVAILABILITY': 0.97,
+    'AVAILABILITY_SIGMA': 0.02,
+    'PROCESSES': 1,  # More than 1 evaluates the chunks in worker processes, 0 uses every CPU
+    'SEED': 0,
+}
+
+# Exceedance levels reported: P90 is the annual energy exceeded in 90 % of the years
+EXCEEDANCE_LEVELS = (50, 75, 90)
+
+# Scenario × timestep elements evaluated per chunk, bounds the temporary arrays (~16 MB of float32)
+CHUNK_ELEMENTS = 2 ** 22
+
+DAYS_PER_YEAR = 365
+
+# Day of the year (0-364) of the first day of every month in a non-leap year
+MONTH_STARTS = np.cumsum([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+MONTH_OF_DAY = np.repeat(np.arange(12), np.diff(np.append(MONTH_STARTS, DAYS_PER_YEAR)))
+
+
+def get_uncertainty_settings() -> dict:
+    return {**DEFAULT_UNCERTAINTY, **getattr(settings, 'UNCERTAINTY', {})}
+
+
+def _calendar_day(days: np.ndarray) -> np.ndarray:
+    # Day of a non-leap year (0-364), 29 February shares the slot of 28 February
+    day_of_year = (days - days.astype('datetime64[Y]')).astype(np.int64)
+    years = days.astype('datetime64[Y]').astype(np.int64) + 1970
+    leap = (years % 4 == 0) & ((years % 100 != 0) | (years % 400 == 0))
+    return np.where(leap & (day_of_year >= 59), day_of_year - 1, day_of_year)
+
+
+def daily_blocks(values, timestamps) -> tuple:
+    """
+    Reshapes a series into complete days, days with missing timesteps or values are left out.
+
+    Parameters:
+    - values (ndarray): One value per timestep
+    - timestamps (ndarray): datetime64 timestamps, evenly spaced with a whole number of steps per day
+
+    Returns:
+    - tuple: (blocks (n_days, steps_per_day) float32 array, datetime64[D] day of every block)
+    """
+    timestamps = np.asarray(timestamps, dtype='datetime64[s]')
+    steps_per_day = max(int(round(24 / step_hours(timestamps))), 1)
+    step = np.timedelta64(86400 // steps_per_day, 's')
+
+    days = timestamps.astype('datetime64[D]')
+    unique_days, day_positions = np.unique(days, return_inverse=True)
+    slots = ((timestamps - days) // step).astype(np.int64)
+
+    blocks = np.zeros((len(unique_days), steps_per_day), dtype=np.float32)
+    filled = np.zeros((len(unique_days), steps_per_day), dtype=bool)
+    # Steps off the regular grid and missing (NaN) values leave their day incomplete
+    valid = (slots >= 0) & (slots < steps_per_day) & np.isfinite(values)
+    blocks[day_positions[valid], slots[valid]] = values[valid]
+    filled[day_positions[valid], slots[valid]] = True
+
+    complete = filled.all(axis=1)
+    return blocks[complete], unique_days[complete]
+
+
+class DaySampler:
+    """
+    Draws synthetic years day by day: every calendar day takes a measured day within `window`
+    days of it (from any year), so the seasonal cycle is kept. The measured days have to cover
+    the whole year, a winter dataset cannot stand in for annual values.
+    """
+
+    def __init__(self, days: np.ndarray, window: int = 15):
+        calendar_days = _calendar_day(days)
+        # Circular distance between every target day and every measured day
+        distance = np.abs(np.arange(DAYS_PER_YEAR)[:, None] - calendar_days[None, :])
+        distance = np.minimum(distance, DAYS_PER_YEAR - distance)
+        candidates = distance <= window
+        uncovered = ~candidates.any(axis=1)
+        if uncovered.any():
+            months = ', '.join(str(month + 1) for month in np.unique(MONTH_OF_DAY[uncovered]))
+            raise ValueError(f"Annual values need measured days throughout the year, none within {window} days "
+                             f"of parts of month(s) {months}.")
+
+        self.counts = candidates.sum(axis=1)
+        self.starts = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+        self.flat = np.nonzero(candidates)[1]
+
+    def sample(self, rng, scenarios: int) -> np.ndarray:
+        """
+        Returns:
+        - ndarray: (scenarios, 365) positions of the measured days making up every synthetic year
+        """
+        draws = (rng.random((scenarios, DAYS_PER_YEAR)) * self.counts).astype(np.int64)
+        return self.flat[self.starts + draws]
+
+
+class MonthSampler:
+    """
+    Draws synthetic years month by month: every month of the year is taken whole from one of the
+    measured years in which it is complete. Needs several years of data to add any variability.
+    """
+
+    def __init__(self, days: np.ndarray):
+        years = days.astype('datetime64[Y]').astype(np.int64)
+        self.years, year_positions = np.unique(years, return_inverse=True)
+        calendar_days = _calendar_day(days)
+
+        # Position of the measured day for every (year, calendar day), -1 where it is missing
+        self.lookup = np.full((len(self.years), DAYS_PER_YEAR), -1, dtype=np.int64)
+        self.lookup[year_positions, calendar_days] = np.arange(len(days))
+
+        complete = np.stack([(self.lookup[:, MONTH_OF_DAY == month] >= 0).all(axis=1) for month in range(12)], axis=1)
+        if not complete.any(axis=0).all():
+            raise ValueError("Month blocks need at least one complete occurrence of every month.")
+        self.counts = complete.sum(axis=0)
+        self.choices = [np.flatnonzero(complete[:, month]) for month in range(12)]
+
+    def sample(self, rng, scenarios: int) -> np.ndarray:
+        draws = (rng.random((scenarios, 12)) * self.counts).astype(np.int64)
+        chosen_years = np.stack([self.choices[month][draws[:, month]] for month in range(12)], axis=1)
+        return self.lookup[chosen_years[:, MONTH_OF_DAY], np.arange(DAYS_PER_YEAR)]
+
+
+def _evaluate_chunk(blocks: np.ndarray, nominal_power: float, hours: float, sampler, options: dict,
+                    seed: np.random.SeedSequence, scenarios: int) -> np.ndarray:
+    """
+    Annual energy (kWh) of `scenarios` synthetic years as one (scenarios, days, steps) array operation.
+
+    min(P * cp, nominal) = cp * min(P, nominal / cp), so the Cp perturbation only changes the
+    clamping level and the array is scaled once per scenario afterwards.
+    """
+    rng = np.random.default_rng(seed)
+    days = sampler.sample(rng, scenarios)
+    cp_factor = np.clip(rng.normal(1.0, options['CP_SIGMA'], scenarios), 0.5, 1.5)
+    availability = np.clip(rng.normal(options['AVAILABILITY'], options['AVAILABILITY_SIGMA'], scenarios), 0.0, 1.0)
+
+    power = blocks[days]  # (scenarios, 365, steps_per_day)
+    np.minimum(power, (nominal_power / cp_factor)[:, None, None].astype(np.float32), out=power)
+    energy = power.sum(axis=(1, 2), dtype=np.float64)
+    return energy * cp_factor * availability * hours / 1000
+
+
+def bootstrap_annual_energy(power, timestamps, nominal_power: float, **options) -> dict:
+    """
+    Exceedance probabilities of the annual energy from a block bootstrap of a power series.
+
+    Thousands of synthetic years are put together from the measured days (or months), and every
+    one gets its own power coefficient and availability perturbation. The scenarios are evaluated
+    in chunks of CHUNK_ELEMENTS scenario × timestep values, each with its own random stream, so
+    the result does not depend on the number of processes.
+
+    Parameters:
+    - power (ndarray): Power output in W for every timestep, not clamped to the nominal power
+    - timestamps (ndarray): datetime64 timestamps of the power series
+    - nominal_power (float): Nominal power in W, the perturbed power is clamped to it
+    - options: Overrides of settings.UNCERTAINTY (SCENARIOS, BLOCK, SEASONAL_WINDOW, CP_SIGMA,
+      AVAILABILITY, AVAILABILITY_SIGMA, PROCESSES, SEED)
+
+    Returns:
+    - dict: p50, p75, p90, mean and std of the annual energy in kWh, scenarios, block and the
+      number of measured days used
+    """
+    options = {**get_uncertainty_settings(), **{key.upper(): value for key, value in options.items()}}
+    blocks, days = daily_blocks(np.asarray(power, dtype=np.float32), timestamps)
+    if len(days) == 0:
+        raise ValueError("The series does not contain a single complete day.")
+    hours = 24 / blocks.shape[1]
+
+    if options['BLOCK'] == 'month':
+        sampler = MonthSampler(days)
+    elif options['BLOCK'] == 'day':
+        sampler = DaySampler(days, options['SEASONAL_WINDOW'])
+    else:
+        raise ValueError(f"Unknown block type: {options['BLOCK']}")
+
+    scenarios = int(options['SCENARIOS'])
+    chunk_size = max(CHUNK_ELEMENTS // (DAYS_PER_YEAR * blocks.shape[1]), 1)
+    sizes = [min(chunk_size, scenarios - start) for start in range(0, scenarios, chunk_size)]
+    chunks = list(zip(np.random.SeedSequence(options['SEED']).spawn(len(sizes)), sizes))
+
+    processes = int(options['PROCESSES']) or os.cpu_count()
+    processes = min(processes, len(chunks))
+    evaluate = partial(_evaluate_chunk, blocks, nominal_power, hours, sampler, options)
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            energy = np.concatenate(list(executor.map(evaluate, *zip(*chunks))))
+    else:
+        energy = np.concatenate([evaluate(seed, size) for seed, size in chunks])
+
+    return {
+        # Exceeded with probability P: the (100 - P)th percentile
+        **{f"p{level}": float(np.percentile(energy, 100 - level)) for level in EXCEEDANCE_LEVELS},
+        'mean': float(energy.mean()),
+        'std': float(energy.std()),
+        'scenarios': scenarios,
+        'block': options['BLOCK'],
+        'days': len(days),
+    }
+
+
+@timed('uncertainty')
+def turbine_exceedance(turbine, series: dict, prepared: dict, **options) -> dict:
+    """
+    P50/P75/P90 annual energy of a turbine for a wind series, see bootstrap_annual_energy().
+
+    Parameters:
+    - turbine (Turbine): The turbine, a tabulated power curve replaces the idealised formula
+    - series (dict): The weather series with its 'timestamps'
+    - prepared (dict): Wind speeds at hub height and air density of the series (see
+      WindData.prepare_series())
+    """
+    power_curve = turbine.get_power_curve()
+    if power_curve is not None:
+        power = power_curve.evaluate(prepared['wind_speed'], prepared['air_density'])
+    else:
+        # Not clamped, the perturbed power coefficient moves the point where the nominal power is reached
+        power = calculate_power_output(prepared['wind_speed'], prepared['air_density'], turbine.rotor_diameter,
+                                       turbine.efficiency, np.inf, turbine.startup_speed)
+    return bootstrap_annual_energy(power, series['timestamps'], turbine.nominal_power, **options)
@@ -1,5 +1,6 @@
 from django.urls import path
 from .views import *
+from .api import turbine_list_api, turbine_search_api, turbine_import_api, dataset_upload_api, calculate_batch_api
 
 urlpatterns = [
     path('', home_view, name="home"),
@@ -11,4 +12,13 @@ urlpatterns = [
     path('calculate/step2/', wind_data_view, name='wind_data_view'),
     path('calculate/step3/', energy_consumption_view, name='energy_consumption_view'),
     path('calculate/result/', calculate_result_view, name='calculate_result_view'),
+    path('calculate/jobs/<uuid:job_id>/', job_status_view, name='job_status_view'),
+    path('weather/cache-stats/', weather_cache_stats_view, name='weather_cache_stats'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('api/turbines/', turbine_list_api, name='turbine_list_api'),
+    path('api/turbines/search/', turbine_search_api, name='turbine_search_api'),
+    path('api/turbines/import/', turbine_import_api, name='turbine_import_api'),
+    path('api/datasets/', dataset_upload_api, name='dataset_upload_api'),
+    path('api/calculate/', calculate_batch_api, name='calculate_batch_api'),
+    path('api/results/<str:fingerprint>/export/', result_export_view, name='result_export'),
 ]
@@ -1,29 +1,79 @@
 import csv
 import io
+import math
+from datetime import datetime, timezone
+
+import numpy as np
 import requests
 
 
 
 def turbine_to_dict(turbine):
     return {
+        "id": turbine.pk,
         "rotor_diameter": turbine.rotor_diameter,
         "efficiency": turbine.efficiency,
         "nominal_power": turbine.nominal_power,
         "startUp": turbine.startup_speed,
+        "hub_height": turbine.hub_height,
+    }
+
+def parse_timestamp(value: str) -> datetime:
+    """
+    Parses an ISO date or datetime string (e.g. 2023-01-01 or 2023-01-01 13:00) into an aware UTC datetime.
+    """
+    timestamp = datetime.fromisoformat(value.strip())
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+def pv_system_to_dict(pv_system):
+    return {
+        "peak_power": pv_system.peak_power,
+        "tilt": pv_system.tilt,
+        "azimuth": pv_system.azimuth,
+        "temperature_coefficient": pv_system.temperature_coefficient,
+        "noct": pv_system.noct,
+        "inverter_power": pv_system.inverter_power,
+        "system_losses": pv_system.system_losses,
     }
 
-def calculate_air_density(temp_c, pressure_hpa):
+
+def step_hours(timestamps: np.ndarray) -> float:
     """
-    Calculates air density using the ideal gas law.
+    Returns the typical spacing of a series in hours (24 for daily data).
+    """
+    if len(timestamps) < 2:
+        return 24.0
+    return float(np.median(np.diff(timestamps).astype('timedelta64[s]').astype(np.float64))) / 3600
+
+
+R_DRY_AIR = 287.05  # J/kg·K
+R_VAPOUR = 461.495  # J/kg·K
+
+
+def saturation_vapour_pressure(temp_c):
+    """
+    Saturation vapour pressure over water in Pa per % of relative humidity (Tetens formula in hPa).
+    """
+    return 6.1078 * 10 ** (7.5 * temp_c / (temp_c + 237.3))
+
+
+def calculate_air_density(temp_c, pressure_hpa, relative_humidity=None):
+    """
+    Calculates air density using the ideal gas law, for dry air or, with a relative humidity,
+    as the sum of the dry air and water vapour partial densities.
 
     Parameters:
     - temp_c (float): Average air temperature in °C
     - pressure_hpa (float): Atmospheric pressure in hPa
+    - relative_humidity (float, optional): Relative humidity in % (default: dry air)
 
     Returns:
     - float: Air density in kg/m³
     """
-    R = 287.05  # Specific gas constant for dry air (J/kg·K)
+    R = R_DRY_AIR  # Specific gas constant for dry air (J/kg·K)
 
     # Convert temperature to Kelvin
     temp_k = temp_c + 273.15
@@ -31,8 +81,98 @@ def calculate_air_density(temp_c, pressure_hpa):
     # Convert pressure to Pascals
     pressure_pa = pressure_hpa * 100
 
-    # Calculate air density
-    air_density = pressure_pa / (R * temp_k)
+    if relative_humidity is None:
+        # Calculate air density
+        return pressure_pa / (R * temp_k)
+
+    # Water vapour is lighter than dry air, its partial pressure lowers the density
+    vapour_pa = relative_humidity * saturation_vapour_pressure(temp_c)
+    return (pressure_pa - vapour_pa) / (R * temp_k) + vapour_pa / (R_VAPOUR * temp_k)
+
+
+def calculate_power_output(wind_speeds, air_density, rotor_diameter, efficiency, nominal_power, startup_speed):
+    """
+    Vectorized power output of one or many turbines for a whole wind series.
+
+    P = 0.5 * ρ * A * v^3 * Cp, set to 0 below the startup speed and clamped to the nominal power.
+
+    Turbine parameters may be scalars or arrays shaped to broadcast against the series,
+    e.g. (n_turbines, 1) against (n_timesteps,) gives a turbine × timestep matrix.
+
+    Parameters:
+    - wind_speeds (array-like): Wind speeds (m/s), a list, ndarray or pandas Series
+    - air_density (float or array-like): Air density (kg/m³), scalar or one value per timestep
+    - rotor_diameter (float or ndarray): Rotor diameter in meters
+    - efficiency (float or ndarray): Power coefficient (Cp)
+    - nominal_power (float or ndarray): Nominal power output in W
+    - startup_speed (float or ndarray): Minimum wind speed required to start (m/s)
+
+    Returns:
+    - ndarray: Power output in Watts for every timestep (and turbine, when broadcasting)
+    """
+    wind_speeds = np.asarray(wind_speeds, dtype=np.float64)
+    air_density = np.asarray(air_density, dtype=np.float64)
+
+    swept_area = np.pi * (np.asarray(rotor_diameter, dtype=np.float64) / 2) ** 2
+    power_output = 0.5 * air_density * wind_speeds ** 3
+    power_output = power_output * (swept_area * np.asarray(efficiency, dtype=np.float64))
+
+    # Clamp to the nominal power and cut everything below the startup speed
+    power_output = np.minimum(power_output, nominal_power)
+    return np.where(wind_speeds < startup_speed, 0.0, power_output)
+
+
+# Wind speed bins of the stored distribution (m/s)
+DISTRIBUTION_BIN_WIDTH = 0.5
+DISTRIBUTION_MAX_SPEED = 40.0
+
+
+def fit_weibull(wind_speeds) -> tuple:
+    """
+    Fits Weibull parameters to a wind series with the empirical method of moments (Justus).
+
+    Parameters:
+    - wind_speeds (array-like): Wind speeds (m/s)
+
+    Returns:
+    - tuple: (k shape factor, c scale factor in m/s)
+    """
+    wind_speeds = np.asarray(wind_speeds, dtype=np.float64)
+    wind_speeds = wind_speeds[~np.isnan(wind_speeds)]
+    mean = wind_speeds.mean()
+    std = wind_speeds.std()
+
+    k = (std / mean) ** -1.086 if std > 0 else 10.0
+    c = mean / math.gamma(1 + 1 / k)
+    return float(k), float(c)
+
+
+def wind_speed_histogram(wind_speeds, bin_width: float = DISTRIBUTION_BIN_WIDTH,
+                         max_speed: float = DISTRIBUTION_MAX_SPEED) -> np.ndarray:
+    """
+    Share of the time spent in every wind speed bin [i * bin_width, (i + 1) * bin_width).
+
+    Returns:
+    - ndarray: Probabilities that sum to 1, speeds above max_speed are counted in the last bin
+    """
+    wind_speeds = np.asarray(wind_speeds, dtype=np.float64)
+    wind_speeds = wind_speeds[~np.isnan(wind_speeds)]
+    n_bins = int(round(max_speed / bin_width))
+    bins = np.minimum((wind_speeds / bin_width).astype(np.int64), n_bins - 1)
+    counts = np.bincount(bins, minlength=n_bins)
+    return counts / max(counts.sum(), 1)
+
+
+def weibull_probabilities(k: float, c: float, bin_width: float = DISTRIBUTION_BIN_WIDTH,
+                          max_speed: float = DISTRIBUTION_MAX_SPEED) -> np.ndarray:
+    """
+    Probability of every wind speed bin under a Weibull distribution, from differences of its CDF.
+    """
+    edges = np.arange(0, max_speed + bin_width / 2, bin_width)
+    cdf = 1 - np.exp(-(edges / c) ** k)
+    cdf[-1] = 1.0
+    return np.diff(cdf)
 
-    return air_density
 
+def bin_centers(bin_width: float = DISTRIBUTION_BIN_WIDTH, max_speed: float = DISTRIBUTION_MAX_SPEED) -> np.ndarray:
+    return (np.arange(int(round(max_speed / bin_width))) + 0.5) * bin_width
@@ -1,20 +1,28 @@
-import csv
-import logging
 import uuid
-from datetime import datetime, timedelta
 
 from django.contrib import messages
-from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.db import transaction
+from django.contrib.auth.forms import UserCreationForm
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import login, logout, authenticate
-from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 
-from WebApp.forms import RegisterForm, LoginForm, EnergyConsumptionForm, TurbineForm, \
-    SelectTurbineForm, WindDataForm, WindCSVForm, WindAPIForm, EnergyCSVForm, EnergyAverageForm
-from WebApp.models import Turbine, WindData
-from meteostat import Daily, Point, Stations
+from WebApp.forms import RegisterForm, LoginForm, TurbineForm, SelectTurbineForm, SelectPVSystemForm, WindCSVForm, \
+    WindAPIForm, EnergyCSVForm, EnergyAverageForm, BatteryForm
+from WebApp.calculations import calculation_fingerprint, consumption_from_session, turbine_from_session, \
+    get_memoized_result
+from WebApp.exports import EXPORT_FORMATS, ExportError, export_stream, open_result_series
+from WebApp.instrumentation import registry, span, get_instrumentation_settings
+from WebApp.jobs import enqueue_job, find_active_job
+from WebApp.matching import DEFAULT_BATTERY_EFFICIENCY
+from WebApp.models import PVSystem, WindData, ConsumptionData, CalculationJob
+from WebApp.weather import get_weather_cache
 
-from WebApp.utils import turbine_to_dict
+from WebApp.ingest import IngestReport, parse_wind_rows, parse_consumption_rows
+from WebApp.utils import turbine_to_dict, pv_system_to_dict
 
 
 def home_view(request):
@@ -58,62 +66,46 @@ def dashboard_view(request):
     return render(request, 'dashboard.html')
 
 
-def get_wind_data_from_meteostat(lat, lon, start_date, end_date):
-    if end_date - start_date > timedelta(days=365):
-        raise ValueError("The date range must not exceed 1 year.")
+@staff_member_required
+def weather_cache_stats_view(request):
+    return JsonResponse(get_weather_cache().stats())
 
-    stations = Stations()
-    stations = stations.nearby(lat=lat, lon=lon)
-    stations = stations.fetch(1)
 
-    if stations.empty:
-        return None
-
-    station_id = stations.index[0]
-
-    df = Daily(station_id, start=start_date, end=end_date)
-    df = df.fetch()
-
-    wind_speed = df['wspd'].mean() if not df.empty else None
-    return wind_speed
-
-
-def process_csv(file):
-    data = []
-    decoded_file = file.read().decode('utf-8').splitlines()
-    csv_reader = csv.reader(decoded_file)
-
-    for row in csv_reader:
-        data.append({
-            'date': row[0],
-            'wind_speed': row[1]
-        })
-    return data
+def metrics_view(request):
+    """
+    Request, stage, database and cache metrics of this process in the Prometheus text format, for
+    staff users and the INSTRUMENTATION['METRICS_ALLOWED_IPS'] (the scraper).
+    """
+    allowed_ips = get_instrumentation_settings()['METRICS_ALLOWED_IPS']
+    if not request.user.is_staff and request.META.get('REMOTE_ADDR') not in allowed_ips:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 def turbine_selection_view(request):
     if request.method == 'POST':
-        select_form = SelectTurbineForm(request.POST)
-        turbine_form = TurbineForm(request.POST)
+        # Only the submitted form is bound, the other one is shown empty
+        select_form = SelectTurbineForm(request.POST if 'select_submit' in request.POST else None)
+        turbine_form = TurbineForm(request.POST if 'create_submit' in request.POST else None)
+        pv_form = SelectPVSystemForm(request.POST)
 
         if 'select_submit' in request.POST:
-            if select_form.is_valid():
+            if select_form.is_valid() and pv_form.is_valid():
                 turbine = select_form.cleaned_data['turbine']
-                turbine_data = turbine_to_dict(turbine)
-                request.session['turbine_data'] = turbine_data
+                request.session['turbine_id'] = turbine.pk
+                request.session.pop('custom_turbine', None)
+                store_pv_system(request, pv_form.cleaned_data['pv_system'])
                 return redirect('wind_data_view')
             else:
                 messages.error(request, "Please select a turbine.")
 
         elif 'create_submit' in request.POST:
-            if turbine_form.is_valid():
-                turbine_data = {
-                    "rotor_diameter": turbine_form.cleaned_data['rotor_diameter'],
-                    "efficiency": turbine_form.cleaned_data['efficiency'],
-                    "nominal_power": turbine_form.cleaned_data['nominal_power'],
-                    "startUp": turbine_form.cleaned_data['startup_speed'],
-                }
-                request.session['turbine_data'] = turbine_data
+            if turbine_form.is_valid() and pv_form.is_valid():
+                # Custom turbines stay out of the shared catalogue, their parameters are part of the
+                # calculation inputs (and fingerprint) instead
+                request.session['custom_turbine'] = turbine_to_dict(turbine_form.instance)
+                request.session.pop('turbine_id', None)
+                store_pv_system(request, pv_form.cleaned_data['pv_system'])
                 return redirect('wind_data_view')
             else:
                 messages.error(request, "Please fill all fields correctly.")
@@ -121,11 +113,24 @@ def turbine_selection_view(request):
     else:
         select_form = SelectTurbineForm()
         turbine_form = TurbineForm()
+        pv_form = SelectPVSystemForm()
 
-    return render(request, 'turbine_selection.html', {
-        'select_form': select_form,
-        'turbine_form': turbine_form,
-    })
+    with span('render'):
+        return render(request, 'turbine_selection.html', {
+            'select_form': select_form,
+            'turbine_form': turbine_form,
+            'pv_form': pv_form,
+        })
+
+
+def store_pv_system(request, pv_system):
+    """
+    Keeps the optional PV system of step 1 in the session, None removes an earlier choice.
+    """
+    if pv_system is None:
+        request.session.pop('pv_system_id', None)
+    else:
+        request.session['pv_system_id'] = pv_system.pk
 
 
 def wind_data_view(request):
@@ -135,12 +140,33 @@ def wind_data_view(request):
             api_form = WindAPIForm()
 
             if csv_form.is_valid():
-                wind_data_entry = WindData(id=uuid.uuid4(), source='csv')
                 csv_file = request.FILES['csv_file']
-                wind_data_entry.csv_data = csv_file.read().decode('utf-8')
-                wind_data_entry.save()
-                request.session['wind_data_id'] = str(wind_data_entry.id)
-                return redirect('energy_consumption_view')
+                report = IngestReport()
+                with transaction.atomic():
+                    # Rows are streamed from the upload and written in fixed-size batches
+                    wind_data_entry = WindData.objects.create(
+                        id=uuid.uuid4(),
+                        source='csv',
+                        latitude=csv_form.cleaned_data['latitude'],
+                        longitude=csv_form.cleaned_data['longitude'],
+                        measurement_height=csv_form.cleaned_data['measurement_height'],
+                        elevation=csv_form.cleaned_data['elevation'],
+                    )
+                    with span('csv_ingest'):
+                        stored = wind_data_entry.store_observations(parse_wind_rows(csv_file, report))
+
+                if report.error_count:
+                    messages.warning(request, report.summary())
+
+                if stored:
+                    # Distribution for quick turbine screening, fitted once per dataset
+                    with span('fit_distribution'):
+                        wind_data_entry.fit_distribution()
+                    request.session['wind_data_id'] = str(wind_data_entry.id)
+                    return redirect('energy_consumption_view')
+
+                wind_data_entry.delete()
+                messages.error(request, "The CSV file does not contain any valid wind data.")
 
         elif 'meteostat_submit' in request.POST:
             api_form = WindAPIForm(request.POST)
@@ -151,9 +177,11 @@ def wind_data_view(request):
                     id=uuid.uuid4(),
                     source='meteostat',
                     location=api_form.cleaned_data['location'],
+                    latitude=api_form.cleaned_data['latitude'],
+                    longitude=api_form.cleaned_data['longitude'],
                     start_date=api_form.cleaned_data['start_date'],
                     end_date=api_form.cleaned_data['end_date'],
-                    csv_data='placeholder for fetched data'
+                    resolution=api_form.cleaned_data['resolution'],
                 )
                 wind_data_entry.save()
                 request.session['wind_data_id'] = str(wind_data_entry.id)
@@ -162,44 +190,160 @@ def wind_data_view(request):
         csv_form = WindCSVForm()
         api_form = WindAPIForm()
 
-    return render(request, 'wind_data.html', {
-        'csv_form': csv_form,
-        'api_form': api_form,
-    })
+    with span('render'):
+        return render(request, 'wind_data.html', {
+            'csv_form': csv_form,
+            'api_form': api_form,
+        })
 
 
 def energy_consumption_view(request):
     if request.method == 'POST':
+        battery_form = BatteryForm(request.POST)
+
         if 'average_submit' in request.POST:
             avg_form = EnergyAverageForm(request.POST)
             csv_form = EnergyCSVForm()
 
-            if avg_form.is_valid():
+            if avg_form.is_valid() and battery_form.is_valid():
                 consumption = avg_form.cleaned_data['average_consumption']
                 request.session['consumption_type'] = 'average'
                 request.session['average_consumption'] = consumption
+                store_battery(request, battery_form.cleaned_data)
                 return redirect('calculate_result_view')  # or next step
 
         elif 'csv_submit' in request.POST:
             csv_form = EnergyCSVForm(request.POST, request.FILES)
             avg_form = EnergyAverageForm()
 
-            if csv_form.is_valid():
-                csv_data = csv_form.cleaned_data['csv_file'].read().decode('utf-8')
-                request.session['consumption_type'] = 'csv'
-                request.session['csv_consumption'] = csv_data
-                return redirect('calculate_result_view')  # or next step
+            if csv_form.is_valid() and battery_form.is_valid():
+                report = IngestReport()
+                with transaction.atomic():
+                    # Stored as a dataset like the wind data, the session only keeps its id
+                    consumption_data = ConsumptionData.objects.create(id=uuid.uuid4(), source='csv')
+                    stored = consumption_data.store_observations(
+                        parse_consumption_rows(csv_form.cleaned_data['csv_file'], report))
+
+                if report.error_count:
+                    messages.warning(request, report.summary())
+
+                if stored:
+                    request.session['consumption_type'] = 'csv'
+                    request.session['consumption_data_id'] = str(consumption_data.id)
+                    store_battery(request, battery_form.cleaned_data)
+                    return redirect('calculate_result_view')  # or next step
+
+                consumption_data.delete()
+                messages.error(request, "The CSV file does not contain any valid consumption data.")
 
     else:
         avg_form = EnergyAverageForm()
         csv_form = EnergyCSVForm()
+        battery_form = BatteryForm()
 
-    return render(request, 'energy_consumption.html', {
-        'avg_form': avg_form,
-        'csv_form': csv_form,
-    })
+    with span('render'):
+        return render(request, 'energy_consumption.html', {
+            'avg_form': avg_form,
+            'csv_form': csv_form,
+            'battery_form': battery_form,
+        })
+
+
+def store_battery(request, cleaned_data: dict):
+    """
+    Keeps the optional battery of step 3 in the session, an empty capacity removes an earlier choice.
+    """
+    if not cleaned_data.get('battery_capacity'):
+        request.session.pop('battery_data', None)
+    else:
+        request.session['battery_data'] = {
+            'capacity': cleaned_data['battery_capacity'],
+            'power': cleaned_data.get('battery_power') or None,
+            'efficiency': cleaned_data.get('battery_efficiency') or DEFAULT_BATTERY_EFFICIENCY,
+        }
 
 
 def calculate_result_view(request):
-    return render(request, 'result.html')
+    job_id = request.GET.get('job')
+
+    if job_id is None:
+        turbine_data = turbine_from_session(request.session)
+        wind_data_id = request.session.get('wind_data_id')
+        consumption = consumption_from_session(request.session)
+        if turbine_data is None or not wind_data_id:
+            messages.error(request, "Please select a turbine and wind data first.")
+            return redirect('turbine_selection_view')
+        if consumption is None:
+            messages.error(request, "Please provide your energy consumption first.")
+            return redirect('energy_consumption_view')
+
+        # Same inputs as an earlier calculation, show the stored result right away
+        pv_system = PVSystem.objects.filter(pk=request.session.get('pv_system_id')).first()
+        pv_system_data = pv_system_to_dict(pv_system) if pv_system is not None else None
+        battery_data = request.session.get('battery_data')
+        fingerprint = calculation_fingerprint(turbine_data, wind_data_id, consumption, pv_system_data, battery_data)
+        with span('memoized_lookup'):
+            memoized = get_memoized_result(fingerprint)
+        registry.cache_lookup('calculation_result', memoized is not None)
+        if memoized is not None:
+            with span('render'):
+                return render(request, 'result.html', {'result': memoized.summary, 'fingerprint': fingerprint})
+
+        # Reloading while the calculation is still running reuses the pending job (unless its worker died)
+        job = find_active_job(fingerprint)
+
+        # The calculation runs in the job worker, the page polls until it is finished
+        if job is None:
+            job = enqueue_job('calculate_result', {
+                'turbine': turbine_data,
+                'wind_data_id': wind_data_id,
+                'consumption': consumption,
+                'pv_system': pv_system_data,
+                'battery': battery_data,
+                'fingerprint': fingerprint,
+            }, fingerprint=fingerprint)
+        return redirect(f"{reverse('calculate_result_view')}?job={job.id}")
+
+    job = get_object_or_404(CalculationJob, id=job_id)
+    with span('render'):
+        return render(request, 'result.html', {'job': job, 'result': job.result, 'fingerprint': job.fingerprint})
+
+
+def job_status_view(request, job_id):
+    job = get_object_or_404(CalculationJob, id=job_id)
+    return JsonResponse({
+        'id': str(job.id),
+        'status': job.status,
+        'fingerprint': job.fingerprint,
+        'result': job.result,
+        'error': job.error.splitlines()[0] if job.error else None,
+    })
+
 
+@require_GET
+def result_export_view(request, fingerprint):
+    """
+    Streams the per-timestep generation and consumption of a calculation result.
+
+    Query parameters: format ('csv', 'npz' or 'parquet', default 'csv') and compress=gzip. The
+    stored columns are memory-mapped and sent in chunks, so long series do not need more memory.
+    Parquet needs the optional pyarrow package, without it the answer is 501 Not Implemented.
+    """
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f"Unknown format, use one of: {', '.join(EXPORT_FORMATS)}."}, status=400)
+
+    try:
+        columns = open_result_series(fingerprint)
+    except (ValueError, FileNotFoundError):
+        return JsonResponse({'error': "No per-timestep data is stored for this result."}, status=404)
+
+    try:
+        stream, content_type, extension = export_stream(columns, file_format,
+                                                        compress=request.GET.get('compress') == 'gzip')
+    except ExportError as error:
+        return JsonResponse({'error': str(error)}, status=501)
+
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="result-{fingerprint[:12]}.{extension}"'
+    return response
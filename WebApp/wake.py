@@ -0,0 +1,179 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+# Wind direction bins of the precomputed deficit table (10° wide)
+DEFAULT_DIRECTION_BINS = 36
+
+# Wake expansion coefficient k of the Jensen model, about 0.04-0.05 offshore
+DEFAULT_WAKE_DECAY = 0.075
+
+
+def thrust_coefficient(efficiency):
+    """
+    Thrust coefficient of an ideal rotor with the given power coefficient (actuator disc theory).
+
+    Cp = 4a(1 - a)² and Ct = 4a(1 - a) with the axial induction a <= 1/3, a power coefficient
+    above the Betz limit (16/27) is treated as the limit.
+
+    Parameters:
+    - efficiency (float or ndarray): Power coefficient (Cp)
+
+    Returns:
+    - ndarray: Thrust coefficient (Ct)
+    """
+    induction = np.linspace(0.0, 1 / 3, 1001)
+    induction = np.interp(efficiency, 4 * induction * (1 - induction) ** 2, induction)
+    return 4 * induction * (1 - induction)
+
+
+def pairwise_geometry(x, y) -> tuple:
+    """
+    Distance and bearing between every pair of turbines.
+
+    Parameters:
+    - x, y (array-like): Turbine positions in m east and north of the farm origin
+
+    Returns:
+    - tuple: (distance, bearing) (N, N) arrays, [i, j] is the distance in m and the bearing in
+      radians (clockwise from north) from turbine j to turbine i
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    east = x[:, None] - x[None, :]
+    north = y[:, None] - y[None, :]
+    return np.hypot(east, north), np.arctan2(east, north)
+
+
+def rotor_overlap(wake_radius, rotor_radius, offset):
+    """
+    Share of the rotor area (radius rotor_radius) covered by a wake of radius wake_radius whose
+    centre line passes at distance offset from the hub. Works element-wise on arrays.
+    """
+    offset = np.maximum(offset, 1e-9)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rotor_angle = np.arccos(np.clip((offset ** 2 + rotor_radius ** 2 - wake_radius ** 2)
+                                        / (2 * offset * rotor_radius), -1.0, 1.0))
+        wake_angle = np.arccos(np.clip((offset ** 2 + wake_radius ** 2 - rotor_radius ** 2)
+                                       / (2 * offset * wake_radius), -1.0, 1.0))
+        lens = (rotor_radius ** 2 * (rotor_angle - np.sin(2 * rotor_angle) / 2)
+                + wake_radius ** 2 * (wake_angle - np.sin(2 * wake_angle) / 2))
+    partial = lens / (np.pi * rotor_radius ** 2)
+
+    return np.select(
+        [offset >= wake_radius + rotor_radius, offset <= wake_radius - rotor_radius,
+         offset <= rotor_radius - wake_radius],
+        [0.0, 1.0, wake_radius ** 2 / rotor_radius ** 2],
+        partial,
+    )
+
+
+class WakeModel(ABC):
+    """
+    A wake model returns the wind speed deficit every turbine causes at every other turbine.
+
+    Subclasses implement pair_deficits(), the deficits of single wakes are combined as the root
+    sum of squares (Katic et al.).
+    """
+    name = None
+
+    @abstractmethod
+    def pair_deficits(self, downwind, crosswind, diameters, thrust_coefficients) -> np.ndarray:
+        """
+        Parameters:
+        - downwind (ndarray): (..., N, N) distance in m from turbine j downwind to turbine i
+        - crosswind (ndarray): (..., N, N) distance in m of turbine i from the wake centre line of j
+        - diameters (ndarray): (N,) rotor diameters in m
+        - thrust_coefficients (ndarray): (N,) thrust coefficients
+
+        Returns:
+        - ndarray: (..., N, N) relative wind speed deficit at turbine i caused by turbine j
+        """
+
+    def combine(self, deficits) -> np.ndarray:
+        return np.minimum(np.sqrt(np.square(deficits).sum(axis=-1)), 1.0)
+
+
+class JensenWakeModel(WakeModel):
+    """
+    Jensen (Park) model: a top-hat wake that widens linearly with the downwind distance,
+    deficit = (1 - sqrt(1 - Ct)) * (r / (r + k x))² times the share of the rotor in the wake.
+    """
+    name = 'jensen'
+
+    def __init__(self, decay: float = DEFAULT_WAKE_DECAY):
+        self.decay = decay
+
+    def pair_deficits(self, downwind, crosswind, diameters, thrust_coefficients) -> np.ndarray:
+        upstream_radius = np.asarray(diameters, dtype=np.float64)[None, :] / 2
+        downstream_radius = np.asarray(diameters, dtype=np.float64)[:, None] / 2
+        initial_deficit = 1 - np.sqrt(1 - np.clip(thrust_coefficients, 0.0, 1.0))[None, :]
+
+        wake_radius = upstream_radius + self.decay * np.maximum(downwind, 0.0)
+        deficit = (initial_deficit * (upstream_radius / wake_radius) ** 2
+                   * rotor_overlap(wake_radius, downstream_radius, crosswind))
+        return np.where(downwind > 0, deficit, 0.0)
+
+
+# Available wake models by name, new models only need to be registered here
+WAKE_MODELS = {
+    JensenWakeModel.name: JensenWakeModel,
+}
+
+
+def get_wake_model(name: str = 'jensen', **parameters) -> WakeModel:
+    try:
+        return WAKE_MODELS[name](**parameters)
+    except KeyError:
+        raise ValueError(f"Unknown wake model: {name}")
+
+
+class WakeTable:
+    """
+    Combined wind speed deficit of every turbine of a farm, precomputed for every wind direction bin.
+
+    The (bins, N) table is built once from the pairwise distance/bearing matrices, a timestep then
+    only costs a bin lookup, so a series of T steps is evaluated in O(bins · N² + T · N) array work.
+    Timesteps without a wind direction get the mean deficit over all directions.
+    """
+
+    def __init__(self, x, y, diameters, thrust_coefficients, model: WakeModel = None,
+                 bins: int = DEFAULT_DIRECTION_BINS):
+        model = model or JensenWakeModel()
+        self.bins = bins
+        distance, bearing = pairwise_geometry(x, y)
+
+        # Direction the wind blows towards for the centre of every bin (meteorological directions: from)
+        downwind_bearing = np.radians(np.arange(bins) * 360 / bins + 180)[:, None, None]
+        downwind = distance * np.cos(bearing - downwind_bearing)
+        crosswind = np.abs(distance * np.sin(bearing - downwind_bearing))
+
+        pair_deficits = model.pair_deficits(downwind, crosswind, diameters, np.asarray(thrust_coefficients))
+        deficits = model.combine(pair_deficits)
+        # Last row: unknown direction
+        self.deficits = np.vstack([deficits, deficits.mean(axis=0)])
+
+    def bin_index(self, directions) -> np.ndarray:
+        """
+        Returns:
+        - ndarray: Row of the deficit table for every wind direction (degrees, the direction the
+          wind comes from), NaN directions map to the last row
+        """
+        directions = np.asarray(directions, dtype=np.float64)
+        index = np.rint(np.nan_to_num(directions, nan=0.0) * self.bins / 360).astype(np.intp) % self.bins
+        return np.where(np.isnan(directions), self.bins, index)
+
+    def effective_speeds(self, wind_speeds, directions, columns=None) -> np.ndarray:
+        """
+        Wind speeds at every turbine inside the farm.
+
+        Parameters:
+        - wind_speeds (ndarray): (T,) free-stream wind speeds at hub height
+        - directions (ndarray): (T,) wind directions in degrees
+        - columns (array-like, optional): Only return these turbines
+
+        Returns:
+        - ndarray: (T, N) wind speeds reduced by the wake deficits
+        """
+        deficits = self.deficits if columns is None else self.deficits[:, columns]
+        return np.asarray(wind_speeds, dtype=np.float64)[:, None] * (1 - deficits[self.bin_index(directions)])
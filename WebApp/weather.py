@@ -0,0 +1,579 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+from WebApp.instrumentation import registry, timed
+from WebApp.providers import get_weather_provider
+from WebApp.stations import get_station_index_settings, idw_weights, nearest_stations, weighted_elevation
+
+DAILY_COLUMNS = ('tavg', 'tmin', 'tmax', 'prcp', 'snow', 'wdir', 'wspd', 'wpgt', 'pres', 'tsun')
+HOURLY_COLUMNS = ('temp', 'dwpt', 'rhum', 'prcp', 'snow', 'wdir', 'wspd', 'wpgt', 'pres', 'tsun', 'coco')
+
+# Meteostat reports wind speed in km/h, the turbine model works with m/s
+KMH_TO_MS = 1 / 3.6
+
+# Columns blended as angles and columns taken from the nearest station with a value (condition codes)
+CIRCULAR_COLUMNS = ('wdir',)
+CATEGORICAL_COLUMNS = ('coco',)
+
+DEFAULT_WEATHER_CACHE = {
+    'BACKEND': 'memory',  # 'memory', 'django' or 'disk'
+    'TIMEOUT': 24 * 60 * 60,
+    'MAX_ENTRIES': 512,
+    'CACHE_ALIAS': 'default',
+    'LOCATION': None,
+    'ARCHIVE_TIMEOUT': 30 * 24 * 60 * 60,
+}
+
+# Concurrent Meteostat requests when a range is split into yearly chunks
+DEFAULT_FETCH_THREADS = 4
+
+
+class MemoryCacheBackend:
+    """
+    In-process LRU cache with a per-entry time to live.
+    """
+
+    def __init__(self, max_entries: int = 512, **options):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict, timeout: int):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+class DjangoCacheBackend:
+    """
+    Stores entries in one of the caches configured in settings.CACHES, eviction is left to that cache.
+    """
+
+    def __init__(self, cache_alias: str = 'default', **options):
+        self.cache = caches[cache_alias]
+        self.evictions = 0
+
+    def get(self, key: str):
+        return self.cache.get(f"weather:{key}")
+
+    def set(self, key: str, value: dict, timeout: int):
+        self.cache.set(f"weather:{key}", value, timeout)
+
+
+class DiskCacheBackend:
+    """
+    Local on-disk store with one compressed NPZ file per entry.
+
+    The file modification time tracks the last access, the least recently used files are
+    removed once there are more than max_entries of them.
+    """
+
+    def __init__(self, location=None, max_entries: int = 512, **options):
+        self.location = Path(location or Path(settings.BASE_DIR) / 'weather_cache')
+        self.location.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.location / f"{hashlib.sha1(key.encode()).hexdigest()}.npz"
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as stored:
+                value = {name: stored[name] for name in stored.files}
+        except (OSError, ValueError):
+            return None
+
+        if value.pop('__expires__')[0] < time.time():
+            path.unlink(missing_ok=True)
+            return None
+
+        os.utime(path)
+        return value
+
+    def set(self, key: str, value: dict, timeout: int):
+        path = self._path(key)
+        # Write to a temporary file first so readers never see a half written entry
+        temporary = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(temporary, 'wb') as file:
+            np.savez_compressed(file, __expires__=np.array([time.time() + timeout]), **value)
+        os.replace(temporary, path)
+
+        with self._lock:
+            entries = sorted(self.location.glob('*.npz'), key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:max(len(entries) - self.max_entries, 0)]:
+                entry.unlink(missing_ok=True)
+                self.evictions += 1
+
+
+CACHE_BACKENDS = {
+    'memory': MemoryCacheBackend,
+    'django': DjangoCacheBackend,
+    'disk': DiskCacheBackend,
+}
+
+
+class WeatherCache:
+    """
+    Cache for Meteostat lookups with hit/miss counters per kind of lookup.
+
+    Values are dicts of numpy arrays, so every backend can store them without pickling.
+    """
+
+    def __init__(self, backend, timeout: int):
+        self.backend = backend
+        self.timeout = timeout
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _count(self, namespace: str, outcome: str):
+        with self._lock:
+            counters = self._counters.setdefault(namespace, {'hits': 0, 'misses': 0})
+            counters[outcome] += 1
+
+    def get_or_fetch(self, namespace: str, key: tuple, fetch, timeout: int = None) -> dict:
+        """
+        Returns the cached value for the key, calling fetch() and storing its result on a miss.
+        """
+        cache_key = ":".join([namespace, *map(str, key)])
+        value = self.backend.get(cache_key)
+        if value is not None:
+            self._count(namespace, 'hits')
+            return value
+
+        self._count(namespace, 'misses')
+        value = fetch()
+        self.backend.set(cache_key, value, self.timeout if timeout is None else timeout)
+        return value
+
+    def stats(self) -> dict:
+        """
+        Returns hits, misses and the hit rate for every kind of lookup, plus the backend evictions.
+        """
+        with self._lock:
+            stats = {}
+            for namespace, counters in self._counters.items():
+                total = counters['hits'] + counters['misses']
+                stats[namespace] = {**counters, 'hit_rate': counters['hits'] / total if total else 0.0}
+        stats['evictions'] = self.backend.evictions
+        return stats
+
+
+_weather_cache = None
+_weather_cache_lock = threading.Lock()
+
+
+def _weather_cache_samples():
+    # Hits and misses per kind of lookup for the metrics endpoint, nothing before the cache is used
+    if _weather_cache is None:
+        return
+    for namespace, stats in _weather_cache.stats().items():
+        if namespace == 'evictions':
+            continue
+        for result, counter in (('hit', 'hits'), ('miss', 'misses')):
+            yield 'webapp_cache_lookups_total', {'cache': f'weather_{namespace}', 'result': result}, stats[counter]
+
+
+registry.add_collector(_weather_cache_samples)
+
+def get_weather_cache_settings() -> dict:
+    return {**DEFAULT_WEATHER_CACHE, **getattr(settings, 'WEATHER_CACHE', {})}
+
+
+def get_weather_cache() -> WeatherCache:
+    """
+    Returns the process-wide weather cache configured by settings.WEATHER_CACHE.
+    """
+    global _weather_cache
+    if _weather_cache is None:
+        with _weather_cache_lock:
+            if _weather_cache is None:
+                options = get_weather_cache_settings()
+                backend = CACHE_BACKENDS[options['BACKEND']](
+                    max_entries=options['MAX_ENTRIES'],
+                    cache_alias=options['CACHE_ALIAS'],
+                    location=options['LOCATION'],
+                )
+                _weather_cache = WeatherCache(backend, options['TIMEOUT'])
+    return _weather_cache
+
+
+def frame_to_arrays(df, columns) -> dict:
+    """
+    Converts a Meteostat DataFrame into a dict of compact numpy arrays.
+
+    Returns:
+    - dict: 'time' (datetime64[s]) and one float32 array per requested column (NaN if missing)
+    """
+    arrays = {'time': df.index.values.astype('datetime64[s]')}
+    for column in columns:
+        if column in df:
+            arrays[column] = df[column].to_numpy(dtype=np.float32, na_value=np.nan)
+        else:
+            arrays[column] = np.full(len(df), np.nan, dtype=np.float32)
+    return arrays
+
+
+def _as_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return datetime.combine(value, datetime.min.time())
+
+
+def fetch_daily(station_id: str, start_date, end_date, timeout: int = None) -> dict:
+    """
+    Fetches daily data for a station from the configured weather provider (see WebApp.providers),
+    cached by (provider, station, interval, date range).
+
+    Returns:
+    - dict: Arrays as returned by frame_to_arrays() for the daily columns
+    """
+    start, end = _as_datetime(start_date), _as_datetime(end_date)
+    provider = get_weather_provider()
+
+    def fetch():
+        return frame_to_arrays(provider.daily(station_id, start, end), DAILY_COLUMNS)
+
+    return get_weather_cache().get_or_fetch('daily', (provider.name, station_id, start.date(), end.date()), fetch,
+                                            timeout)
+
+
+def fetch_hourly(station_id: str, start_date, end_date, timeout: int = None) -> dict:
+    """
+    Fetches hourly data for a station from the configured weather provider (see WebApp.providers),
+    cached by (provider, station, interval, date range).
+
+    Returns:
+    - dict: Arrays as returned by frame_to_arrays() for the hourly columns
+    """
+    start = _as_datetime(start_date)
+    # A date as the end of the range includes all hours of that day
+    end = _as_datetime(end_date) if isinstance(end_date, datetime) else _as_datetime(end_date) + timedelta(hours=23)
+
+    provider = get_weather_provider()
+
+    def fetch():
+        return frame_to_arrays(provider.hourly(station_id, start, end), HOURLY_COLUMNS)
+
+    return get_weather_cache().get_or_fetch('hourly', (provider.name, station_id, start, end), fetch, timeout)
+
+
+FETCHERS = {
+    'daily': fetch_daily,
+    'hourly': fetch_hourly,
+}
+
+
+def find_gaps(times: np.ndarray, step: np.timedelta64, start=None, end=None) -> list:
+    """
+    Finds the missing intervals of a series that should have one value every step.
+
+    Parameters:
+    - times (ndarray): Sorted datetime64 timestamps
+    - step (timedelta64): Expected spacing
+    - start, end (datetime64, optional): Requested range, missing values at its edges count as gaps
+
+    Returns:
+    - list: (first missing timestamp, last missing timestamp) pairs as datetime64
+    """
+    if len(times) == 0:
+        return [(start, end)] if start is not None and end is not None else []
+
+    gaps = []
+    if start is not None and times[0] > start:
+        gaps.append((start, times[0] - step))
+
+    jumps = np.flatnonzero(np.diff(times) > step)
+    gaps.extend((times[index] + step, times[index + 1] - step) for index in jumps)
+
+    if end is not None and times[-1] < end:
+        gaps.append((times[-1] + step, end))
+    return gaps
+
+
+def _range_bounds(interval: str, start_date, end_date):
+    # First and last timestamp of an inclusive date range
+    first = np.datetime64(_as_datetime(start_date).date(), 's')
+    last = np.datetime64(_as_datetime(end_date).date(), 's')
+    if interval == 'hourly':
+        last += np.timedelta64(23 * 3600, 's')
+    step = np.timedelta64(3600 if interval == 'hourly' else 86400, 's')
+    return first, last, step
+
+
+def fetch_ranges(station_ids: list, interval: str, start_date, end_date) -> list:
+    """
+    Fetches an arbitrarily long date range for several stations as calendar-year chunks,
+    concurrently, and stitches the chunks of every station.
+
+    Every chunk is cached on its own, so overlapping ranges only fetch the years that are missing.
+    Completed years do not change any more and are kept for ARCHIVE_TIMEOUT.
+
+    Parameters:
+    - station_ids (list): Meteostat stations
+    - interval (str): 'daily' or 'hourly'
+    - start_date, end_date (date): First and last day of the range (inclusive)
+
+    Returns:
+    - list: One dict per station with the arrays of frame_to_arrays() for the whole range plus
+      'gaps', the missing intervals (see find_gaps())
+    """
+    fetcher = FETCHERS[interval]
+    start, end = _as_datetime(start_date).date(), _as_datetime(end_date).date()
+    options = get_weather_cache_settings()
+    current_year = date.today().year
+
+    def fetch_year(task):
+        station_id, year = task
+        timeout = options['ARCHIVE_TIMEOUT'] if year < current_year else None
+        return fetcher(station_id, date(year, 1, 1), date(year, 12, 31), timeout=timeout)
+
+    years = range(start.year, end.year + 1)
+    tasks = [(station_id, year) for station_id in station_ids for year in years]
+    threads = min(getattr(settings, 'WEATHER_FETCH_THREADS', DEFAULT_FETCH_THREADS), len(tasks))
+    with ThreadPoolExecutor(max_workers=max(threads, 1), thread_name_prefix='meteostat') as executor:
+        chunks = list(executor.map(fetch_year, tasks))
+
+    first, last, step = _range_bounds(interval, start, end)
+    stitched_ranges = []
+    for position in range(0, len(chunks), len(years)):
+        station_chunks = chunks[position:position + len(years)]
+        stitched = {name: np.concatenate([chunk[name] for chunk in station_chunks]) for name in station_chunks[0]}
+        in_range = (stitched['time'] >= first) & (stitched['time'] <= last)
+        stitched = {name: values[in_range] for name, values in stitched.items()}
+        stitched['gaps'] = find_gaps(stitched['time'], step, first, last)
+        stitched_ranges.append(stitched)
+    return stitched_ranges
+
+
+def fetch_range(station_id: str, interval: str, start_date, end_date) -> dict:
+    """
+    Fetches an arbitrarily long date range of one station, see fetch_ranges().
+    """
+    return fetch_ranges([station_id], interval, start_date, end_date)[0]
+
+
+def blend_stations(ranges: list, weights, interval: str, start_date, end_date) -> dict:
+    """
+    Inverse-distance-weighted blend of the series of several stations.
+
+    The weights of every timestep are renormalized over the stations that have a value, so a
+    station with a gap does not pull the blend towards zero. Wind directions are averaged as
+    vectors, condition codes are taken from the nearest station with a value.
+
+    Parameters:
+    - ranges (list): Station series as returned by fetch_ranges()
+    - weights (array-like): One weight per station
+
+    Returns:
+    - dict: Arrays like fetch_range() on the union of the station timestamps
+    """
+    times = np.unique(np.concatenate([station['time'] for station in ranges]))
+    positions = [np.searchsorted(times, station['time']) for station in ranges]
+    weights = np.asarray(weights, dtype=np.float64)[:, None]
+    columns = np.arange(len(times))
+
+    blended = {'time': times}
+    for name in ranges[0]:
+        if name in ('time', 'gaps'):
+            continue
+        values = np.full((len(ranges), len(times)), np.nan, dtype=np.float32)
+        for row, (station, position) in enumerate(zip(ranges, positions)):
+            values[row, position] = station[name]
+        present = ~np.isnan(values)
+
+        if name in CATEGORICAL_COLUMNS:
+            # The stations are sorted by distance, argmax finds the first one with a value
+            blended[name] = values[present.argmax(axis=0), columns]
+            continue
+
+        station_weights = np.where(present, weights, 0.0)
+        total = station_weights.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if name in CIRCULAR_COLUMNS:
+                angles = np.radians(np.where(present, values, 0.0))
+                east = (np.sin(angles) * station_weights).sum(axis=0)
+                north = (np.cos(angles) * station_weights).sum(axis=0)
+                result = np.where(total > 0, np.degrees(np.arctan2(east, north)) % 360, np.nan)
+            else:
+                result = (np.where(present, values, 0.0) * station_weights).sum(axis=0) / total
+        blended[name] = result.astype(np.float32)
+
+    first, last, step = _range_bounds(interval, start_date, end_date)
+    blended['gaps'] = find_gaps(times, step, first, last)
+    return blended
+
+
+@timed('weather_fetch')
+def fetch_site(lat: float, lon: float, interval: str, start_date, end_date) -> dict:
+    """
+    Fetches the weather of a site from the nearest stations of the station index (see
+    WebApp.stations), blended by inverse distance weighting when there is more than one.
+
+    Returns:
+    - dict: Arrays like fetch_range() plus 'stations', (station id, distance in km, weight)
+      tuples, and 'elevation', the weighted station elevation in m (None if unknown), None if
+      no station is close enough
+    """
+    stations = nearest_stations(lat, lon, interval, start_date, end_date)
+    if not stations:
+        return None
+
+    station_ids = [station_id for station_id, _, _ in stations]
+    weights = idw_weights([distance for _, distance, _ in stations], get_station_index_settings()['POWER'])
+    ranges = fetch_ranges(station_ids, interval, start_date, end_date)
+    data = ranges[0] if len(ranges) == 1 else blend_stations(ranges, weights, interval, start_date, end_date)
+
+    weights = weights / weights.sum()
+    data['stations'] = [(station_id, distance, float(weight))
+                        for (station_id, distance, _), weight in zip(stations, weights)]
+
+    # The pressure correction needs the altitude of the site, estimated from the stations around it
+    data['elevation'] = weighted_elevation(stations, weights)
+    return data
+
+
+def fill_gaps(values: np.ndarray) -> np.ndarray:
+    """
+    Fills NaN gaps of an evenly spaced series in place by linear interpolation, values before the
+    first and after the last measurement take the nearest measured value. A series without any
+    measurement is left unchanged.
+    """
+    missing = np.isnan(values)
+    if missing.any() and not missing.all():
+        positions = np.arange(len(values))
+        values[missing] = np.interp(positions[missing], positions[~missing], values[~missing])
+    return values
+
+
+def fill_direction_gaps(directions: np.ndarray) -> np.ndarray:
+    """
+    Fills NaN gaps of a wind direction series (degrees) in place, like fill_gaps() but interpolating
+    the east and north components, so a gap between 350° and 10° is filled through north.
+    """
+    missing = np.isnan(directions)
+    if missing.any() and not missing.all():
+        angles = np.radians(directions)
+        east, north = fill_gaps(np.sin(angles)), fill_gaps(np.cos(angles))
+        directions[missing] = np.degrees(np.arctan2(east[missing], north[missing])) % 360
+    return directions
+
+
+def get_hourly_wind_series(lat: float, lon: float, start_date, end_date) -> dict:
+    """
+    Fetches the hourly weather of a site (see fetch_site()) as compact arrays on a complete hourly grid.
+
+    Any range length is supported, it is fetched in yearly chunks (see fetch_range()). Hours missing
+    from the Meteostat data are added and filled by interpolation, so a year of data for a site
+    takes about 8760 * (8 + 4 * 4) bytes instead of a DataFrame.
+
+    Returns:
+    - dict: 'timestamps' (datetime64[s]) and float32 'wind_speed' (m/s), 'temperature' (°C),
+      'pressure' (hPa), 'sunshine' (minutes), 'humidity' (%) and 'wind_direction' (°) arrays plus 'filled', the number
+      of interpolated wind speeds, 'gaps', the missing intervals, 'stations', the blended stations,
+      and 'elevation' (m), None if no station was found
+    """
+    data = fetch_site(lat, lon, 'hourly', start_date, end_date)
+    if data is None or len(data['time']) == 0:
+        return None
+
+    # Place the fetched rows on a gap-free hourly grid
+    timestamps = np.arange(data['time'][0], data['time'][-1] + np.timedelta64(1, 'h'), np.timedelta64(1, 'h'))
+    positions = ((data['time'] - timestamps[0]) // np.timedelta64(1, 'h')).astype(np.int64)
+
+    series = {'timestamps': timestamps}
+    for name, column in (('wind_speed', 'wspd'), ('temperature', 'temp'), ('pressure', 'pres'), ('sunshine', 'tsun'),
+                         ('humidity', 'rhum'), ('wind_direction', 'wdir')):
+        values = np.full(len(timestamps), np.nan, dtype=np.float32)
+        values[positions] = data[column]
+        series[name] = values
+
+    series['filled'] = int(np.isnan(series['wind_speed']).sum())
+    series['gaps'] = data['gaps']
+    series['stations'] = data['stations']
+    series['elevation'] = data['elevation']
+    series['wind_speed'] *= KMH_TO_MS
+    for name in ('wind_speed', 'temperature', 'pressure', 'humidity'):
+        fill_gaps(series[name])
+    fill_direction_gaps(series['wind_direction'])
+
+    return series
+
+
+@timed('meteostat')
+def get_wind_data_from_meteostat(lat, lon, start_date, end_date):
+    data = fetch_site(lat, lon, 'daily', start_date, end_date)
+    if data is None:
+        return None
+
+    wind_speed = float(np.nanmean(data['wspd'])) if np.isfinite(data['wspd']).any() else None
+    return wind_speed
+
+
+def meteostat_observations(lat: float, lon: float, start_date, end_date, resolution: str = 'daily'):
+    """
+    Fetches Meteostat data for a site (see fetch_site()) as observation tuples.
+
+    Parameters:
+    - resolution (str): 'daily' or 'hourly', hourly series are gap-filled (see get_hourly_wind_series)
+
+    Yields:
+    - tuple: (timestamp, wind_speed in m/s, temperature in °C, pressure in hPa, irradiance, sunshine
+      in minutes, relative humidity in %, wind direction in °) for every timestep with a wind speed,
+      missing values are None
+    """
+    if resolution == 'hourly':
+        series = get_hourly_wind_series(lat, lon, start_date, end_date)
+        if series is None:
+            return
+        columns = (series['timestamps'], series['wind_speed'], series['temperature'], series['pressure'],
+                   series['sunshine'], series['humidity'], series['wind_direction'])
+    else:
+        data = fetch_site(lat, lon, 'daily', start_date, end_date)
+        if data is None:
+            return
+        # Meteostat has no daily humidity
+        columns = (data['time'], data['wspd'] * KMH_TO_MS, data['tavg'], data['pres'], data['tsun'],
+                   np.full(len(data['time']), np.nan, dtype=np.float32), data['wdir'])
+
+    for timestamp, wind_speed, temperature, pressure, sunshine, humidity, wind_direction in zip(*columns):
+        if np.isnan(wind_speed):
+            continue
+        yield (
+            timestamp.astype(datetime).replace(tzinfo=timezone.utc),
+            float(wind_speed),
+            None if np.isnan(temperature) else float(temperature),
+            None if np.isnan(pressure) else float(pressure),
+            None,
+            None if np.isnan(sunshine) else float(sunshine),
+            None if np.isnan(humidity) else float(humidity),
+            None if np.isnan(wind_direction) else float(wind_direction),
+        )